@@ -0,0 +1,230 @@
+"""
+End-to-end throughput, latency and memory against the local fake server.
+
+Starts benchmarks/fake_server.py, then for every settings variant and URL
+count runs fetch_tracks_metadata() followed by export_tracks_with_downloads()
+in a fresh interpreter, with settings["endpoints"] pointed at the fake
+server. Each run records wall time per phase, tracks/s, MB/s, p50/p99 of the
+oEmbed and download latency histograms, failures, retries and peak RSS. The
+results file is JSON so runs can be compared with --compare.
+
+Variants are settings overrides merged over src/config/settings.json:
+
+    {"default": {}, "wide": {"concurrent_requests": 50, "concurrent_downloads": 20}}
+
+Usage:
+    python benchmarks/end_to_end.py [--counts 100 1000] [--variants variants.json]
+        [--output results.json] [--compare previous.json] [fake server options]
+"""
+import argparse
+import copy
+import json
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from fake_server import add_server_arguments
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SRC_DIR = ROOT_DIR / "src"
+DEFAULT_SETTINGS = SRC_DIR / "config" / "settings.json"
+
+_CHILD = r"""
+import asyncio, json, logging, resource, sys, time
+from pathlib import Path
+sys.path.insert(0, {src!r})
+from downloader.mp3_exporter import export_tracks_with_downloads
+from downloader.spotify_handler import build_endpoints, fetch_tracks_metadata
+from utils.concurrency import build_adaptive_concurrency
+from utils.metrics import METRICS
+from utils.retry import build_retry_engine
+
+logging.basicConfig(level=logging.ERROR)
+logging.getLogger("spotify_downloader").setLevel(logging.ERROR)
+settings = json.loads({settings!r})
+root = Path({out!r})
+urls = ["https://open.spotify.com/track/bench%017d" % i for i in range({count})]
+
+def ms(name, fraction):
+    return round(METRICS.histogram(name).percentile(fraction) * 1000.0, 2)
+
+async def run():
+    retry = build_retry_engine(settings)
+    limiter = build_adaptive_concurrency(settings)
+    started = time.perf_counter()
+    tracks = await fetch_tracks_metadata(
+        urls,
+        timeout=float(settings.get("http_timeout", 30.0)),
+        concurrent_requests=int(settings.get("concurrent_requests", 10)),
+        retry=retry,
+        limiter=limiter,
+        endpoints=build_endpoints(settings),
+    )
+    fetched = time.perf_counter()
+    await export_tracks_with_downloads(tracks, settings, root, retry=retry, limiter=limiter)
+    finished = time.perf_counter()
+    return fetched - started, finished - fetched
+
+metadata_seconds, download_seconds = asyncio.run(run())
+downloaded = METRICS.counter("download_bytes_total").value
+print(json.dumps({{
+    "metadata_seconds": round(metadata_seconds, 3),
+    "download_export_seconds": round(download_seconds, 3),
+    "total_seconds": round(metadata_seconds + download_seconds, 3),
+    "tracks_per_second": round({count} / max(metadata_seconds + download_seconds, 1e-9), 2),
+    "download_mb_per_second": round(downloaded / max(download_seconds, 1e-9) / 1e6, 2),
+    "oembed_p50_ms": ms("oembed_request_seconds", 0.50),
+    "oembed_p99_ms": ms("oembed_request_seconds", 0.99),
+    "download_p50_ms": ms("download_seconds", 0.50),
+    "download_p99_ms": ms("download_seconds", 0.99),
+    "failed_tracks": int(METRICS.counter("tracks_processed_total", result="failed").value),
+    "retries": int(METRICS.counter_total("retries_total")),
+    "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+"""
+
+def _merge(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+def _wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake server did not start on port {port}")
+
+def start_server(args: argparse.Namespace, port: int) -> "subprocess.Popen[bytes]":
+    command = [
+        sys.executable,
+        str(Path(__file__).with_name("fake_server.py")),
+        "--port", str(port),
+        "--latency-ms", str(args.latency_ms),
+        "--bandwidth", str(args.bandwidth),
+        "--error-rate", str(args.error_rate),
+        "--throttle-rate", str(args.throttle_rate),
+        "--file-size", str(args.file_size),
+        "--albums", str(args.albums),
+    ]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    server = subprocess.Popen(command)
+    try:
+        _wait_for_port(port)
+    except RuntimeError:
+        server.kill()
+        raise
+    return server
+
+def measure(settings: Dict[str, Any], count: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as out:
+        code = _CHILD.format(src=str(SRC_DIR), settings=json.dumps(settings), out=out, count=count)
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def compare(rows: List[Dict[str, Any]], previous_path: Path) -> None:
+    previous = json.loads(previous_path.read_text(encoding="utf-8"))
+    before: Dict[Tuple[str, int], Dict[str, Any]] = {
+        (row["variant"], row["urls"]): row for row in previous.get("results", [])
+    }
+    print(f"\nCompared with {previous_path}:")
+    print(f"{'variant':<16} {'urls':>7} {'tracks/s':>28} {'download p99 ms':>28}")
+    for row in rows:
+        old = before.get((row["variant"], row["urls"]))
+        if old is None:
+            continue
+
+        def change(key: str) -> str:
+            base = old[key] or 1e-9
+            return f"{old[key]:>7} -> {row[key]:<7} ({(row[key] - base) / base:+.0%})"
+
+        print(
+            f"{row['variant']:<16} {row['urls']:>7} "
+            f"{change('tracks_per_second'):>28} {change('download_p99_ms'):>28}"
+        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[100, 1_000])
+    parser.add_argument("--settings", type=Path, default=DEFAULT_SETTINGS, help="Base settings file")
+    parser.add_argument("--variants", type=Path, default=None, help="JSON file of named settings overrides")
+    parser.add_argument("--output", type=Path, default=Path("end_to_end_results.json"))
+    parser.add_argument("--compare", type=Path, default=None, help="Previous results file to compare with")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    base = json.loads(args.settings.read_text(encoding="utf-8"))
+    variants: Dict[str, Dict[str, Any]] = {"default": {}}
+    if args.variants is not None:
+        variants = json.loads(args.variants.read_text(encoding="utf-8"))
+
+    port = _free_port()
+    endpoints = {
+        "endpoints": {
+            "oembed": f"http://127.0.0.1:{port}/oembed",
+            "media_stream": f"http://127.0.0.1:{port}/api/stream",
+        }
+    }
+    rows: List[Dict[str, Any]] = []
+    server = start_server(args, port)
+    try:
+        for name, overrides in variants.items():
+            settings = _merge(_merge(base, overrides), endpoints)
+            for count in args.counts:
+                row = {"variant": name, "urls": count}
+                row.update(measure(settings, count))
+                rows.append(row)
+                print(
+                    f"{name:<16} {count:>7} urls  {row['tracks_per_second']:>8.1f} tracks/s  "
+                    f"{row['download_mb_per_second']:>8.2f} MB/s  "
+                    f"oEmbed p50/p99 {row['oembed_p50_ms']}/{row['oembed_p99_ms']} ms  "
+                    f"download p50/p99 {row['download_p50_ms']}/{row['download_p99_ms']} ms  "
+                    f"failed {row['failed_tracks']}  peak RSS {row['peak_rss_kib'] / 1024:.1f} MiB"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+    report: Dict[str, Any] = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "server": {
+            "latency_ms": args.latency_ms,
+            "bandwidth": args.bandwidth,
+            "error_rate": args.error_rate,
+            "throttle_rate": args.throttle_rate,
+            "file_size": args.file_size,
+        },
+        "variants": variants,
+        "results": rows,
+    }
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\nResults written to {args.output}")
+    if args.compare is not None:
+        compare(rows, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Peak RSS of the streaming exporters for growing track counts.
+
+Each measurement runs in a fresh interpreter that feeds synthetic tracks from
+a generator into export_tracks() with every format enabled, so the reported
+peak reflects the exporters alone rather than a materialized track list.
+
+Usage:
+    python benchmarks/export_memory.py [--counts 1000 10000 100000]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+_CHILD = r"""
+import resource, sys
+from pathlib import Path
+sys.path.insert(0, {src!r})
+from downloader.exporters import export_tracks
+from utils.records import MediaInfo, TrackResult
+
+def tracks():
+    for i in range({count}):
+        url = "https://open.spotify.com/track/%022d" % i
+        yield TrackResult(
+            url=url,
+            result_url=url,
+            title="Track %d" % i,
+            thumbnail="https://i.scdn.co/image/%d" % i,
+            duration="",
+            medias=(MediaInfo("https://cdn.example/%d" % i, "320kbps", "mp3", "audio"),),
+            type="single",
+            error=False,
+        )
+
+settings = {{"export": {{
+    "output_json": "t.json", "output_ndjson": "t.ndjson", "output_csv": "t.csv",
+    "output_excel": "t.xlsx", "output_xml": "t.xml", "output_html": "t.html",
+}}}}
+export_tracks(tracks(), settings, Path({out!r}))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def measure(count: int) -> int:
+    with tempfile.TemporaryDirectory() as out:
+        code = _CHILD.format(src=str(SRC_DIR), count=count, out=out)
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    # ru_maxrss is reported in KiB on Linux
+    return int(result.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+    args = parser.parse_args()
+
+    rows = [{"tracks": count, "peak_rss_kib": measure(count)} for count in args.counts]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'tracks':>10} {'peak RSS':>14}")
+    for row in rows:
+        print(f"{row['tracks']:>10} {row['peak_rss_kib'] / 1024:>10.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Local stand-in for the Spotify oEmbed endpoint and the audio stream CDN.
+
+Serves GET /oembed (title + thumbnail_url, like open.spotify.com/oembed) and
+GET/HEAD /api/stream (a deterministic MP3 of about --file-size bytes, made of
+whole 128 kbit/s MPEG-1 Layer III frames, with Range support, like the URLs
+built by _build_media_info). Point the downloader at it
+through settings["endpoints"]:
+
+    "endpoints": {
+        "oembed": "http://127.0.0.1:8765/oembed",
+        "media_stream": "http://127.0.0.1:8765/api/stream"
+    }
+
+Latency, per-response bandwidth, and 5xx / 429 injection are configurable so
+benchmarks can reproduce slow or flaky upstreams. Thumbnails (GET /img/...)
+are one per track, or one per album with --albums; GET /stats reports how
+many image requests were served.
+
+Usage:
+    python benchmarks/fake_server.py [--port 8765] [--latency-ms 20]
+        [--bandwidth 0] [--error-rate 0] [--throttle-rate 0] [--file-size 4194304]
+        [--albums 0]
+"""
+import argparse
+import asyncio
+import random
+import zlib
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+_PATTERN = bytes(range(256)) * 256
+
+@dataclass
+class FakeServerConfig:
+    latency: float = 0.02
+    bandwidth: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    file_size: int = 4 * 1024 * 1024
+    albums: int = 0
+    seed: Optional[int] = None
+
+def _body(size: int) -> bytes:
+    repeats = size // len(_PATTERN) + 1
+    return (_PATTERN * repeats)[:size]
+
+def _mp3_body(size: int) -> bytes:
+    """
+    As many whole 417-byte frames (128 kbit/s, 44.1 kHz, stereo) as fit in
+    ``size``, at least one, so the downloader's MP3 verification accepts it.
+    """
+    frame = b"\xff\xfb\x90\x44" + _PATTERN[:413]
+    return frame * max(1, size // len(frame))
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    if not header.startswith("bytes="):
+        return None
+    start_text, _, end_text = header[len("bytes="):].partition("-")
+    try:
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+def make_app(config: FakeServerConfig) -> web.Application:
+    rng = random.Random(config.seed)
+    body = _mp3_body(config.file_size)
+    size = len(body)
+    stats = {"image_requests": 0}
+
+    async def injected_failure() -> Optional[web.Response]:
+        await asyncio.sleep(config.latency)
+        roll = rng.random()
+        if roll < config.error_rate:
+            return web.Response(status=503)
+        if roll < config.error_rate + config.throttle_rate:
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        return None
+
+    async def oembed(request: web.Request) -> web.StreamResponse:
+        failure = await injected_failure()
+        if failure is not None:
+            return failure
+        url = request.query.get("url", "")
+        track_id = url.rstrip("/").rsplit("/", 1)[-1]
+        cover = track_id
+        if config.albums > 0:
+            cover = "album-%d" % (zlib.crc32(track_id.encode("utf-8")) % config.albums)
+        return web.json_response(
+            {
+                "title": f"Benchmark Track {track_id}",
+                "thumbnail_url": f"{request.scheme}://{request.host}/img/{cover}.jpg",
+                "type": "rich",
+                "provider_name": "Spotify",
+            }
+        )
+
+    async def stream(request: web.Request) -> web.StreamResponse:
+        failure = await injected_failure()
+        if failure is not None:
+            return failure
+        start, end = 0, size - 1
+        status = 200
+        headers = {"Accept-Ranges": "bytes", "Content-Type": "audio/mpeg"}
+        requested = _parse_range(request.headers.get("Range", ""), size)
+        if requested is not None:
+            start, end = requested
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+        if request.method == "HEAD":
+            return response
+
+        chunk = 64 * 1024
+        for offset in range(start, end + 1, chunk):
+            piece = body[offset:min(offset + chunk, end + 1)]
+            await response.write(piece)
+            if config.bandwidth > 0:
+                await asyncio.sleep(len(piece) / config.bandwidth)
+        await response.write_eof()
+        return response
+
+    async def thumbnail(request: web.Request) -> web.StreamResponse:
+        stats["image_requests"] += 1
+        await asyncio.sleep(config.latency)
+        # Distinct bytes per image, so content addressing cannot merge them.
+        name = request.match_info["name"].encode("utf-8")
+        return web.Response(body=name + _body(16 * 1024), content_type="image/jpeg")
+
+    async def get_stats(request: web.Request) -> web.StreamResponse:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get("/oembed", oembed)
+    # add_get also registers HEAD for the same handler.
+    app.router.add_get("/api/stream", stream)
+    app.router.add_get("/img/{name}", thumbnail)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Delay before every response")
+    parser.add_argument(
+        "--bandwidth", type=float, default=0.0, help="Bytes per second per stream response (0 = unlimited)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--file-size", type=int, default=4 * 1024 * 1024, help="Audio file size in bytes")
+    parser.add_argument(
+        "--albums", type=int, default=0, help="Tracks share this many album covers (0 = one cover per track)"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed for failure injection")
+
+def config_from_args(args: argparse.Namespace) -> FakeServerConfig:
+    return FakeServerConfig(
+        latency=args.latency_ms / 1000.0,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        file_size=args.file_size,
+        albums=args.albums,
+        seed=args.seed,
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(make_app(config_from_args(args)), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Time to first URL, total read time and peak RSS of the streaming input loader.
+
+Writes a synthetic input of --count URLs in each format, then reads it in a
+fresh interpreter with iter_input_entries() (per dedup mode) and, for JSON,
+with the materializing load_input_entries() for comparison.
+
+Usage:
+    python benchmarks/input_stream.py [--count 1000000] [--dedup memory bloom disk]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+_CHILD = r"""
+import json, resource, sys, time
+from pathlib import Path
+sys.path.insert(0, {src!r})
+from utils.dedup import build_seen_filter
+from utils.parser import iter_input_entries, load_input_entries
+
+started = time.perf_counter()
+if {materialize!r}:
+    entries = load_input_entries({path!r})
+    first = time.perf_counter()
+    count = len(entries)
+else:
+    seen = build_seen_filter({{"input": {{"dedup": {dedup!r}, "bloom_capacity": {count}}}}}, Path({tmp!r}))
+    stream = iter_input_entries({path!r}, is_new=seen.add)
+    next(stream)
+    first = time.perf_counter()
+    count = 1 + sum(1 for _ in stream)
+    seen.close()
+print(json.dumps({{
+    "first_ms": round((first - started) * 1000.0, 2),
+    "total_seconds": round(time.perf_counter() - started, 2),
+    "entries": count,
+    "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+"""
+
+def write_inputs(directory: Path, count: int) -> dict:
+    url = "https://open.spotify.com/track/%022d"
+    paths = {fmt: directory / f"input.{fmt}" for fmt in ("json", "ndjson", "txt")}
+    with paths["json"].open("w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(count):
+            f.write(("  " if i == 0 else ",\n  ") + json.dumps(url % i))
+        f.write("\n]\n")
+    with paths["ndjson"].open("w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"url": url % i}) + "\n")
+    with paths["txt"].open("w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(url % i + "\n")
+    return paths
+
+def measure(path: Path, tmp: str, count: int, dedup: str, materialize: bool) -> dict:
+    code = _CHILD.format(
+        src=str(SRC_DIR), path=str(path), tmp=tmp, count=count, dedup=dedup, materialize=materialize
+    )
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--dedup", nargs="+", default=["memory", "bloom", "disk"])
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_inputs(Path(tmp), args.count)
+        rows.append(
+            {"loader": "load_input_entries", "format": "json", "dedup": "memory",
+             **measure(paths["json"], tmp, args.count, "memory", True)}
+        )
+        for fmt, path in paths.items():
+            for dedup in args.dedup:
+                rows.append(
+                    {"loader": "iter_input_entries", "format": fmt, "dedup": dedup,
+                     **measure(path, tmp, args.count, dedup, False)}
+                )
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'loader':<20} {'format':<7} {'dedup':<7} {'first URL':>12} {'total':>9} {'peak RSS':>12}")
+    for row in rows:
+        print(
+            f"{row['loader']:<20} {row['format']:<7} {row['dedup']:<7} "
+            f"{row['first_ms']:>9.2f} ms {row['total_seconds']:>7.2f} s "
+            f"{row['peak_rss_kib'] / 1024:>8.1f} MiB"
+        )
+
+if __name__ == "__main__":
+    main()
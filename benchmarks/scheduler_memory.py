@@ -0,0 +1,86 @@
+"""
+Peak RSS of the worker-pool scheduler versus one-coroutine-per-URL gather.
+
+Each measurement runs in a fresh interpreter so ru_maxrss reflects only that
+run. The work function is a no-op coroutine, so the numbers isolate the
+scheduling overhead from network and result storage.
+
+Usage:
+    python benchmarks/scheduler_memory.py [--counts 10000 100000 1000000] [--concurrency 10]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+_CHILD = r"""
+import asyncio, resource, sys
+sys.path.insert(0, {src!r})
+from utils.worker_pool import run_each
+
+COUNT = {count}
+CONCURRENCY = {concurrency}
+
+async def work(url):
+    await asyncio.sleep(0)
+
+def urls():
+    for i in range(COUNT):
+        yield "https://open.spotify.com/track/%022d" % i
+
+async def with_gather():
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    async def bound(u):
+        async with semaphore:
+            await work(u)
+    await asyncio.gather(*[bound(u) for u in urls()])
+
+async def with_pool():
+    await run_each(work, urls(), CONCURRENCY)
+
+asyncio.run(with_{mode}())
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def measure(mode: str, count: int, concurrency: int) -> int:
+    code = _CHILD.format(src=str(SRC_DIR), count=count, concurrency=concurrency, mode=mode)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    # ru_maxrss is reported in KiB on Linux
+    return int(out.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+    args = parser.parse_args()
+
+    rows = []
+    for count in args.counts:
+        row = {"urls": count}
+        for mode in ("gather", "pool"):
+            row[f"{mode}_peak_rss_kib"] = measure(mode, count, args.concurrency)
+        rows.append(row)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'urls':>10} {'gather peak RSS':>18} {'pool peak RSS':>16}")
+    for row in rows:
+        print(
+            f"{row['urls']:>10} "
+            f"{row['gather_peak_rss_kib'] / 1024:>15.1f} MiB "
+            f"{row['pool_peak_rss_kib'] / 1024:>13.1f} MiB"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Latency of small jobs: one CLI run per job versus jobs submitted to a warm
+``--serve`` job service, both against the local fake server.
+
+Every job fetches and downloads --urls tracks and exports them. The CLI
+column includes interpreter start-up, imports and fresh sessions; the service
+column is the time from POST /jobs?stream=1 to its "finished" event.
+
+Usage:
+    python benchmarks/service_latency.py [--jobs 10] [--urls 5] [fake server options]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List
+
+from end_to_end import DEFAULT_SETTINGS, SRC_DIR, _free_port, _merge, _wait_for_port, start_server
+from fake_server import add_server_arguments
+
+def run_cli(settings_path: Path, input_path: Path) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(SRC_DIR / "main.py"), "-i", str(input_path), "-s", str(settings_path)],
+        check=True,
+        capture_output=True,
+    )
+    return time.perf_counter() - started
+
+def run_service_job(port: int, urls: List[str]) -> float:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/jobs?stream=1",
+        data=json.dumps({"urls": urls}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    started = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        last: Dict[str, Any] = {}
+        for line in response:
+            last = json.loads(line)
+    if last.get("status") != "done":
+        raise RuntimeError(f"job did not finish: {last}")
+    return time.perf_counter() - started
+
+def _describe(seconds: List[float]) -> str:
+    ordered = sorted(seconds)
+    return (
+        f"median {statistics.median(ordered) * 1000:>8.1f} ms   "
+        f"max {ordered[-1] * 1000:>8.1f} ms"
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--urls", type=int, default=5, help="URLs per job")
+    parser.add_argument("--settings", type=Path, default=DEFAULT_SETTINGS, help="Base settings file")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    fake_port = _free_port()
+    service_port = _free_port()
+    server = start_server(args, fake_port)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            overrides = {
+                "endpoints": {
+                    "oembed": f"http://127.0.0.1:{fake_port}/oembed",
+                    "media_stream": f"http://127.0.0.1:{fake_port}/api/stream",
+                },
+                "metadata_cache": {"path": str(out / "oembed.sqlite3")},
+                "manifest": {"path": str(out / "manifest.sqlite3")},
+                "service": {"jobs_dir": str(out / "jobs")},
+                "logging": {"level": "WARNING", "progress_interval_seconds": 0},
+            }
+            base = json.loads(args.settings.read_text(encoding="utf-8"))
+            # Keep every output of the CLI runs out of the project's data/ directory.
+            exports = {
+                key: str(out / Path(path).name)
+                for key, path in base.get("export", {}).items()
+                if key.startswith("output_") and path
+            }
+            exports.update(audio_output_dir=str(out / "downloads"), output_json=str(out / "out.json"))
+            overrides["export"] = exports
+            settings_path = out / "settings.json"
+            settings_path.write_text(json.dumps(_merge(base, overrides)), encoding="utf-8")
+            jobs = [
+                ["https://open.spotify.com/track/svc%05d%014d" % (job, i) for i in range(args.urls)]
+                for job in range(args.jobs)
+            ]
+
+            cli_seconds = []
+            for number, urls in enumerate(jobs):
+                input_path = out / f"cli-{number}.json"
+                input_path.write_text(json.dumps(urls), encoding="utf-8")
+                cli_seconds.append(run_cli(settings_path, input_path))
+
+            service = subprocess.Popen(
+                [
+                    sys.executable,
+                    str(SRC_DIR / "main.py"),
+                    "-s", str(settings_path),
+                    "--serve", f"127.0.0.1:{service_port}",
+                ],
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                _wait_for_port(service_port)
+                service_seconds = [run_service_job(service_port, urls) for urls in jobs]
+            finally:
+                service.terminate()
+                service.wait()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{args.jobs} jobs of {args.urls} URLs each")
+    print(f"CLI run per job   {_describe(cli_seconds)}")
+    print(f"service job       {_describe(service_seconds)}")
+
+if __name__ == "__main__":
+    main()
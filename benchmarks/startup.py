@@ -0,0 +1,109 @@
+"""
+CLI start-up cost: wall time and ``python -X importtime`` import totals.
+
+Runs each scenario in a fresh interpreter: ``--help``, ``--dry-run`` over a
+synthetic input, and the imports of a real run with and without the Excel
+backend. Reports the median wall time over --repeat runs, the total import
+time, whether aiohttp/openpyxl were loaded, and the slowest top-level imports.
+
+Usage:
+    python benchmarks/startup.py [--repeat 10] [--top 5]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+MAIN = SRC_DIR / "main.py"
+DEFAULT_SETTINGS = SRC_DIR / "config" / "settings.json"
+
+_IMPORT_RUN = "import sys; sys.path.insert(0, {src!r}); import {modules}"
+
+def scenarios(input_path: Path, settings_path: Path) -> Dict[str, List[str]]:
+    run_modules = "main, downloader.pipeline, downloader.sharding, downloader.exporters"
+    return {
+        "--help": [str(MAIN), "--help"],
+        "--dry-run": [str(MAIN), "--dry-run", "-i", str(input_path), "-s", str(settings_path)],
+        "run imports (JSON only)": ["-c", _IMPORT_RUN.format(src=str(SRC_DIR), modules=run_modules)],
+        "run imports (with Excel)": [
+            "-c",
+            _IMPORT_RUN.format(src=str(SRC_DIR), modules=run_modules + ", downloader.excel_export"),
+        ],
+    }
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    (module, self us, cumulative us) for every line of -X importtime output.
+    Nested imports keep their indentation; top-level names have none.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip()[1:], int(self_us), int(cumulative_us)))
+    return rows
+
+def measure(args: List[str], repeat: int, top: int) -> Dict[str, Any]:
+    wall = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=False, capture_output=True)
+        wall.append(time.perf_counter() - started)
+    traced = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], check=False, capture_output=True, text=True
+    )
+    rows = parse_importtime(traced.stderr)
+    modules = {name.strip() for name, _, _ in rows}
+    top_level = sorted(
+        ((name.strip(), cumulative) for name, _, cumulative in rows if not name.startswith(" ")),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return {
+        "wall_ms": round(statistics.median(wall) * 1000.0, 1),
+        "import_ms": round(sum(self_us for _, self_us, _ in rows) / 1000.0, 1),
+        "modules": len(rows),
+        "aiohttp": "aiohttp" in modules,
+        "openpyxl": "openpyxl" in modules,
+        "slowest": [[name, round(cumulative / 1000.0, 1)] for name, cumulative in top_level[:top]],
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=5, help="Slowest top-level imports to list")
+    parser.add_argument("--urls", type=int, default=1_000, help="URLs in the --dry-run input")
+    parser.add_argument("--settings", type=Path, default=DEFAULT_SETTINGS)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = Path(tmp) / "input.json"
+        urls = ["https://open.spotify.com/track/%022d" % i for i in range(args.urls)]
+        input_path.write_text(json.dumps(urls), encoding="utf-8")
+        rows = [
+            {"scenario": name, **measure(command, args.repeat, args.top)}
+            for name, command in scenarios(input_path, args.settings).items()
+        ]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'scenario':<26} {'wall':>9} {'imports':>9} {'modules':>8} {'aiohttp':>8} {'openpyxl':>9}")
+    for row in rows:
+        print(
+            f"{row['scenario']:<26} {row['wall_ms']:>6.1f} ms {row['import_ms']:>6.1f} ms "
+            f"{row['modules']:>8} {str(row['aiohttp']):>8} {str(row['openpyxl']):>9}"
+        )
+        print("    slowest: " + ", ".join(f"{name} {ms} ms" for name, ms in row["slowest"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Cover requests and disk use of the thumbnail stage on an album-heavy batch.
+
+Runs the CLI over --count tracks that share --albums covers on the local fake
+server, twice: with a cold thumbnail cache, then with fresh audio/manifest
+directories but the warm cache. For each run it reports wall time, the image
+requests the server saw, the cover files placed next to the audio, how many
+distinct images (inodes) back them, and their bytes on disk.
+
+Usage:
+    python benchmarks/thumbnail_cache.py [--count 10000] [--albums 100]
+        [--link hardlink] [fake server options]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict
+
+from end_to_end import DEFAULT_SETTINGS, SRC_DIR, _free_port, _merge, start_server
+from fake_server import add_server_arguments
+
+def image_requests(port: int) -> int:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+        return int(json.loads(response.read())["image_requests"])
+
+def covers_on_disk(directory: Path) -> Dict[str, int]:
+    covers = [path for path in directory.iterdir() if path.suffix != ".mp3"]
+    inodes = {path.stat().st_ino: path.stat().st_size for path in covers}
+    return {"covers": len(covers), "distinct_images": len(inodes), "cover_bytes": sum(inodes.values())}
+
+def run(settings: Dict[str, Any], out: Path, port: int, input_path: Path, label: str) -> Dict[str, Any]:
+    run_dir = out / label
+    overrides = {
+        "manifest": {"path": str(run_dir / "manifest.sqlite3")},
+        "export": {
+            key: str(run_dir / Path(path).name)
+            for key, path in settings.get("export", {}).items()
+            if key.startswith("output_") and path
+        },
+    }
+    overrides["export"]["audio_output_dir"] = str(run_dir / "downloads")
+    settings_path = out / f"settings-{label}.json"
+    settings_path.write_text(json.dumps(_merge(settings, overrides)), encoding="utf-8")
+
+    requests_before = image_requests(port)
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(SRC_DIR / "main.py"), "-i", str(input_path), "-s", str(settings_path)],
+        check=True,
+        capture_output=True,
+    )
+    return {
+        "run": label,
+        "seconds": round(time.perf_counter() - started, 2),
+        "image_requests": image_requests(port) - requests_before,
+        **covers_on_disk(run_dir / "downloads"),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=10_000, help="Tracks in the batch")
+    parser.add_argument("--link", default="hardlink", help="thumbnails.link mode")
+    parser.add_argument("--settings", type=Path, default=DEFAULT_SETTINGS, help="Base settings file")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+    add_server_arguments(parser)
+    parser.set_defaults(albums=100, file_size=16 * 1024, latency_ms=5.0)
+    args = parser.parse_args()
+
+    port = _free_port()
+    server = start_server(args, port)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            base = json.loads(args.settings.read_text(encoding="utf-8"))
+            settings = _merge(
+                base,
+                {
+                    "endpoints": {
+                        "oembed": f"http://127.0.0.1:{port}/oembed",
+                        "media_stream": f"http://127.0.0.1:{port}/api/stream",
+                    },
+                    "metadata_cache": {"path": str(out / "oembed.sqlite3")},
+                    "thumbnails": {
+                        "enabled": True,
+                        "cache_dir": str(out / "thumbnails"),
+                        "output_dir": None,
+                        "link": args.link,
+                    },
+                    "logging": {"level": "WARNING", "progress_interval_seconds": 0},
+                },
+            )
+            input_path = out / "input.json"
+            urls = ["https://open.spotify.com/track/thumb%017d" % i for i in range(args.count)]
+            input_path.write_text(json.dumps(urls), encoding="utf-8")
+            rows = [run(settings, out, port, input_path, label) for label in ("cold", "warm")]
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{args.count} tracks, {args.albums} album covers, link={args.link}")
+    print(f"{'run':<6} {'seconds':>8} {'img reqs':>9} {'covers':>8} {'images':>7} {'cover MB':>9}")
+    for row in rows:
+        print(
+            f"{row['run']:<6} {row['seconds']:>8.2f} {row['image_requests']:>9} {row['covers']:>8} "
+            f"{row['distinct_images']:>7} {row['cover_bytes'] / 1e6:>9.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
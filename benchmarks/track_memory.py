@@ -0,0 +1,76 @@
+"""
+Memory per processed track: slotted TrackResult records versus the nested dicts
+they serialize to.
+
+Each measurement runs in a fresh interpreter that keeps --count tracks alive
+in a list, built the way spotify_handler builds them, and reports how much
+the process grew per track (strings included) and its peak RSS.
+
+Usage:
+    python benchmarks/track_memory.py [--count 1000000]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+_CHILD = r"""
+import json, resource, sys
+sys.path.insert(0, {src!r})
+from downloader.spotify_handler import MEDIA_STREAM_ENDPOINT, TrackResult, _build_media_info
+
+def make(i):
+    track_id = "%022d" % i
+    url = "https://open.spotify.com/track/" + track_id
+    return TrackResult(
+        url=url,
+        result_url=url,
+        title="Track %d" % i,
+        thumbnail="https://i.scdn.co/image/ab67616d0000b273%024d" % i,
+        duration="",
+        medias=(_build_media_info(track_id, MEDIA_STREAM_ENDPOINT),),
+        type="single",
+        error=False,
+    )
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if {form!r} == "dict":
+    tracks = [make(i).to_dict() for i in range({count})]
+else:
+    tracks = [make(i) for i in range({count})]
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "bytes_per_track": round((peak - before) * 1024 / {count}, 1),
+    "peak_rss_kib": peak,
+}}))
+"""
+
+def measure(form: str, count: int) -> dict:
+    code = _CHILD.format(src=str(SRC_DIR), form=form, count=count)
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+    args = parser.parse_args()
+
+    rows = [{"form": form, "tracks": args.count, **measure(form, args.count)} for form in ("record", "dict")]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'form':<8} {'tracks':>10} {'per track':>12} {'peak RSS':>14}")
+    for row in rows:
+        print(
+            f"{row['form']:<8} {row['tracks']:>10} {row['bytes_per_track']:>8.0f} B "
+            f"{row['peak_rss_kib'] / 1024:>10.1f} MiB"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Throughput of the post-download MP3 verification stage, per core and in total.
+
+Writes --files synthetic MP3s of --size bytes, then checks all of them inline
+on the event loop and through the AudioVerifier's process pool with 1, 2, ...
+up to --max-processes workers, each mode in a fresh interpreter. Reports
+MB/s in total and per core (bytes over the CPU seconds spent in check_mp3)
+and the longest event-loop stall seen by a 1 ms ticker, which is what running
+the stage in a process pool avoids.
+
+Usage:
+    python benchmarks/verify_throughput.py [--files 64] [--size 8388608] [--tags]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+_FRAME = b"\xff\xfb\x90\x44" + bytes(range(256)) + bytes(157)
+
+_CHILD = r"""
+import asyncio, json, logging, sys, time
+from pathlib import Path
+sys.path.insert(0, {src!r})
+from downloader.verify import AudioVerifier
+from utils.mp3 import check_mp3
+from utils.records import TrackResult
+
+paths = sorted(Path({directory!r}).glob("*.mp3"))
+track = TrackResult("u", "u", "Benchmark", "", "", (), "single", False)
+logger = logging.getLogger("verify_benchmark")
+
+async def ticker(stalls, stop):
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        stalls.append(now - last)
+        last = now
+
+async def run():
+    stalls = []
+    stop = asyncio.Event()
+    ticking = asyncio.ensure_future(ticker(stalls, stop))
+    verifier = AudioVerifier({processes}, write_tags={tags}) if {processes} else None
+    if verifier is not None:
+        # Start the workers before timing.
+        await asyncio.gather(*(verifier.verify(paths[0], track, None, logger) for _ in range({processes})))
+        verifier.files = verifier.bytes = 0
+        verifier.cpu_seconds = 0.0
+    started = time.perf_counter()
+    if verifier is None:
+        cpu_seconds, total = 0.0, 0
+        for path in paths:
+            check = check_mp3(str(path), None)
+            cpu_seconds += check.cpu_seconds
+            total += check.size
+            await asyncio.sleep(0)
+    else:
+        await asyncio.gather(*(verifier.verify(path, track, None, logger) for path in paths))
+        cpu_seconds, total = verifier.cpu_seconds, verifier.bytes
+        verifier.close()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticking
+    return elapsed, cpu_seconds, total, max(stalls, default=0.0)
+
+elapsed, cpu_seconds, total, stall = asyncio.run(run())
+print(json.dumps({{
+    "mb_per_second": round(total / 1e6 / elapsed, 1),
+    "mb_per_core_second": round(total / 1e6 / max(cpu_seconds, 1e-9), 1),
+    "max_loop_stall_ms": round(stall * 1000.0, 1),
+}}))
+"""
+
+def measure(directory: Path, processes: int, tags: bool) -> Dict[str, Any]:
+    code = _CHILD.format(src=str(SRC_DIR), directory=str(directory), processes=processes, tags=tags)
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--size", type=int, default=8 * 1024 * 1024, help="Bytes per MP3")
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tags", action="store_true", help="Also rewrite ID3 tags (pool modes)")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+    args = parser.parse_args()
+
+    counts = [1]
+    while counts[-1] * 2 <= args.max_processes:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.max_processes:
+        counts.append(args.max_processes)
+
+    body = _FRAME * max(1, args.size // len(_FRAME))
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        for index in range(args.files):
+            (directory / f"track-{index:05d}.mp3").write_bytes(body)
+        rows = [{"mode": "inline", **measure(directory, 0, False)}]
+        rows += [
+            {"mode": f"pool x{processes}", **measure(directory, processes, args.tags)}
+            for processes in counts
+        ]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{args.files} files of {len(body) / 1e6:.1f} MB, tags={'on' if args.tags else 'off'}")
+    print(f"{'mode':<10} {'MB/s':>9} {'MB/s/core':>10} {'max loop stall':>15}")
+    for row in rows:
+        print(
+            f"{row['mode']:<10} {row['mb_per_second']:>9.1f} {row['mb_per_core_second']:>10.1f} "
+            f"{row['max_loop_stall_ms']:>12.1f} ms"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import logging
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from openpyxl import Workbook
+
+from downloader.exporters import EXPORT_FIELDS, RowWriter
+from utils.records import TrackResult
+
+class ExcelWriter(RowWriter):
+    """
+    Write-only openpyxl workbook: rows are streamed to a temporary file
+    instead of being kept as cell objects until save().
+    """
+
+    label = "Excel"
+
+    def __init__(self, path: Path, logger: logging.Logger, log_level: int = logging.INFO) -> None:
+        super().__init__(path, logger, log_level)
+        self._wb: Optional[Workbook] = None
+        self._ws: Any = None
+
+    def write(self, track: TrackResult, row: Tuple[Any, ...]) -> None:
+        if self._wb is None:
+            self._wb = Workbook(write_only=True)
+            self._ws = self._wb.create_sheet("Tracks")
+            self._ws.append(list(EXPORT_FIELDS))
+        self._ws.append(list(row))
+        self.rows += 1
+
+    def finish(self) -> None:
+        if self._wb is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._produced = True
+        self._wb.save(self.tmp_path)
+        self._wb = None
+
+    def close(self) -> None:
+        if self.rows == 0:
+            self.logger.log(max(self.log_level, logging.WARNING), "No tracks to export to Excel")
+            return
+        super().close()
+
+    def abort(self) -> None:
+        if self._ws is not None and self._wb is not None:
+            # Finish the sheet's temporary file so openpyxl can clean it up.
+            self._ws.close()
+        self._wb = self._ws = None
+        super().abort()
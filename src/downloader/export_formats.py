@@ -0,0 +1,43 @@
+import importlib
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from utils.parser import resolve_project_path
+
+EXPORT_EXECUTORS = ("thread", "process", "sequential")
+
+DEFAULT_OUTPUT_JSON = "data/output_sample.json"
+
+# settings["export"] key -> "module:class" of its writer. A writer's module is
+# imported only when its output is configured, so a run without Excel output
+# never loads openpyxl. output_json is always written.
+EXPORT_FORMATS: Tuple[Tuple[str, str], ...] = (
+    ("output_json", "downloader.exporters:JsonWriter"),
+    ("output_ndjson", "downloader.exporters:NdjsonWriter"),
+    ("output_csv", "downloader.exporters:CsvWriter"),
+    ("output_excel", "downloader.excel_export:ExcelWriter"),
+    ("output_xml", "downloader.exporters:XmlWriter"),
+    ("output_html", "downloader.exporters:HtmlWriter"),
+)
+
+def configured_exports(settings: Dict[str, Any], project_root: Path) -> List[Tuple[str, Path]]:
+    """
+    The (settings key, resolved path) of every output the settings enable, in
+    EXPORT_FORMATS order.
+    """
+    export_cfg = settings.get("export", {})
+    outputs: List[Tuple[str, Path]] = []
+    for key, _ in EXPORT_FORMATS:
+        path = export_cfg.get(key)
+        if key == "output_json":
+            path = path or DEFAULT_OUTPUT_JSON
+        if path:
+            outputs.append((key, resolve_project_path(path, project_root)))
+    return outputs
+
+def load_writer_class(key: str) -> type:
+    """
+    Import and return the writer class registered for ``key``.
+    """
+    module_name, _, class_name = dict(EXPORT_FORMATS)[key].partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
@@ -0,0 +1,573 @@
+import asyncio
+import csv
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from downloader.export_formats import EXPORT_EXECUTORS, configured_exports, load_writer_class
+from utils.records import TrackResult
+
+EXPORT_FIELDS: Tuple[str, ...] = (
+    "url",
+    "result.url",
+    "result.title",
+    "result.thumbnail",
+    "result.duration",
+    "result.medias.url",
+    "result.medias.quality",
+    "result.medias.extension",
+    "result.medias.type",
+    "result.type",
+    "result.error",
+)
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="utf-8">
+  <title>Spotify Tracks Export</title>
+  <style>
+    body { font-family: system-ui, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; }
+    table { border-collapse: collapse; width: 100%; }
+    th, td { border: 1px solid #ccc; padding: 6px 10px; font-size: 14px; }
+    th { background: #f5f5f5; text-align: left; }
+    tr:nth-child(even) { background: #fafafa; }
+  </style>
+</head>
+<body>
+  <h1>Spotify Tracks Export</h1>
+  <table>
+    <thead>
+      <tr>{header_cells}</tr>
+    </thead>
+    <tbody>
+"""
+
+_HTML_FOOT = """    </tbody>
+  </table>
+</body>
+</html>"""
+
+def _flatten_track_for_export(track: TrackResult) -> Tuple[Any, ...]:
+    """
+    The export row of a track: one value per EXPORT_FIELDS entry, in order.
+    Only the first media stream is exported.
+    """
+    media = track.medias[0] if track.medias else None
+    return (
+        track.url,
+        track.result_url,
+        track.title,
+        track.thumbnail,
+        track.duration,
+        media.url if media else "",
+        media.quality if media else "",
+        media.extension if media else "",
+        media.type if media else "",
+        track.type,
+        bool(track.error),
+    )
+
+def _escape_markup(value: Any) -> str:
+    return (
+        str(value)
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+    )
+
+class RowWriter:
+    """
+    Incremental writer for one export format.
+
+    ``write`` receives the track record (for formats that serialize it as
+    is) and its flattened row, a tuple in EXPORT_FIELDS order that is computed
+    once and shared by every format. Files are opened lazily on the first row, so formats that skip
+    empty exports simply never create their file. Output goes to a temporary
+    sibling that replaces ``path`` on close, so readers (and partial exports
+    taken mid-run) never see a half-written file.
+    """
+
+    label = ""
+
+    def __init__(self, path: Path, logger: logging.Logger, log_level: int = logging.INFO) -> None:
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.logger = logger
+        self.log_level = log_level
+        self.rows = 0
+        self._file: Optional[IO[str]] = None
+        self._produced = False
+
+    def _open(self, newline: Optional[str] = None) -> IO[str]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.tmp_path.open("w", encoding="utf-8", newline=newline)
+        self._produced = True
+        return self._file
+
+    def write(self, track: TrackResult, row: Tuple[Any, ...]) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """
+        Write the closing part of the document. Called once, after the last row.
+        """
+
+    def close(self) -> None:
+        try:
+            self.finish()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self._produced:
+            os.replace(self.tmp_path, self.path)
+            self.logger.log(self.log_level, "Exported %s data to %s", self.label, self.path)
+
+    def abort(self) -> None:
+        """
+        Drop the temporary output after a failed export, keeping ``path`` as it was.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._produced:
+            self.tmp_path.unlink(missing_ok=True)
+
+class JsonWriter(RowWriter):
+    """
+    JSON array of the tracks' to_dict() form, byte-for-byte the same layout as
+    ``json.dump([t.to_dict() for t in tracks], f, indent=4, ensure_ascii=False)``.
+    """
+
+    label = "JSON"
+
+    def write(self, track: TrackResult, row: Tuple[Any, ...]) -> None:
+        f = self._file or self._open()
+        body = json.dumps(track.to_dict(), indent=4, ensure_ascii=False).replace("\n", "\n    ")
+        f.write(("[\n    " if self.rows == 0 else ",\n    ") + body)
+        self.rows += 1
+
+    def finish(self) -> None:
+        if self._file is None:
+            self._open().write("[]")
+        else:
+            self._file.write("\n]")
+
+class NdjsonWriter(RowWriter):
+    """
+    One compact JSON track object per line.
+    """
+
+    label = "NDJSON"
+
+    def write(self, track: TrackResult, row: Tuple[Any, ...]) -> None:
+        f = self._file or self._open()
+        f.write(json.dumps(track.to_dict(), ensure_ascii=False, separators=(",", ":")))
+        f.write("\n")
+        self.rows += 1
+
+    def finish(self) -> None:
+        if self._file is None:
+            self._open()
+
+class CsvWriter(RowWriter):
+    label = "CSV"
+
+    def __init__(self, path: Path, logger: logging.Logger, log_level: int = logging.INFO) -> None:
+        super().__init__(path, logger, log_level)
+        self._writer: Any = None
+
+    def _start(self) -> Any:
+        self._writer = csv.writer(self._open(newline=""))
+        self._writer.writerow(EXPORT_FIELDS)
+        return self._writer
+
+    def write(self, track: TrackResult, row: Tuple[Any, ...]) -> None:
+        (self._writer or self._start()).writerow(row)
+        self.rows += 1
+
+    def finish(self) -> None:
+        if self._writer is None:
+            self._start()
+
+class XmlWriter(RowWriter):
+    label = "XML"
+
+    _TAGS = tuple(key.replace(".", "_") for key in EXPORT_FIELDS)
+
+    def write(self, track: TrackResult, row: Tuple[Any, ...]) -> None:
+        f = self._file
+        if f is None:
+            f = self._open()
+            f.write("<?xml version='1.0' encoding='utf-8'?>\n<tracks>")
+        parts = ["<track>"]
+        for tag, value in zip(self._TAGS, row):
+            parts.append(f"<{tag}>{_escape_markup(value)}</{tag}>")
+        parts.append("</track>")
+        f.write("".join(parts))
+        self.rows += 1
+
+    def finish(self) -> None:
+        if self._file is None:
+            self._open().write("<?xml version='1.0' encoding='utf-8'?>\n<tracks />")
+        else:
+            self._file.write("</tracks>")
+
+class HtmlWriter(RowWriter):
+    label = "HTML"
+
+    def write(self, track: TrackResult, row: Tuple[Any, ...]) -> None:
+        f = self._file
+        if f is None:
+            f = self._open()
+            header_cells = "".join(f"<th>{_escape_markup(h)}</th>" for h in EXPORT_FIELDS)
+            f.write(_HTML_HEAD.replace("{header_cells}", header_cells))
+        cells = "".join(f"<td>{_escape_markup(value)}</td>" for value in row)
+        f.write(f"      <tr>{cells}</tr>\n")
+        self.rows += 1
+
+    def finish(self) -> None:
+        if self._file is not None:
+            self._file.write(_HTML_FOOT)
+
+    def close(self) -> None:
+        if self.rows == 0:
+            self.logger.log(max(self.log_level, logging.WARNING), "No tracks to export to HTML")
+            return
+        super().close()
+
+def open_row_writers(
+    settings: Dict[str, Any],
+    project_root: Path,
+    logger: logging.Logger,
+    log_level: int = logging.INFO,
+) -> List[RowWriter]:
+    return [
+        load_writer_class(key)(path, logger, log_level)
+        for key, path in configured_exports(settings, project_root)
+    ]
+
+# Control messages on a writer's row queue; everything else is a batch.
+_END_OF_ROWS = "end"
+_ABORT_EXPORT = "abort"
+_BATCH_ROWS = 64
+# How long an export process may go quiet before the parent checks it is alive.
+_LIVENESS_SECONDS = 1.0
+
+def _drain_rows(writer: RowWriter, rows: Any) -> float:
+    """
+    Consume batches of (track, row) pairs for one writer until _END_OF_ROWS,
+    then close it; _ABORT_EXPORT discards the output instead. Returns the
+    seconds spent writing. After a failure the queue is still drained so the
+    producer never blocks on a full queue; the error is raised at the end.
+    """
+    busy = 0.0
+    error: Optional[BaseException] = None
+    while True:
+        batch = rows.get()
+        if batch == _END_OF_ROWS or batch == _ABORT_EXPORT:
+            break
+        if error is not None:
+            continue
+        started = time.perf_counter()
+        try:
+            for track, row in batch:
+                writer.write(track, row)
+        except BaseException as exc:  # noqa: BLE001
+            error = exc
+        busy += time.perf_counter() - started
+    if error is not None or batch == _ABORT_EXPORT:
+        writer.abort()
+        if error is not None:
+            raise error
+        return busy
+    started = time.perf_counter()
+    try:
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return busy + time.perf_counter() - started
+
+def _drain_rows_in_process(writer: RowWriter, rows: Any, done: Any, level: int) -> None:
+    # A spawned process starts without the parent's logging setup: send the
+    # writer's records back over ``done`` for the parent to emit.
+    writer.logger.setLevel(level)
+    writer.logger.addHandler(QueueHandler(done))
+    writer.logger.propagate = False
+    try:
+        done.put((writer.label, True, _drain_rows(writer, rows)))
+    except BaseException as exc:  # noqa: BLE001
+        done.put((writer.label, False, f"{type(exc).__name__}: {exc}"))
+
+def _feed_writers(tracks: Iterable[TrackResult], puts: List[Callable[[Any], None]]) -> None:
+    """
+    Flatten every track once and put it, in batches, on every writer's queue
+    (one ``put`` per writer). Always ends each queue with _END_OF_ROWS, or
+    _ABORT_EXPORT if iterating ``tracks`` failed.
+    """
+    outcome = _ABORT_EXPORT
+    try:
+        batch: List[Tuple[TrackResult, Tuple[Any, ...]]] = []
+        for track in tracks:
+            batch.append((track, _flatten_track_for_export(track)))
+            if len(batch) >= _BATCH_ROWS:
+                for put in puts:
+                    put(batch)
+                batch = []
+        if batch:
+            for put in puts:
+                put(batch)
+        outcome = _END_OF_ROWS
+    finally:
+        for put in puts:
+            put(outcome)
+
+def _export_threads(
+    tracks: Iterable[TrackResult],
+    writers: List[RowWriter],
+    max_batches: int,
+) -> Dict[str, float]:
+    queues = [queue.Queue(maxsize=max_batches) for _ in writers]
+    with ThreadPoolExecutor(max_workers=len(writers), thread_name_prefix="export") as pool:
+        futures = [pool.submit(_drain_rows, w, q) for w, q in zip(writers, queues)]
+        _feed_writers(tracks, [q.put for q in queues])
+        return {w.label: f.result() for w, f in zip(writers, futures)}
+
+def _export_processes(
+    tracks: Iterable[TrackResult],
+    writers: List[RowWriter],
+    max_batches: int,
+) -> Dict[str, float]:
+    """
+    Like _export_threads, but every format serializes in its own process, so
+    CPU-bound formats (openpyxl, above all) do not share one GIL. Rows are
+    pickled once per format.
+
+    The processes are spawned, not forked: this runs on an executor thread
+    while the event loop and other threads hold locks a fork would copy. A
+    process that dies without reporting (killed, out of memory) fails the
+    export instead of leaving the caller waiting for it.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue(maxsize=max_batches) for _ in writers]
+    done = ctx.Queue()
+    level = logging.getLogger("spotify_downloader").getEffectiveLevel()
+    workers = [
+        ctx.Process(target=_drain_rows_in_process, args=(w, q, done, level), daemon=True)
+        for w, q in zip(writers, queues)
+    ]
+
+    def feeder(rows: Any, worker: Any) -> Callable[[Any], None]:
+        def put(item: Any) -> None:
+            # Rows for a dead process are dropped; its missing outcome
+            # reports the failure.
+            while worker.is_alive():
+                try:
+                    rows.put(item, timeout=_LIVENESS_SECONDS)
+                    return
+                except queue.Full:
+                    pass
+        return put
+
+    for worker in workers:
+        worker.start()
+    outcomes: Dict[str, Tuple[bool, Any]] = {}
+    try:
+        _feed_writers(tracks, [feeder(q, w) for q, w in zip(queues, workers)])
+        silent: List[str] = []
+        while len(outcomes) < len(workers):
+            try:
+                message = done.get(timeout=_LIVENESS_SECONDS)
+            except queue.Empty:
+                # Only give up on a dead process after one more quiet interval,
+                # in case its outcome was still in the pipe when it exited.
+                for writer, worker in zip(writers, workers):
+                    if writer.label in silent and not worker.is_alive():
+                        outcomes[writer.label] = (
+                            False,
+                            f"export process exited with code {worker.exitcode}",
+                        )
+                silent = [
+                    writer.label
+                    for writer, worker in zip(writers, workers)
+                    if writer.label not in outcomes and not worker.is_alive()
+                ]
+                continue
+            if isinstance(message, logging.LogRecord):
+                logging.getLogger(message.name).handle(message)
+                continue
+            label, ok, detail = message
+            outcomes[label] = (ok, detail)
+    finally:
+        for rows, worker in zip(queues, workers):
+            worker.join()
+            if worker.exitcode != 0:
+                # Do not block our own exit flushing rows nobody will read.
+                rows.cancel_join_thread()
+    errors = [f"{label}: {detail}" for label, (ok, detail) in outcomes.items() if not ok]
+    if errors:
+        for writer in writers:
+            if not outcomes[writer.label][0]:
+                # A process that died could not remove its temporary output.
+                writer.tmp_path.unlink(missing_ok=True)
+        raise RuntimeError("export failed (" + "; ".join(errors) + ")")
+    return {w.label: outcomes[w.label][1] for w in writers}
+
+def _export_sequential(tracks: Iterable[TrackResult], writers: List[RowWriter]) -> Dict[str, float]:
+    timings = {w.label: 0.0 for w in writers}
+    try:
+        for track in tracks:
+            row = _flatten_track_for_export(track)
+            for writer in writers:
+                started = time.perf_counter()
+                writer.write(track, row)
+                timings[writer.label] += time.perf_counter() - started
+        for writer in writers:
+            started = time.perf_counter()
+            writer.close()
+            timings[writer.label] += time.perf_counter() - started
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    return timings
+
+def export_tracks(
+    tracks: Iterable[TrackResult],
+    settings: Dict[str, Any],
+    project_root: Path,
+    partial: bool = False,
+) -> Dict[str, float]:
+    """
+    Export track metadata in every format configured under settings["export"].
+
+    Tracks are consumed one at a time: each is flattened once and the row is
+    handed to every format's incremental writer, so the writers keep no
+    per-track state (no ElementTree, HTML string or in-memory workbook). That
+    bounds what exporting adds, not the run's memory: the CLI, pipeline, shard
+    merge and service all export a track list they already hold, because they
+    also need it for the manifest merge and their summaries.
+
+    ``export.executor`` picks how the formats run: "thread" (default) gives
+    each format its own thread, "process" its own process (for CPU-heavy
+    Excel/XML output), "sequential" writes them one after another. Parallel
+    writers are fed through bounded queues of ``export.queue_size`` rows.
+
+    Returns the seconds each format spent writing. ``partial`` exports (taken
+    while downloads are still running) log at DEBUG instead of INFO.
+    """
+    logger = logging.getLogger("spotify_downloader")
+    export_cfg = settings.get("export", {})
+    log_level = logging.DEBUG if partial else logging.INFO
+    writers = open_row_writers(settings, project_root, logger, log_level)
+
+    executor = export_cfg.get("executor", "thread")
+    if executor not in EXPORT_EXECUTORS:
+        raise ValueError(f"export.executor must be one of {EXPORT_EXECUTORS}, got {executor!r}")
+    max_batches = max(1, int(export_cfg.get("queue_size", 256)) // _BATCH_ROWS)
+
+    started = time.perf_counter()
+    if executor == "sequential" or len(writers) < 2:
+        timings = _export_sequential(tracks, writers)
+    elif executor == "process":
+        timings = _export_processes(tracks, writers, max_batches)
+    else:
+        timings = _export_threads(tracks, writers, max_batches)
+    logger.log(
+        log_level,
+        "Export finished in %.3fs (per format: %s)",
+        time.perf_counter() - started,
+        ", ".join(f"{label} {seconds:.3f}s" for label, seconds in timings.items()),
+    )
+    return timings
+
+async def export_tracks_async(
+    tracks: Iterable[TrackResult],
+    settings: Dict[str, Any],
+    project_root: Path,
+    partial: bool = False,
+) -> Dict[str, float]:
+    """
+    export_tracks() on a worker thread, so exporting never blocks the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(export_tracks, tracks, settings, project_root, partial)
+    )
+
+class PartialExporter:
+    """
+    Periodically exports the tracks finished so far while a pipelined run is
+    still downloading (settings["export"]["partial_interval"] seconds; 0
+    disables it). ``snapshot`` is called on the event loop and must return a
+    list of finished tracks that are no longer being modified.
+    """
+
+    def __init__(
+        self,
+        snapshot: Callable[[], List[TrackResult]],
+        settings: Dict[str, Any],
+        project_root: Path,
+        interval: float,
+    ) -> None:
+        self.snapshot = snapshot
+        self.settings = settings
+        self.project_root = project_root
+        self.interval = interval
+        self.exports = 0
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        self._stopping = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        logger = logging.getLogger("spotify_downloader")
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            tracks = self.snapshot()
+            if not tracks:
+                continue
+            try:
+                await export_tracks_async(tracks, self.settings, self.project_root, partial=True)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Partial export failed: %s", exc)
+                continue
+            self.exports += 1
+            logger.info("Partial export written with %d finished tracks", len(tracks))
+
+    async def stop(self) -> None:
+        """
+        Stop the timer and wait for an export in progress to finish, so it
+        cannot race the final export over the same files.
+        """
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+def build_partial_exporter(
+    snapshot: Callable[[], List[TrackResult]],
+    settings: Dict[str, Any],
+    project_root: Path,
+) -> Optional[PartialExporter]:
+    interval = float(settings.get("export", {}).get("partial_interval", 0))
+    if interval <= 0:
+        return None
+    return PartialExporter(snapshot, settings, project_root, interval)
@@ -1,280 +1,495 @@
-thonimport asyncio
-import json
+import asyncio
 import logging
+import os
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import aiohttp
-from openpyxl import Workbook
 
-from utils.parser import safe_filename
+from downloader.exporters import export_tracks_async
+from downloader.segmented import (
+    SegmentedDownloadConfig,
+    build_segmented_config,
+    fetch_segmented,
+    probe_range_support,
+)
+from downloader.thumbnails import ThumbnailStage, build_thumbnail_stage, fetch_thumbnail
+from downloader.verify import AudioVerifier
+from utils.concurrency import AdaptiveConcurrency, request_slot
+from utils.disk_writer import DiskWriter, default_disk_writer
+from utils.error_handler import DownloadError
+from utils.http_session import borrow_session
+from utils.manifest import STATUS_DONE, STATUS_FAILED, RunManifest
+from utils.metrics import METRICS, THROUGHPUT_BUCKETS
+from utils.mp3 import Mp3Check, format_duration
+from utils.parser import parse_content_range, resolve_project_path, safe_filename
+from utils.rate_limit import RateLimiter
+from utils.records import TrackResult
+from utils.retry import (
+    CircuitOpenError,
+    RetryableStatusError,
+    RetryEngine,
+    raise_for_retryable_status,
+    run_with_retry,
+)
+from utils.scheduler import JobSchedule
+from utils.single_flight import REMEMBER_RESULTS, SingleFlight, coalesced
+from utils.worker_pool import run_each
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_DOWNLOAD_TTFB_SECONDS = METRICS.histogram("download_ttfb_seconds")
+_DOWNLOAD_BYTES = METRICS.counter("download_bytes_total")
+_DOWNLOAD_SECONDS = METRICS.histogram("download_seconds")
+_DOWNLOAD_THROUGHPUT = METRICS.histogram(
+    "download_throughput_bytes_per_second", buckets=THROUGHPUT_BUCKETS
+)
+
+@dataclass
+class DownloadOutcome:
+    path: Path
+    size: int
+    sha256: str
+    # Set once the file passed the AudioVerifier.
+    duration: Optional[float] = None
+    audio_sha256: Optional[str] = None
+
+def _track_file_stem(track: TrackResult) -> str:
+    """
+    File name of a track's audio (and cover) without the extension.
+    """
+    return safe_filename(track.title or track.result_url or "spotify_track", fallback="spotify_track")
+
+async def _fetch_to_part_file(
+    session: aiohttp.ClientSession,
+    media_url: str,
+    part_path: Path,
+    timeout: float,
+    logger: logging.Logger,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    writer: Optional[DiskWriter] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Stream media_url into part_path, resuming from the bytes already on disk
+    with a Range request when the server honours it. File writes go through
+    the DiskWriter's thread pool rather than the event loop.
+
+    Returns the expected final size in bytes (None when the server did not
+    announce one) and the SHA-256 of the whole part file. Raises
+    DownloadError for responses that cannot be used.
+    """
+    writer = writer or default_disk_writer()
+    # A second pass is only needed when a stale partial file has to be dropped.
+    for _ in range(2):
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+
+        async with request_slot(limiter, media_url, "download") as slot:
+            started = time.perf_counter()
+            async with session.get(media_url, timeout=timeout, headers=headers) as resp:
+                _DOWNLOAD_TTFB_SECONDS.observe(time.perf_counter() - started)
+                if slot is not None:
+                    slot.observe_status(resp.status)
+                if resp.status == 416 and offset:
+                    logger.warning(
+                        "Server rejected resume of %s at byte %d; restarting",
+                        media_url,
+                        offset,
+                    )
+                    part_path.unlink()
+                    continue
+
+                raise_for_retryable_status(resp, retry)
+
+                if resp.status == 206:
+                    content_range = parse_content_range(resp.headers.get("Content-Range"))
+                    if content_range is None or content_range[0] != offset:
+                        logger.warning("Unexpected Content-Range for %s; restarting", media_url)
+                        part_path.unlink()
+                        continue
+                    logger.debug("Resuming %s from byte %d", media_url, offset)
+                    append = True
+                    expected_size = content_range[2]
+                elif resp.status == 200:
+                    # Full body: either a fresh download or the server ignored Range.
+                    append = False
+                    expected_size = resp.content_length
+                    if resp.headers.get("Content-Encoding"):
+                        # Content-Length counts encoded bytes; nothing to validate against.
+                        expected_size = None
+                else:
+                    raise DownloadError(f"HTTP {resp.status}")
+
+                # Stream-response to disk
+                sink = await writer.open(part_path, append=append, expected_size=expected_size)
+                try:
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        if not chunk:
+                            continue
+                        _DOWNLOAD_BYTES.inc(len(chunk))
+                        if rate_limiter is not None:
+                            await rate_limiter.consume_bytes(len(chunk))
+                        await sink.write(chunk)
+                finally:
+                    await sink.close()
+
+                return expected_size, sink.hexdigest()
+
+    raise DownloadError("could not resume partial download")
 
 async def _download_single_track_audio(
     session: aiohttp.ClientSession,
-    track: Dict[str, Any],
+    track: TrackResult,
     output_dir: Path,
     timeout: float,
     logger: logging.Logger,
-) -> None:
-    result = track.get("result") or {}
-    medias = result.get("medias") or []
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    writer: Optional[DiskWriter] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    segmented: Optional[SegmentedDownloadConfig] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    verify: Optional[Callable[[Path], Awaitable[Optional[Mp3Check]]]] = None,
+) -> Optional[DownloadOutcome]:
+    """
+    Download the first media stream of a track.
 
-    if not medias:
-        logger.warning("No media streams defined for %s", result.get("url"))
-        result["error"] = True
-        return
+    Data is written to ``<file>.part`` and only renamed into place once its size
+    matches what the server announced, so an interrupted run never leaves a
+    truncated file under the final name, and the next attempt resumes from the
+    partial file instead of byte zero. Retried attempts resume the same way.
+    With ``verify`` a complete MP3 must also pass that check (which may tag
+    it) before the rename, so invalid audio never gets the final name either.
 
-    media = medias[0]
-    media_url: str = str(media.get("url", ""))
-    extension: str = media.get("extension", "mp3")
+    With ``segmented`` set and no partial file on disk, servers that accept
+    byte ranges get the file as several parallel range requests instead.
 
-    title = result.get("title") or result.get("url") or "spotify_track"
-    filename = safe_filename(title, fallback="spotify_track") + f".{extension}"
+    Returns the size and checksum of the finished file, or None on failure
+    (result.error is set in that case).
+    """
+    writer = writer or default_disk_writer()
+    if not track.medias:
+        logger.warning("No media streams defined for %s", track.result_url)
+        track.error = True
+        return None
+
+    media = track.medias[0]
+    media_url = media.url
+    extension = media.extension or "mp3"
+
+    title = track.title or track.result_url or "spotify_track"
+    filename = _track_file_stem(track) + f".{extension}"
     file_path = output_dir / filename
+    part_path = file_path.with_name(file_path.name + ".part")
 
     if not media_url:
         logger.warning("Empty media URL for track: %s", title)
-        result["error"] = True
-        return
+        track.error = True
+        return None
 
-    logger.info("Downloading audio for '%s' -> %s", title, file_path)
+    logger.debug("Downloading audio for '%s' -> %s", title, file_path)
+    started = time.perf_counter()
     try:
-        async with session.get(media_url, timeout=timeout) as resp:
-            if resp.status != 200:
-                logger.error(
-                    "Failed to download %s (HTTP %s)",
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        segments = 1
+        if segmented is not None and not part_path.exists():
+            remote_size = await probe_range_support(session, media_url, timeout)
+            if remote_size:
+                segments = segmented.segment_count(remote_size)
+
+        if segments > 1:
+            checksum: Optional[str] = await fetch_segmented(
+                session,
+                media_url,
+                part_path,
+                remote_size,
+                segments,
+                timeout,
+                logger,
+                writer,
+                chunk_size,
+                retry=retry,
+                limiter=limiter,
+                rate_limiter=rate_limiter,
+            )
+            expected_size: Optional[int] = remote_size
+        else:
+            expected_size, checksum = await run_with_retry(
+                retry,
+                media_url,
+                lambda: _fetch_to_part_file(
+                    session,
                     media_url,
-                    resp.status,
-                )
-                result["error"] = True
-                return
-
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # Stream-response to disk
-            with open(file_path, "wb") as f:
-                async for chunk in resp.content.iter_chunked(8192):
-                    if not chunk:
-                        continue
-                    f.write(chunk)
-
-            logger.info("Successfully downloaded '%s'", file_path)
+                    part_path,
+                    timeout,
+                    logger,
+                    retry,
+                    limiter,
+                    writer,
+                    chunk_size,
+                    rate_limiter,
+                ),
+                logger,
+            )
+
+        actual_size = part_path.stat().st_size
+        if expected_size is not None and actual_size != expected_size:
+            logger.error(
+                "Incomplete download of %s: got %d of %d bytes, keeping %s to resume",
+                media_url,
+                actual_size,
+                expected_size,
+                part_path,
+            )
+            track.error = True
+            return None
+        elapsed = time.perf_counter() - started
+
+        check: Optional[Mp3Check] = None
+        if verify is not None and extension.lower() == "mp3":
+            check = await verify(part_path)
+            if check is None:
+                # The verifier has logged it and removed the .part file.
+                track.error = True
+                METRICS.counter("downloads_total", result="invalid").inc()
+                return None
+
+        os.replace(part_path, file_path)
+        _DOWNLOAD_SECONDS.observe(elapsed)
+        if elapsed > 0:
+            _DOWNLOAD_THROUGHPUT.observe(actual_size / elapsed)
+        METRICS.counter("downloads_total", result="ok").inc()
+        logger.debug("Successfully downloaded '%s'", file_path)
+        if check is None:
+            return DownloadOutcome(path=file_path, size=actual_size, sha256=checksum or "")
+        return DownloadOutcome(
+            path=file_path,
+            size=check.size,
+            sha256=check.sha256 or checksum or "",
+            duration=check.duration,
+            audio_sha256=check.audio_sha256,
+        )
+    except (DownloadError, RetryableStatusError, CircuitOpenError) as exc:
+        logger.error("Failed to download %s (%s)", media_url, exc)
+        track.error = True
     except asyncio.TimeoutError:
         logger.error("Timeout downloading %s", media_url)
-        result["error"] = True
+        track.error = True
     except aiohttp.ClientError as exc:
         logger.error("HTTP error downloading %s: %s", media_url, exc)
-        result["error"] = True
+        track.error = True
     except Exception as exc:  # noqa: BLE001
         logger.exception("Unexpected error downloading %s: %s", media_url, exc)
-        result["error"] = True
-
-def _flatten_track_for_export(track: Dict[str, Any]) -> Dict[str, Any]:
-    url = track.get("url", "")
-    result = track.get("result") or {}
-    medias = result.get("medias") or []
-    media: Optional[Dict[str, Any]] = medias[0] if medias else None
-
-    return {
-        "url": url,
-        "result.url": result.get("url", ""),
-        "result.title": result.get("title", ""),
-        "result.thumbnail": result.get("thumbnail", ""),
-        "result.duration": result.get("duration", ""),
-        "result.medias.url": (media or {}).get("url", ""),
-        "result.medias.quality": (media or {}).get("quality", ""),
-        "result.medias.extension": (media or {}).get("extension", ""),
-        "result.medias.type": (media or {}).get("type", ""),
-        "result.type": result.get("type", ""),
-        "result.error": bool(result.get("error", False)),
-    }
-
-def _export_to_json(tracks: List[Dict[str, Any]], json_path: Path, logger: logging.Logger) -> None:
-    json_path.parent.mkdir(parents=True, exist_ok=True)
-    with json_path.open("w", encoding="utf-8") as f:
-        json.dump(tracks, f, indent=4, ensure_ascii=False)
-    logger.info("Exported JSON data to %s", json_path)
-
-def _export_to_csv(tracks: List[Dict[str, Any]], csv_path: Path, logger: logging.Logger) -> None:
-    import csv
-
-    flat_rows = [_flatten_track_for_export(t) for t in tracks]
-    fieldnames = list(flat_rows[0].keys()) if flat_rows else []
-
-    csv_path.parent.mkdir(parents=True, exist_ok=True)
-    with csv_path.open("w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(flat_rows)
-    logger.info("Exported CSV data to %s", csv_path)
-
-def _export_to_excel(tracks: List[Dict[str, Any]], xlsx_path: Path, logger: logging.Logger) -> None:
-    flat_rows = [_flatten_track_for_export(t) for t in tracks]
-    if not flat_rows:
-        logger.warning("No tracks to export to Excel")
-        return
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Tracks"
-
-    headers = list(flat_rows[0].keys())
-    ws.append(headers)
-
-    for row in flat_rows:
-        ws.append([row.get(h, "") for h in headers])
-
-    xlsx_path.parent.mkdir(parents=True, exist_ok=True)
-    wb.save(xlsx_path)
-    logger.info("Exported Excel data to %s", xlsx_path)
-
-def _export_to_xml(tracks: List[Dict[str, Any]], xml_path: Path, logger: logging.Logger) -> None:
-    from xml.etree.ElementTree import Element, SubElement, ElementTree
-
-    root = Element("tracks")
-    for t in tracks:
-        flat = _flatten_track_for_export(t)
-        track_el = SubElement(root, "track")
-        for key, value in flat.items():
-            child = SubElement(track_el, key.replace(".", "_"))
-            child.text = str(value)
-
-    xml_path.parent.mkdir(parents=True, exist_ok=True)
-    tree = ElementTree(root)
-    tree.write(xml_path, encoding="utf-8", xml_declaration=True)
-    logger.info("Exported XML data to %s", xml_path)
-
-def _export_to_html(tracks: List[Dict[str, Any]], html_path: Path, logger: logging.Logger) -> None:
-    flat_rows = [_flatten_track_for_export(t) for t in tracks]
-    if not flat_rows:
-        logger.warning("No tracks to export to HTML")
-        return
-
-    headers = list(flat_rows[0].keys())
-
-    def escape(s: Any) -> str:
-        return (
-            str(s)
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-        )
+        track.error = True
 
-    rows_html = []
-    for row in flat_rows:
-        cells = "".join(f"<td>{escape(row.get(h, ''))}</td>" for h in headers)
-        rows_html.append(f"<tr>{cells}</tr>")
-
-    header_cells = "".join(f"<th>{escape(h)}</th>" for h in headers)
-    table_html = f"""
-<!DOCTYPE html>
-<html lang="en">
-<head>
-  <meta charset="utf-8">
-  <title>Spotify Tracks Export</title>
-  <style>
-    body {{ font-family: system-ui, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; }}
-    table {{ border-collapse: collapse; width: 100%; }}
-    th, td {{ border: 1px solid #ccc; padding: 6px 10px; font-size: 14px; }}
-    th {{ background: #f5f5f5; text-align: left; }}
-    tr:nth-child(even) {{ background: #fafafa; }}
-  </style>
-</head>
-<body>
-  <h1>Spotify Tracks Export</h1>
-  <table>
-    <thead>
-      <tr>{header_cells}</tr>
-    </thead>
-    <tbody>
-      {''.join(rows_html)}
-    </tbody>
-  </table>
-</body>
-</html>
-""".strip()
-
-    html_path.parent.mkdir(parents=True, exist_ok=True)
-    with html_path.open("w", encoding="utf-8") as f:
-        f.write(table_html)
-    logger.info("Exported HTML data to %s", html_path)
+    METRICS.counter("downloads_total", result="failed").inc()
+    return None
 
-async def export_tracks_with_downloads(
-    tracks: List[Dict[str, Any]],
+async def _download_and_checkpoint(
+    session: aiohttp.ClientSession,
+    track: TrackResult,
+    output_dir: Path,
+    timeout: float,
+    logger: logging.Logger,
+    manifest: Optional[RunManifest] = None,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    writer: Optional[DiskWriter] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    segmented: Optional[SegmentedDownloadConfig] = None,
+    flights: Optional[SingleFlight[Optional[DownloadOutcome]]] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    on_track: Optional[Callable[[TrackResult], None]] = None,
+    thumbnails: Optional[ThumbnailStage] = None,
+    verifier: Optional[AudioVerifier] = None,
+) -> None:
+    """
+    Download one track and checkpoint the outcome to ``manifest``. ``on_track``
+    is called with the finished track (track.error set on failure). With
+    ``thumbnails`` the track's cover is fetched alongside its audio. With a
+    ``verifier`` the finished MP3 is checked (and tagged) before it counts as
+    done, and its real duration is filled in.
+    """
+    media_url = track.medias[0].url if track.medias else ""
+
+    async def fetch() -> Optional[DownloadOutcome]:
+        cover_fetch: Optional["asyncio.Future[Optional[Path]]"] = None
+        if thumbnails is not None and track.thumbnail:
+            cover_fetch = asyncio.ensure_future(
+                fetch_thumbnail(
+                    session,
+                    track,
+                    _track_file_stem(track),
+                    thumbnails,
+                    timeout,
+                    logger,
+                    retry=retry,
+                    limiter=limiter,
+                    writer=writer,
+                    rate_limiter=rate_limiter,
+                )
+            )
+
+        async def check(part_path: Path) -> Optional[Mp3Check]:
+            # Tagging embeds the cover, so wait for it first.
+            cover = await cover_fetch if cover_fetch is not None else None
+            return await verifier.verify(part_path, track, cover, logger)
+
+        try:
+            outcome = await _download_single_track_audio(
+                session=session,
+                track=track,
+                output_dir=output_dir,
+                timeout=timeout,
+                logger=logger,
+                retry=retry,
+                limiter=limiter,
+                writer=writer,
+                chunk_size=chunk_size,
+                segmented=segmented,
+                rate_limiter=rate_limiter,
+                verify=check if verifier is not None else None,
+            )
+            if cover_fetch is not None:
+                await cover_fetch
+        finally:
+            if cover_fetch is not None and not cover_fetch.done():
+                cover_fetch.cancel()
+        if outcome is not None and outcome.audio_sha256 and manifest is not None:
+            duplicate_of = manifest.find_audio(outcome.audio_sha256, outcome.path)
+            if duplicate_of is not None and verifier is not None:
+                METRICS.counter("duplicate_audio_total").inc()
+                verifier.duplicates += 1
+                logger.debug("Audio of %s is identical to %s", outcome.path, duplicate_of)
+        return outcome
+
+    # Aliases of one track resolve to the same media URL and output file;
+    # coalescing keeps them from downloading (and verifying) it twice. The
+    # directory is part of the key because service jobs can each pick their own.
+    outcome = await coalesced(flights if media_url else None, (str(output_dir), media_url), fetch)
+    if outcome is None:
+        # Also marks aliases that shared another URL's failed download.
+        track.error = True
+    elif outcome.duration is not None:
+        track.duration = format_duration(outcome.duration)
+    METRICS.counter("tracks_processed_total", result="failed" if outcome is None else "ok").inc()
+    if manifest is not None:
+        if outcome is None or track.error:
+            manifest.record(track, STATUS_FAILED)
+        else:
+            manifest.record(
+                track,
+                STATUS_DONE,
+                size=outcome.size,
+                sha256=outcome.sha256,
+                file_path=outcome.path,
+                audio_sha256=outcome.audio_sha256,
+            )
+    if on_track is not None:
+        on_track(track)
+
+def download_chunk_size(settings: Dict[str, Any]) -> int:
+    return max(1024, int(settings.get("disk_writer", {}).get("chunk_size", DEFAULT_CHUNK_SIZE)))
+
+def resolve_audio_output_dir(settings: Dict[str, Any], project_root: Path) -> Path:
+    export_cfg = settings.get("export", {})
+    return resolve_project_path(export_cfg.get("audio_output_dir", "data/downloads"), project_root)
+
+async def download_tracks_audio(
+    tracks: List[TrackResult],
     settings: Dict[str, Any],
     project_root: Path,
+    manifest: Optional[RunManifest] = None,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    writer: Optional[DiskWriter] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    schedule: Optional[JobSchedule] = None,
+    on_track: Optional[Callable[[TrackResult], None]] = None,
+    verifier: Optional[AudioVerifier] = None,
+    flights: Optional[SingleFlight[Optional[DownloadOutcome]]] = None,
 ) -> None:
     """
-    Download audio files for all tracks (where possible) and export metadata
-    in multiple formats.
+    Download audio files for all tracks (where possible), marking failures
+    with result.error = True. Each finished track is checkpointed to the
+    manifest when one is given and passed to ``on_track``. Pass the shared
+    ``session`` to reuse its connection pool; otherwise a session is opened
+    for this call. Downloaded bytes count against the bandwidth caps of
+    ``rate_limiter``. With a ``schedule`` tracks are handed to the workers in
+    its priority/fair-share order instead of input order. With
+    settings["thumbnails"] enabled the same workers also fetch the covers.
+    With a ``verifier`` every MP3 is checked in its process pool before the
+    track counts as downloaded. Pass ``flights`` to coalesce downloads with
+    other calls running at the same time (the job service's concurrent jobs);
+    otherwise only the aliases within ``tracks`` share a download.
     """
     logger = logging.getLogger("spotify_downloader")
     http_timeout = float(settings.get("http_timeout", 30.0))
     concurrent_downloads = int(settings.get("concurrent_downloads", 5))
-
-    export_cfg = settings.get("export", {})
-    output_dir = Path(export_cfg.get("audio_output_dir", "data/downloads"))
-    if not output_dir.is_absolute():
-        output_dir = project_root / output_dir
-
-    export_json_path = export_cfg.get("output_json", "data/output_sample.json")
-    export_csv_path = export_cfg.get("output_csv")
-    export_excel_path = export_cfg.get("output_excel")
-    export_xml_path = export_cfg.get("output_xml")
-    export_html_path = export_cfg.get("output_html")
-
-    if not Path(export_json_path).is_absolute():
-        export_json_path = project_root / export_json_path
-    else:
-        export_json_path = Path(export_json_path)
-
-    export_paths = {
-        "csv": Path(export_csv_path) if export_csv_path else None,
-        "excel": Path(export_excel_path) if export_excel_path else None,
-        "xml": Path(export_xml_path) if export_xml_path else None,
-        "html": Path(export_html_path) if export_html_path else None,
-    }
+    chunk_size = download_chunk_size(settings)
+    segmented = build_segmented_config(settings)
+    output_dir = resolve_audio_output_dir(settings, project_root)
+    thumbnails = build_thumbnail_stage(settings, project_root)
+    if flights is None:
+        flights = SingleFlight(remember=REMEMBER_RESULTS)
+    shared_before = flights.shared
 
     logger.info("Preparing to download audio files to %s", output_dir)
 
-    semaphore = asyncio.Semaphore(concurrent_downloads)
-    async with aiohttp.ClientSession() as session:
-        async def bound_download(t: Dict[str, Any]) -> None:
-            async with semaphore:
-                await _download_single_track_audio(
-                    session=session,
-                    track=t,
-                    output_dir=output_dir,
-                    timeout=http_timeout,
-                    logger=logger,
-                )
+    async with borrow_session(session, settings) as http:
+        async def download(t: TrackResult) -> None:
+            await _download_and_checkpoint(
+                session=http,
+                track=t,
+                output_dir=output_dir,
+                timeout=http_timeout,
+                logger=logger,
+                manifest=manifest,
+                retry=retry,
+                limiter=limiter,
+                writer=writer,
+                chunk_size=chunk_size,
+                segmented=segmented,
+                flights=flights,
+                rate_limiter=rate_limiter,
+                on_track=on_track,
+                thumbnails=thumbnails,
+                verifier=verifier,
+            )
+
+        async def scheduled_download(t: TrackResult) -> None:
+            with schedule.running(t.url):
+                await download(t)
+
+        workers = limiter.max_limit if limiter is not None else concurrent_downloads
+        if schedule is None:
+            await run_each(download, tracks, workers, name="download")
+        else:
+            ordered = schedule.order(tracks, lambda t: t.url)
+            await run_each(scheduled_download, ordered, workers, name="download")
+
+    if flights.shared > shared_before:
+        logger.info("Reused downloads for %d alias URLs", flights.shared - shared_before)
+    if thumbnails is not None:
+        thumbnails.log_summary(logger)
 
-        download_tasks = [bound_download(t) for t in tracks]
-        await asyncio.gather(*download_tasks)
-
-    # Export metadata
-    _export_to_json(tracks, export_json_path, logger)
-
-    if export_paths["csv"] is not None:
-        csv_path = export_paths["csv"]
-        if not csv_path.is_absolute():
-            csv_path = project_root / csv_path
-        _export_to_csv(tracks, csv_path, logger)
-
-    if export_paths["excel"] is not None:
-        xlsx_path = export_paths["excel"]
-        if not xlsx_path.is_absolute():
-            xlsx_path = project_root / xlsx_path
-        _export_to_excel(tracks, xlsx_path, logger)
-
-    if export_paths["xml"] is not None:
-        xml_path = export_paths["xml"]
-        if not xml_path.is_absolute():
-            xml_path = project_root / xml_path
-        _export_to_xml(tracks, xml_path, logger)
-
-    if export_paths["html"] is not None:
-        html_path = export_paths["html"]
-        if not html_path.is_absolute():
-            html_path = project_root / html_path
-        _export_to_html(tracks, html_path, logger)
\ No newline at end of file
+async def export_tracks_with_downloads(
+    tracks: List[TrackResult],
+    settings: Dict[str, Any],
+    project_root: Path,
+    manifest: Optional[RunManifest] = None,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+) -> None:
+    """
+    Download audio files for all tracks (where possible) and export metadata
+    in multiple formats.
+    """
+    await download_tracks_audio(tracks, settings, project_root, manifest, retry, limiter)
+    await export_tracks_async(tracks, settings, project_root)
@@ -0,0 +1,191 @@
+import logging
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import aiohttp
+
+from downloader.exporters import build_partial_exporter
+from downloader.mp3_exporter import (
+    DownloadOutcome,
+    _download_and_checkpoint,
+    download_chunk_size,
+    resolve_audio_output_dir,
+)
+from downloader.segmented import build_segmented_config
+from downloader.spotify_handler import _process_single_track, build_endpoints
+from downloader.thumbnails import build_thumbnail_stage
+from downloader.verify import AudioVerifier
+from utils.concurrency import AdaptiveConcurrency
+from utils.disk_writer import DiskWriter
+from utils.http_session import borrow_session
+from utils.manifest import RunManifest
+from utils.metadata_cache import MetadataCache
+from utils.rate_limit import RateLimiter
+from utils.records import TrackResult
+from utils.retry import RetryEngine
+from utils.scheduler import JobSchedule
+from utils.single_flight import REMEMBER_RESULTS, SingleFlight
+from utils.worker_pool import iter_results
+
+async def _numbered(urls: AsyncIterable[str]) -> AsyncIterator[Tuple[int, str]]:
+    index = 0
+    async for url in urls:
+        yield index, url
+        index += 1
+
+async def run_streaming_pipeline(
+    urls: Union[Iterable[str], AsyncIterable[str]],
+    settings: Dict[str, Any],
+    project_root: Path,
+    cache: Optional[MetadataCache] = None,
+    manifest: Optional[RunManifest] = None,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    writer: Optional[DiskWriter] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    schedule: Optional[JobSchedule] = None,
+    on_track: Optional[Callable[[TrackResult], None]] = None,
+    verifier: Optional[AudioVerifier] = None,
+    download_flights: Optional[SingleFlight[Optional[DownloadOutcome]]] = None,
+) -> List[TrackResult]:
+    """
+    Fetch metadata and download audio as one overlapped pipeline.
+
+    Metadata workers (``concurrent_requests``) hand every processed track to the
+    download workers (``concurrent_downloads``) as soon as it is ready, through
+    a bounded window. When downloads fall behind, the full window blocks the
+    metadata workers, so memory stays bounded by ``pipeline.queue_size``
+    instead of growing with the input. With ``export.partial_interval`` set,
+    the tracks finished so far are exported every that many seconds. With a
+    ``schedule`` URLs enter the pipeline in its priority/fair-share order.
+    ``on_track`` is called with every track once its download (and, with
+    settings["thumbnails"] enabled, its cover) has finished. With a
+    ``verifier`` downloads are checked before they count as done. Pass
+    ``download_flights`` to share downloads with concurrent callers, as in
+    download_tracks_audio().
+
+    ``urls`` may be a lazy (or async) iterable: URLs are pulled only as the
+    metadata workers have room, so a huge input is never materialized here.
+
+    Returns the tracks in input order, shaped like fetch_tracks_metadata().
+    """
+    logger = logging.getLogger("spotify_downloader")
+    http_timeout = float(settings.get("http_timeout", 30.0))
+    concurrent_requests = max(1, int(settings.get("concurrent_requests", 10)))
+    concurrent_downloads = max(1, int(settings.get("concurrent_downloads", 5)))
+    if limiter is not None:
+        # The adaptive controller decides how many of these workers may be
+        # in a request at once.
+        concurrent_requests = concurrent_downloads = limiter.max_limit
+    pipeline_cfg = settings.get("pipeline", {})
+    queue_size = max(1, int(pipeline_cfg.get("queue_size", concurrent_downloads * 4)))
+    chunk_size = download_chunk_size(settings)
+    segmented = build_segmented_config(settings)
+    output_dir = resolve_audio_output_dir(settings, project_root)
+    thumbnails = build_thumbnail_stage(settings, project_root)
+    endpoints = build_endpoints(settings)
+
+    logger.info(
+        "Streaming pipeline: metadata concurrency=%s, download concurrency=%s, queue size=%s",
+        concurrent_requests,
+        concurrent_downloads,
+        queue_size,
+    )
+
+    results: Dict[int, TrackResult] = {}
+    metadata_flights: SingleFlight[Dict[str, Any]] = SingleFlight(remember=REMEMBER_RESULTS)
+    if download_flights is None:
+        download_flights = SingleFlight(remember=REMEMBER_RESULTS)
+    downloads_shared_before = download_flights.shared
+    # Entries are only filled in once their download has finished, so the
+    # snapshot never hands the export thread a track that is still changing.
+    partial_exporter = build_partial_exporter(
+        lambda: [results[i] for i in sorted(results)], settings, project_root
+    )
+
+    async with borrow_session(session, settings) as http:
+        async def fetch(entry: Tuple[int, str]) -> Tuple[int, TrackResult]:
+            index, url = entry
+            return index, await _process_single_track(
+                http,
+                url,
+                http_timeout,
+                logger,
+                cache=cache,
+                retry=retry,
+                limiter=limiter,
+                flights=metadata_flights,
+                endpoints=endpoints,
+            )
+
+        async def download(entry: Tuple[int, TrackResult]) -> Tuple[int, TrackResult]:
+            index, track = entry
+            if schedule is not None:
+                with schedule.running(track.url):
+                    await download_track(track)
+            else:
+                await download_track(track)
+            return entry
+
+        async def download_track(track: TrackResult) -> None:
+            await _download_and_checkpoint(
+                session=http,
+                track=track,
+                output_dir=output_dir,
+                timeout=http_timeout,
+                logger=logger,
+                manifest=manifest,
+                retry=retry,
+                limiter=limiter,
+                writer=writer,
+                chunk_size=chunk_size,
+                segmented=segmented,
+                flights=download_flights,
+                rate_limiter=rate_limiter,
+                on_track=on_track,
+                thumbnails=thumbnails,
+                verifier=verifier,
+            )
+
+        # The window of each pool is the bounded hand-off between the stages:
+        # once queue_size fetched tracks are waiting for a download worker,
+        # the metadata workers stop pulling new URLs.
+        intake: Union[Iterable[Tuple[int, str]], AsyncIterable[Tuple[int, str]]]
+        if hasattr(urls, "__aiter__"):
+            intake = _numbered(urls)  # type: ignore[arg-type]
+        else:
+            intake = enumerate(urls)  # type: ignore[arg-type]
+            if schedule is not None:
+                intake = schedule.order(intake, lambda entry: entry[1])
+        fetched = iter_results(
+            fetch, intake, concurrent_requests, ordered=False, window=queue_size, name="metadata"
+        )
+        downloaded = iter_results(
+            download,
+            fetched,
+            concurrent_downloads,
+            ordered=False,
+            window=queue_size,
+            name="download",
+        )
+        if partial_exporter is not None:
+            partial_exporter.start()
+        try:
+            async for index, track in downloaded:
+                results[index] = track
+        finally:
+            if partial_exporter is not None:
+                await partial_exporter.stop()
+
+    downloads_shared = download_flights.shared - downloads_shared_before
+    if metadata_flights.shared or downloads_shared:
+        logger.info(
+            "Alias URLs reused %d metadata lookups and %d downloads",
+            metadata_flights.shared,
+            downloads_shared,
+        )
+    if thumbnails is not None:
+        thumbnails.log_summary(logger)
+
+    return [results[i] for i in sorted(results)]
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from utils.concurrency import AdaptiveConcurrency, request_slot
+from utils.disk_writer import DiskWriter
+from utils.error_handler import DownloadError
+from utils.metrics import METRICS
+from utils.parser import parse_content_range
+from utils.rate_limit import RateLimiter
+from utils.retry import RetryEngine, raise_for_retryable_status, run_with_retry
+
+# Same series as the single-stream download path.
+_DOWNLOAD_TTFB_SECONDS = METRICS.histogram("download_ttfb_seconds")
+_DOWNLOAD_BYTES = METRICS.counter("download_bytes_total")
+
+@dataclass
+class SegmentedDownloadConfig:
+    """
+    Opt-in multi-connection download settings (settings["segmented_download"]).
+
+    A file is split into at most ``max_segments`` byte ranges of at least
+    ``min_segment_size`` bytes. So that all concurrent downloads together stay
+    within ``connection_budget`` connections, each file also gets at most
+    ``connection_budget // concurrent_downloads`` segments.
+    """
+
+    min_segment_size: int = 4 * 1024 * 1024
+    max_segments: int = 8
+    connection_budget: int = 32
+    concurrent_downloads: int = 5
+
+    def segment_count(self, size: int) -> int:
+        per_download_budget = max(1, self.connection_budget // max(1, self.concurrent_downloads))
+        by_size = size // max(1, self.min_segment_size)
+        return max(1, min(self.max_segments, by_size, per_download_budget))
+
+def build_segmented_config(settings: Dict[str, Any]) -> Optional[SegmentedDownloadConfig]:
+    cfg = settings.get("segmented_download", {})
+    if not cfg.get("enabled", False):
+        return None
+    http_cfg = settings.get("http", {})
+    return SegmentedDownloadConfig(
+        min_segment_size=int(cfg.get("min_segment_size", 4 * 1024 * 1024)),
+        max_segments=int(cfg.get("max_segments", 8)),
+        connection_budget=int(cfg.get("connection_budget", http_cfg.get("connection_limit", 32))),
+        concurrent_downloads=int(settings.get("concurrent_downloads", 5)),
+    )
+
+def split_ranges(size: int, segments: int) -> List[Tuple[int, int]]:
+    """
+    Split ``size`` bytes into ``segments`` contiguous inclusive byte ranges.
+    """
+    step, remainder = divmod(size, segments)
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    for i in range(segments):
+        length = step + (1 if i < remainder else 0)
+        ranges.append((start, start + length - 1))
+        start += length
+    return ranges
+
+async def probe_range_support(
+    session: aiohttp.ClientSession,
+    media_url: str,
+    timeout: float,
+) -> Optional[int]:
+    """
+    Return the resource size when the server advertises byte-range support
+    (``Accept-Ranges: bytes`` and a Content-Length), otherwise None.
+    """
+    try:
+        async with session.head(media_url, timeout=timeout, allow_redirects=True) as resp:
+            if resp.status != 200:
+                return None
+            if resp.headers.get("Accept-Ranges", "").lower() != "bytes":
+                return None
+            if resp.headers.get("Content-Encoding"):
+                return None
+            return resp.content_length
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        return None
+
+async def _fetch_segment(
+    session: aiohttp.ClientSession,
+    media_url: str,
+    part_path: Path,
+    byte_range: Tuple[int, int],
+    timeout: float,
+    retry: Optional[RetryEngine],
+    limiter: Optional[AdaptiveConcurrency],
+    writer: DiskWriter,
+    chunk_size: int,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> None:
+    start, end = byte_range
+    headers = {"Range": f"bytes={start}-{end}"}
+
+    async with request_slot(limiter, media_url, "download") as slot:
+        started = time.perf_counter()
+        async with session.get(media_url, timeout=timeout, headers=headers) as resp:
+            _DOWNLOAD_TTFB_SECONDS.observe(time.perf_counter() - started)
+            if slot is not None:
+                slot.observe_status(resp.status)
+            raise_for_retryable_status(resp, retry)
+            if resp.status != 206:
+                raise DownloadError(f"HTTP {resp.status} for range {start}-{end}")
+            content_range = parse_content_range(resp.headers.get("Content-Range"))
+            if content_range is None or content_range[:2] != (start, end):
+                raise DownloadError(f"unexpected Content-Range for range {start}-{end}")
+
+            sink = await writer.open_at(part_path, start)
+            try:
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    if not chunk:
+                        continue
+                    _DOWNLOAD_BYTES.inc(len(chunk))
+                    if rate_limiter is not None:
+                        await rate_limiter.consume_bytes(len(chunk))
+                    await sink.write(chunk)
+            finally:
+                await sink.close()
+
+    written = sink.position - start
+    if written != end - start + 1:
+        raise DownloadError(f"range {start}-{end} returned {written} bytes")
+
+async def fetch_segmented(
+    session: aiohttp.ClientSession,
+    media_url: str,
+    part_path: Path,
+    size: int,
+    segments: int,
+    timeout: float,
+    logger: logging.Logger,
+    writer: DiskWriter,
+    chunk_size: int,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> str:
+    """
+    Download ``size`` bytes of media_url into part_path as ``segments``
+    parallel byte-range requests, each written at its own offset of one
+    preallocated file. Each segment is retried on its own.
+
+    Returns the SHA-256 of the assembled file. On failure the part file is
+    removed (it has holes, so it cannot be resumed as a single stream) and
+    the error is re-raised.
+    """
+    ranges = split_ranges(size, segments)
+    logger.debug("Downloading %s in %d segments (%d bytes)", media_url, len(ranges), size)
+
+    await writer.allocate(part_path, size)
+    tasks = [
+        asyncio.ensure_future(
+            run_with_retry(
+                retry,
+                media_url,
+                lambda r=r: _fetch_segment(
+                    session,
+                    media_url,
+                    part_path,
+                    r,
+                    timeout,
+                    retry,
+                    limiter,
+                    writer,
+                    chunk_size,
+                    rate_limiter,
+                ),
+                logger,
+            )
+        )
+        for r in ranges
+    ]
+    try:
+        await asyncio.gather(*tasks)
+        actual_size = part_path.stat().st_size
+        if actual_size != size:
+            raise DownloadError(f"assembled file is {actual_size} bytes, expected {size}")
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        part_path.unlink(missing_ok=True)
+        raise
+
+    return await writer.sha256(part_path)
@@ -0,0 +1,658 @@
+import asyncio
+import json
+import logging
+import signal
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+from downloader.export_formats import DEFAULT_OUTPUT_JSON, EXPORT_FORMATS
+from downloader.exporters import export_tracks_async
+from downloader.mp3_exporter import DownloadOutcome, download_tracks_audio
+from downloader.pipeline import run_streaming_pipeline
+from downloader.spotify_handler import build_endpoints, fetch_tracks_metadata
+from downloader.verify import build_audio_verifier
+from utils.concurrency import build_adaptive_concurrency
+from utils.disk_writer import build_disk_writer
+from utils.http_session import create_session
+from utils.manifest import open_manifest
+from utils.metadata_cache import open_metadata_cache
+from utils.metrics import METRICS, build_loop_lag_monitor, build_metrics_writer
+from utils.parser import InputEntry, merge_settings, parse_input_entries, resolve_project_path
+from utils.rate_limit import build_rate_limiter
+from utils.records import TrackResult
+from utils.retry import build_retry_engine
+from utils.scheduler import build_job_schedule, job_context
+from utils.single_flight import SingleFlight
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+_FINISHED = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Settings blocks that configure the resources every job shares; jobs cannot
+# override them.
+SHARED_SETTINGS = (
+    "http",
+    "adaptive_concurrency",
+    "rate_limit",
+    "disk_writer",
+    "verify",
+    "endpoints",
+    "metadata_cache",
+    "manifest",
+    "retry",
+    "input",
+    "logging",
+    "metrics",
+    "sharding",
+    "service",
+)
+# Keys of otherwise per-job blocks that stay shared as well.
+SHARED_SUBSETTINGS = (("thumbnails", "cache_dir"),)
+# Per-job settings naming files or directories the job writes; a job may only
+# point them inside service.jobs_dir.
+JOB_PATH_SETTINGS = tuple(("export", key) for key, _ in EXPORT_FORMATS) + (
+    ("export", "audio_output_dir"),
+    ("thumbnails", "output_dir"),
+)
+
+_JOBS_RUNNING = METRICS.gauge("service_jobs", state=JOB_RUNNING)
+_JOBS_QUEUED = METRICS.gauge("service_jobs", state=JOB_QUEUED)
+
+@dataclass
+class ServiceConfig:
+    """
+    settings["service"]:
+
+    - host, port: where the HTTP API listens (``--serve HOST:PORT`` overrides).
+    - max_concurrent_jobs: jobs that run at once; later submissions queue.
+    - drain_timeout: seconds a shutdown waits for accepted jobs to finish
+      before cancelling them.
+    - history: finished jobs kept for status queries.
+    - max_job_events: progress events kept per job; older ones are dropped
+      (the job's counters still cover them).
+    - jobs_dir: every job exports to its own ``<jobs_dir>/<job id>/``
+      directory, unless the job's settings name export paths explicitly.
+    - max_request_bytes: largest accepted job submission.
+    """
+    host: str = "127.0.0.1"
+    port: int = 8787
+    max_concurrent_jobs: int = 2
+    drain_timeout: float = 60.0
+    history: int = 100
+    max_job_events: int = 1000
+    jobs_dir: Path = Path("data/jobs")
+    max_request_bytes: int = 16 * 1024 * 1024
+
+def build_service_config(
+    settings: Dict[str, Any],
+    project_root: Path,
+    bind: Optional[str] = None,
+) -> ServiceConfig:
+    cfg = settings.get("service", {})
+    host = str(cfg.get("host", "127.0.0.1"))
+    port = int(cfg.get("port", 8787))
+    if bind:
+        bind_host, sep, bind_port = bind.rpartition(":")
+        if sep:
+            host, port = bind_host or host, int(bind_port)
+        elif bind.isdigit():
+            port = int(bind)
+        else:
+            host = bind
+    return ServiceConfig(
+        host=host,
+        port=port,
+        max_concurrent_jobs=max(1, int(cfg.get("max_concurrent_jobs", 2))),
+        drain_timeout=max(0.0, float(cfg.get("drain_timeout", 60.0))),
+        history=max(1, int(cfg.get("history", 100))),
+        max_job_events=max(1, int(cfg.get("max_job_events", 1000))),
+        jobs_dir=resolve_project_path(cfg.get("jobs_dir", "data/jobs"), project_root),
+        max_request_bytes=max(1024, int(cfg.get("max_request_bytes", 16 * 1024 * 1024))),
+    )
+
+class Job:
+    """
+    One submitted batch of URLs. Its latest ``max_events`` progress events
+    are kept until the job leaves the service's history, so any number of
+    clients can follow it from the oldest kept event (or resume after a given
+    one).
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        entries: List[InputEntry],
+        settings: Dict[str, Any],
+        exports: Dict[str, str],
+        pipeline: bool,
+        incremental: bool,
+        max_events: int = 1000,
+    ) -> None:
+        self.id = job_id
+        self.entries = entries
+        self.settings = settings
+        self.exports = exports
+        self.pipeline = pipeline
+        self.incremental = incremental
+        self.status = JOB_QUEUED
+        self.total = len(entries)
+        self.skipped = 0
+        self.done = 0
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self.dropped_events = 0
+        self.task: Optional["asyncio.Task[None]"] = None
+        self._changed = asyncio.Event()
+        self.emit("queued", total=self.total)
+
+    def emit(self, event: str, **fields: Any) -> None:
+        if len(self.events) == self.events.maxlen:
+            self.dropped_events += 1
+        self.events.append({"event": event, "job": self.id, **fields})
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def start(self, total: int, skipped: int) -> None:
+        self.status = JOB_RUNNING
+        self.started = time.time()
+        self.total = total
+        self.skipped = skipped
+        self.emit("started", total=total, skipped=skipped)
+
+    def track_finished(self, track: TrackResult) -> None:
+        self.done += 1
+        if track.error:
+            self.failed += 1
+        self.emit(
+            "track",
+            url=track.url,
+            title=track.title,
+            error=track.error,
+            done=self.done,
+            failed=self.failed,
+            total=self.total,
+        )
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+        self.emit("finished", **self.summary())
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started is not None:
+            elapsed = round((self.finished or time.time()) - self.started, 3)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "skipped": self.skipped,
+            "done": self.done,
+            "failed": self.failed,
+            "seconds": elapsed,
+            "error": self.error,
+            "exports": self.exports if self.status == JOB_DONE else {},
+        }
+
+    async def follow(self, after: int = -1) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the job's events, each with its sequence number ("seq"),
+        starting after number ``after`` (or at the oldest kept event), until
+        the job has finished.
+        """
+        position = max(0, after + 1)
+        while True:
+            while True:
+                # Events may have been dropped while the client was reading.
+                position = max(position, self.dropped_events)
+                if position >= self.dropped_events + len(self.events):
+                    break
+                yield {"seq": position, **self.events[position - self.dropped_events]}
+                position += 1
+            if self.status in _FINISHED:
+                return
+            await self._changed.wait()
+
+class JobService:
+    """
+    Runs submitted jobs against one set of long-lived resources: the HTTP
+    connection pool, metadata cache, run manifest, retry engine, adaptive
+    concurrency controller, rate limiter, disk writer and the audio
+    verifier's process pool are created once and shared, so a job starts with
+    warm connections and caches instead of paying the start-up cost of a CLI
+    run. At most ``max_concurrent_jobs``
+    jobs run at once; their requests share the connection pool's limits and,
+    when enabled, the adaptive and rate limits. Downloads in flight are
+    coalesced across jobs too, so two jobs that want the same track never
+    write its file at the same time.
+    """
+
+    def __init__(self, settings: Dict[str, Any], project_root: Path, config: ServiceConfig) -> None:
+        self.settings = settings
+        self.project_root = project_root
+        self.config = config
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.accepting = False
+        self.logger = logging.getLogger("spotify_downloader")
+
+    async def start(self) -> None:
+        self.cache = open_metadata_cache(self.settings, self.project_root)
+        self.manifest = open_manifest(self.settings, self.project_root)
+        self.retry = build_retry_engine(self.settings)
+        self.limiter = build_adaptive_concurrency(self.settings)
+        self.writer = build_disk_writer(self.settings)
+        self.verifier = build_audio_verifier(self.settings)
+        self.rate_limiter = build_rate_limiter(self.settings)
+        self.session = create_session(self.settings, self.rate_limiter)
+        # In-flight calls only: a result remembered across jobs would outlive
+        # its file, which may be moved or deleted between jobs.
+        self.download_flights: SingleFlight[Optional[DownloadOutcome]] = SingleFlight()
+        self._slots = asyncio.Semaphore(self.config.max_concurrent_jobs)
+        self.accepting = True
+
+    def submit(self, body: Any) -> Job:
+        """
+        Validate a job submission and queue it. Raises ValueError for a
+        malformed one.
+
+        ``body`` is a JSON object: "urls" (URL strings or tagged objects, as in
+        an input file), optional "settings" overrides merged over the
+        service's settings (output paths must stay under ``jobs_dir``), and
+        optional "pipeline" / "incremental" flags.
+        """
+        if not isinstance(body, dict):
+            raise ValueError("job must be a JSON object")
+        values = body.get("urls")
+        if not isinstance(values, list):
+            raise ValueError("job.urls must be a list")
+        entries = parse_input_entries(values)
+        if not entries:
+            raise ValueError("job.urls contains no URLs")
+        overrides = body.get("settings") or {}
+        if not isinstance(overrides, dict):
+            raise ValueError("job.settings must be an object")
+        self._check_overrides(overrides)
+        incremental = bool(body.get("incremental", False))
+        if incremental and self.manifest is None:
+            raise ValueError("incremental jobs need manifest.enabled in the service settings")
+
+        job_id = uuid.uuid4().hex[:12]
+        settings = merge_settings(self.settings, overrides)
+        exports = self._job_exports(job_id, settings, overrides.get("export") or {})
+        pipeline = bool(body.get("pipeline", settings.get("pipeline", {}).get("enabled", False)))
+        job = Job(
+            job_id, entries, settings, exports, pipeline, incremental, self.config.max_job_events
+        )
+        self.jobs[job_id] = job
+        _JOBS_QUEUED.inc()
+        job.task = asyncio.ensure_future(self._run(job))
+        self.logger.info("Job %s queued with %d URLs", job_id, len(entries))
+        return job
+
+    def _check_overrides(self, overrides: Dict[str, Any]) -> None:
+        """
+        Raise ValueError for job settings that would change the shared
+        resources, or make the service write outside ``jobs_dir``.
+        """
+        fixed = [f"settings.{key}" for key in overrides if key in SHARED_SETTINGS]
+        fixed += [
+            f"settings.{block}.{key}"
+            for block, key in SHARED_SUBSETTINGS
+            if isinstance(overrides.get(block), dict) and key in overrides[block]
+        ]
+        if fixed:
+            names = ", ".join(fixed)
+            raise ValueError(f"{names} cannot be set per job: the service's shared resources use them")
+
+        jobs_dir = self.config.jobs_dir.resolve()
+        for block, key in JOB_PATH_SETTINGS:
+            cfg = overrides.get(block)
+            if cfg is None:
+                continue
+            if not isinstance(cfg, dict):
+                raise ValueError(f"settings.{block} must be an object")
+            value = cfg.get(key)
+            # null (and "" for all but the audio directory) means unset or disabled.
+            if value is None or (value == "" and key != "audio_output_dir"):
+                continue
+            if not isinstance(value, str):
+                raise ValueError(f"settings.{block}.{key} must be a path")
+            path = resolve_project_path(value, self.project_root).resolve()
+            try:
+                path.relative_to(jobs_dir)
+            except ValueError:
+                raise ValueError(f"settings.{block}.{key} must be a path under {jobs_dir}") from None
+
+    def _job_exports(
+        self,
+        job_id: str,
+        settings: Dict[str, Any],
+        export_overrides: Dict[str, Any],
+    ) -> Dict[str, str]:
+        # Point the job's exports into its own directory, so concurrent jobs
+        # never write the same files.
+        export_cfg = settings.setdefault("export", {})
+        exports: Dict[str, str] = {}
+        for key, _ in EXPORT_FORMATS:
+            path = export_cfg.get(key)
+            if key == "output_json":
+                path = path or DEFAULT_OUTPUT_JSON
+            if not path:
+                continue
+            if key not in export_overrides:
+                path = str(self.config.jobs_dir / job_id / Path(path).name)
+            export_cfg[key] = path
+            exports[key] = str(resolve_project_path(path, self.project_root))
+        return exports
+
+    async def _run(self, job: Job) -> None:
+        started = False
+        try:
+            async with self._slots:
+                _JOBS_QUEUED.dec()
+                _JOBS_RUNNING.inc()
+                started = True
+                with job_context(job.id):
+                    await self._process(job)
+        except asyncio.CancelledError:
+            job.finish(JOB_CANCELLED)
+            self.logger.warning("Job %s cancelled after %d of %d tracks", job.id, job.done, job.total)
+            raise
+        except Exception as exc:  # noqa: BLE001
+            self.logger.exception("Job %s failed: %s", job.id, exc)
+            job.finish(JOB_FAILED, error=f"{type(exc).__name__}: {exc}")
+        else:
+            job.finish(JOB_DONE)
+            self.logger.info(
+                "Job %s done: %d tracks (%d failed) in %.3fs",
+                job.id,
+                job.done,
+                job.failed,
+                job.finished - job.started,
+            )
+        finally:
+            if started:
+                _JOBS_RUNNING.dec()
+            else:
+                _JOBS_QUEUED.dec()
+            self._trim_history()
+
+    async def _process(self, job: Job) -> None:
+        settings = job.settings
+        urls = [entry.url for entry in job.entries]
+        work_urls = urls
+        if job.incremental and self.manifest is not None:
+            work_urls = [u for u in urls if not self.manifest.is_complete(u)]
+        job.start(total=len(work_urls), skipped=len(urls) - len(work_urls))
+        schedule = build_job_schedule(settings, job.entries)
+
+        if job.pipeline:
+            tracks = await run_streaming_pipeline(
+                urls=work_urls,
+                settings=settings,
+                project_root=self.project_root,
+                cache=self.cache,
+                manifest=self.manifest,
+                retry=self.retry,
+                limiter=self.limiter,
+                session=self.session,
+                writer=self.writer,
+                rate_limiter=self.rate_limiter,
+                schedule=schedule,
+                on_track=job.track_finished,
+                verifier=self.verifier,
+                download_flights=self.download_flights,
+            )
+        else:
+            tracks = await fetch_tracks_metadata(
+                urls=work_urls,
+                timeout=float(settings.get("http_timeout", 30.0)),
+                concurrent_requests=int(settings.get("concurrent_requests", 10)),
+                cache=self.cache,
+                retry=self.retry,
+                limiter=self.limiter,
+                session=self.session,
+                endpoints=build_endpoints(settings),
+            )
+            await download_tracks_audio(
+                tracks=tracks,
+                settings=settings,
+                project_root=self.project_root,
+                manifest=self.manifest,
+                retry=self.retry,
+                limiter=self.limiter,
+                session=self.session,
+                writer=self.writer,
+                rate_limiter=self.rate_limiter,
+                schedule=schedule,
+                on_track=job.track_finished,
+                verifier=self.verifier,
+                flights=self.download_flights,
+            )
+
+        if job.incremental and self.manifest is not None:
+            tracks = self.manifest.merge(urls, tracks)
+        await export_tracks_async(tracks, settings, self.project_root)
+
+    def _trim_history(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in _FINISHED]
+        for job_id in finished[: max(0, len(finished) - self.config.history)]:
+            del self.jobs[job_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job; False when it had already finished.
+        """
+        job = self.jobs[job_id]
+        if job.status in _FINISHED or job.task is None:
+            return False
+        job.task.cancel()
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING) + _FINISHED}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    async def drain(self) -> None:
+        """
+        Stop accepting jobs and wait up to ``drain_timeout`` for the accepted
+        ones (queued included) to finish; whatever is left is cancelled.
+        """
+        self.accepting = False
+        pending = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        if not pending:
+            return
+        self.logger.info(
+            "Draining %d jobs (waiting up to %.0fs)", len(pending), self.config.drain_timeout
+        )
+        _, unfinished = await asyncio.wait(pending, timeout=self.config.drain_timeout or None)
+        if unfinished:
+            self.logger.warning("Cancelling %d jobs that did not finish in time", len(unfinished))
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.session.close()
+        self.writer.close()
+        if self.verifier is not None:
+            self.verifier.close()
+            self.verifier.log_summary(self.logger)
+        if self.cache is not None:
+            self.cache.close()
+            self.logger.info("Metadata cache stats: %s", self.cache.stats())
+        if self.manifest is not None:
+            self.manifest.close()
+
+def _json_response(data: Any, status: int = 200) -> web.Response:
+    return web.Response(
+        text=json.dumps(data, ensure_ascii=False),
+        status=status,
+        content_type="application/json",
+    )
+
+def _get_job(request: web.Request) -> Job:
+    service: JobService = request.app["service"]
+    job = service.jobs.get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(
+            text=json.dumps({"error": "unknown job"}), content_type="application/json"
+        )
+    return job
+
+async def _stream_events(request: web.Request, job: Job) -> web.StreamResponse:
+    """
+    Stream the job's events until it finishes: Server-Sent Events when the
+    client accepts text/event-stream (resuming after Last-Event-ID), otherwise
+    one JSON object per line over a chunked response.
+    """
+    sse = "text/event-stream" in request.headers.get("Accept", "")
+    response = web.StreamResponse(headers={"Cache-Control": "no-cache"})
+    response.content_type = "text/event-stream" if sse else "application/x-ndjson"
+    response.charset = "utf-8"
+    await response.prepare(request)
+    after = -1
+    if sse and request.headers.get("Last-Event-ID", "").isdigit():
+        after = int(request.headers["Last-Event-ID"])
+    async for event in job.follow(after):
+        data = json.dumps(event, ensure_ascii=False)
+        if sse:
+            chunk = f"id: {event['seq']}\nevent: {event['event']}\ndata: {data}\n\n"
+        else:
+            chunk = data + "\n"
+        await response.write(chunk.encode("utf-8"))
+    await response.write_eof()
+    return response
+
+async def _submit_job(request: web.Request) -> web.StreamResponse:
+    service: JobService = request.app["service"]
+    if not service.accepting:
+        return _json_response({"error": "service is shutting down"}, status=503)
+    try:
+        body = await request.json()
+    except ValueError as exc:
+        return _json_response({"error": f"invalid JSON: {exc}"}, status=400)
+    try:
+        job = service.submit(body)
+    except ValueError as exc:
+        return _json_response({"error": str(exc)}, status=400)
+    if request.query.get("stream", "") in ("1", "true"):
+        return await _stream_events(request, job)
+    response = _json_response(job.summary(), status=202)
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return response
+
+async def _list_jobs(request: web.Request) -> web.Response:
+    service: JobService = request.app["service"]
+    return _json_response([job.summary() for job in service.jobs.values()])
+
+async def _job_status(request: web.Request) -> web.Response:
+    return _json_response(_get_job(request).summary())
+
+async def _job_events(request: web.Request) -> web.StreamResponse:
+    return await _stream_events(request, _get_job(request))
+
+async def _cancel_job(request: web.Request) -> web.Response:
+    service: JobService = request.app["service"]
+    job = _get_job(request)
+    if not service.cancel(job.id):
+        return _json_response({"error": f"job already {job.status}"}, status=409)
+    return _json_response(job.summary(), status=202)
+
+async def _health(request: web.Request) -> web.Response:
+    service: JobService = request.app["service"]
+    return _json_response(
+        {"status": "ok" if service.accepting else "draining", "jobs": service.counts()}
+    )
+
+async def _metrics(request: web.Request) -> web.Response:
+    return web.Response(text=METRICS.render_prometheus(), content_type="text/plain")
+
+def make_app(service: JobService) -> web.Application:
+    """
+    The HTTP API:
+
+    - POST /jobs: submit a job (see JobService.submit()); 202 with its status,
+      or with ``?stream=1`` its progress events on the same response.
+    - GET /jobs, GET /jobs/{id}: job status; DELETE /jobs/{id} cancels.
+    - GET /jobs/{id}/events: progress events, as SSE or NDJSON.
+    - GET /health, GET /metrics (Prometheus text).
+    """
+    app = web.Application(client_max_size=service.config.max_request_bytes)
+    app["service"] = service
+    app.router.add_post("/jobs", _submit_job)
+    app.router.add_get("/jobs", _list_jobs)
+    app.router.add_get("/jobs/{job_id}", _job_status)
+    app.router.add_delete("/jobs/{job_id}", _cancel_job)
+    app.router.add_get("/jobs/{job_id}/events", _job_events)
+    app.router.add_get("/health", _health)
+    app.router.add_get("/metrics", _metrics)
+    return app
+
+async def serve(settings: Dict[str, Any], project_root: Path, bind: Optional[str] = None) -> None:
+    """
+    Run the job service until SIGINT/SIGTERM, then drain: new submissions are
+    refused while accepted jobs finish (up to service.drain_timeout), and
+    status and event requests keep working until they have.
+    """
+    logger = logging.getLogger("spotify_downloader")
+    config = build_service_config(settings, project_root, bind)
+    service = JobService(settings, project_root, config)
+    await service.start()
+    metrics_writer = build_metrics_writer(settings, project_root)
+    loop_lag = build_loop_lag_monitor(settings)
+    if metrics_writer is not None:
+        metrics_writer.start()
+    if loop_lag is not None:
+        loop_lag.start()
+
+    runner = web.AppRunner(make_app(service))
+    await runner.setup()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # No loop signal handlers on Windows; Ctrl+C cancels the run instead.
+            pass
+    try:
+        site = web.TCPSite(runner, config.host, config.port)
+        await site.start()
+        logger.info(
+            "Job service listening on http://%s:%d (%d concurrent jobs)",
+            config.host,
+            config.port,
+            config.max_concurrent_jobs,
+        )
+        await stop.wait()
+        logger.info("Shutting down: refusing new jobs")
+        await service.drain()
+    finally:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(signum)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await runner.cleanup()
+        await service.close()
+        if loop_lag is not None:
+            await loop_lag.stop()
+        if metrics_writer is not None:
+            await metrics_writer.stop()
@@ -0,0 +1,417 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import aiohttp
+
+from downloader.exporters import export_tracks_async
+from downloader.mp3_exporter import download_tracks_audio
+from downloader.pipeline import run_streaming_pipeline
+from downloader.spotify_handler import build_endpoints, fetch_tracks_metadata
+from downloader.verify import AudioVerifier, build_audio_verifier
+from utils.concurrency import AdaptiveConcurrency, build_adaptive_concurrency
+from utils.disk_writer import DiskWriter, build_disk_writer
+from utils.error_handler import configure_logging, shutdown_logging
+from utils.http_session import create_session
+from utils.manifest import RunManifest, open_manifest
+from utils.metadata_cache import MetadataCache, open_metadata_cache
+from utils.parser import InputEntry, resolve_project_path
+from utils.rate_limit import RateLimiter, build_rate_limiter
+from utils.records import TrackResult
+from utils.retry import RetryEngine, build_retry_engine
+from utils.scheduler import build_job_schedule
+from utils.spotify_urls import canonical_track_url
+from utils.work_queue import WorkQueue
+
+@dataclass
+class ShardingConfig:
+    """
+    Sharded execution from settings["sharding"] (and the matching CLI flags):
+
+    - ``shards``: number of partitions of the input, by hash of track ID.
+    - ``processes``: local worker processes (0 = one per shard, at most one per CPU).
+    - ``work_queue``: shared SQLite queue for multi-node runs. Every node runs
+      the same command against the same input and queue file; results are
+      written next to the queue, so its directory must be shared too. Without
+      it, the queue lives under ``results_dir`` and only local processes use it.
+    - ``lease_seconds``: how long a shard stays leased without a renewal before
+      another worker may take it over.
+    """
+
+    shards: int
+    processes: int
+    queue_path: Path
+    shared: bool
+    lease_seconds: float = 120.0
+    poll_seconds: float = 2.0
+
+    @property
+    def results_dir(self) -> Path:
+        return self.queue_path.with_name(self.queue_path.stem + "-results")
+
+def build_sharding_config(
+    settings: Dict[str, Any],
+    project_root: Path,
+    shards: Optional[int] = None,
+    processes: Optional[int] = None,
+    work_queue: Optional[str] = None,
+) -> Optional[ShardingConfig]:
+    cfg = settings.get("sharding", {})
+    shards = int(shards or cfg.get("shards", 0))
+    work_queue = work_queue or cfg.get("work_queue")
+    if shards <= 0 and not work_queue:
+        return None
+    if shards <= 0:
+        shards = 64
+    processes = int(processes or cfg.get("processes", 0))
+    if processes <= 0:
+        processes = min(shards, os.cpu_count() or 1)
+    if work_queue:
+        queue_path = resolve_project_path(work_queue, project_root)
+    else:
+        queue_path = resolve_project_path(cfg.get("results_dir", "data/shards"), project_root) / "queue.sqlite3"
+    return ShardingConfig(
+        shards=shards,
+        processes=processes,
+        queue_path=queue_path,
+        shared=bool(work_queue),
+        lease_seconds=float(cfg.get("lease_seconds", 120.0)),
+        poll_seconds=float(cfg.get("poll_seconds", 2.0)),
+    )
+
+def shard_index(url: str, shards: int) -> int:
+    """
+    Stable shard of ``url``: aliases of one track hash to the same shard, so
+    they still share a lookup and a download inside it.
+    """
+    digest = hashlib.blake2b(canonical_track_url(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+def partition_entries(entries: Iterable[InputEntry], shards: int) -> List[List[InputEntry]]:
+    partitions: List[List[InputEntry]] = [[] for _ in range(shards)]
+    for entry in entries:
+        partitions[shard_index(entry.url, shards)].append(entry)
+    return partitions
+
+def input_fingerprint(entries: List[InputEntry], shards: int) -> str:
+    digest = hashlib.sha256(f"{shards}\n".encode("utf-8"))
+    for entry in entries:
+        digest.update(json.dumps(asdict(entry), sort_keys=True).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def _worker_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    worker = copy.deepcopy(settings)
+    # Only the merge step exports; partial exports from every worker would
+    # overwrite each other's files.
+    worker.setdefault("export", {})["partial_interval"] = 0
+    # Workers share the cache file: commit each entry so no process holds
+    # the write lock across many lookups.
+    worker.setdefault("metadata_cache", {})["commit_every"] = 1
+    return worker
+
+async def _process_entries(
+    entries: List[InputEntry],
+    settings: Dict[str, Any],
+    project_root: Path,
+    pipeline: bool,
+    session: aiohttp.ClientSession,
+    cache: Optional[MetadataCache],
+    manifest: Optional[RunManifest],
+    retry: Optional[RetryEngine],
+    limiter: Optional[AdaptiveConcurrency],
+    writer: DiskWriter,
+    rate_limiter: Optional[RateLimiter],
+    verifier: Optional[AudioVerifier],
+) -> List[TrackResult]:
+    urls = [entry.url for entry in entries]
+    schedule = build_job_schedule(settings, entries)
+    if pipeline:
+        return await run_streaming_pipeline(
+            urls=urls,
+            settings=settings,
+            project_root=project_root,
+            cache=cache,
+            manifest=manifest,
+            retry=retry,
+            limiter=limiter,
+            session=session,
+            writer=writer,
+            rate_limiter=rate_limiter,
+            schedule=schedule,
+            verifier=verifier,
+        )
+    tracks = await fetch_tracks_metadata(
+        urls=urls,
+        timeout=float(settings.get("http_timeout", 30.0)),
+        concurrent_requests=int(settings.get("concurrent_requests", 10)),
+        cache=cache,
+        retry=retry,
+        limiter=limiter,
+        session=session,
+        endpoints=build_endpoints(settings),
+    )
+    await download_tracks_audio(
+        tracks=tracks,
+        settings=settings,
+        project_root=project_root,
+        manifest=manifest,
+        retry=retry,
+        limiter=limiter,
+        session=session,
+        writer=writer,
+        rate_limiter=rate_limiter,
+        schedule=schedule,
+        verifier=verifier,
+    )
+    return tracks
+
+def _write_results(results_dir: Path, shard_id: int, owner: str, tracks: List[TrackResult]) -> Path:
+    results_dir.mkdir(parents=True, exist_ok=True)
+    path = results_dir / f"shard-{shard_id:05d}.ndjson"
+    tmp_path = results_dir / f".{path.name}.{owner.replace(':', '-')}.tmp"
+    with tmp_path.open("w", encoding="utf-8") as f:
+        for track in tracks:
+            f.write(json.dumps(track.to_dict(), ensure_ascii=False))
+            f.write("\n")
+    os.replace(tmp_path, path)
+    return path
+
+async def _keep_lease(queue: WorkQueue, shard_id: int, owner: str, logger: logging.Logger) -> None:
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not queue.renew(shard_id, owner):
+            logger.warning("Lost the lease on shard %d; another worker may repeat it", shard_id)
+            return
+
+async def _drain_queue(
+    config: ShardingConfig,
+    settings: Dict[str, Any],
+    project_root: Path,
+    pipeline: bool,
+    incremental: bool,
+    owner: str,
+) -> None:
+    logger = logging.getLogger("spotify_downloader")
+    queue = WorkQueue(config.queue_path, config.lease_seconds)
+    cache = open_metadata_cache(settings, project_root)
+    manifest = open_manifest(settings, project_root, force=incremental)
+    retry = build_retry_engine(settings)
+    limiter = build_adaptive_concurrency(settings)
+    writer = build_disk_writer(settings)
+    # The local shard processes split the cores between their pools.
+    verifier = build_audio_verifier(settings, share=config.processes)
+    rate_limiter = build_rate_limiter(settings)
+    try:
+        async with create_session(settings, rate_limiter) as session:
+            while True:
+                leased = queue.lease(owner)
+                if leased is None:
+                    if queue.all_done():
+                        return
+                    # Shards still leased elsewhere: wait in case their owner
+                    # dies and the lease has to be taken over.
+                    await asyncio.sleep(config.poll_seconds)
+                    continue
+                shard_id, raw_entries = leased
+                entries = [InputEntry(**raw) for raw in raw_entries]
+                heartbeat = asyncio.ensure_future(_keep_lease(queue, shard_id, owner, logger))
+                try:
+                    tracks = await _process_entries(
+                        entries,
+                        settings,
+                        project_root,
+                        pipeline,
+                        session,
+                        cache,
+                        manifest,
+                        retry,
+                        limiter,
+                        writer,
+                        rate_limiter,
+                        verifier,
+                    )
+                finally:
+                    heartbeat.cancel()
+                path = _write_results(config.results_dir, shard_id, owner, tracks)
+                queue.complete(shard_id, path)
+                logger.info("Shard %d finished by %s (%d URLs)", shard_id, owner, len(entries))
+    finally:
+        writer.close()
+        if verifier is not None:
+            verifier.close()
+            verifier.log_summary(logger)
+        if cache is not None:
+            cache.close()
+        if manifest is not None:
+            manifest.close()
+        queue.close()
+
+def _shard_worker(
+    config: ShardingConfig,
+    settings: Dict[str, Any],
+    project_root: Path,
+    pipeline: bool,
+    incremental: bool,
+    owner: str,
+) -> None:
+    """
+    Entry point of one worker process: lease shards until the queue is done.
+    """
+    configure_logging(settings)
+    try:
+        asyncio.run(_drain_queue(config, settings, project_root, pipeline, incremental, owner))
+    finally:
+        shutdown_logging()
+
+def iter_merged_tracks(result_paths: Iterable[Path], urls: Iterable[str]) -> Iterator[TrackResult]:
+    """
+    Yield the tracks from the shard result files in input order, which is the
+    order a single-process run exports them in.
+    """
+    by_url: Dict[str, TrackResult] = {}
+    for path in result_paths:
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    track = TrackResult.from_dict(json.loads(line))
+                    by_url[track.url] = track
+    for url in urls:
+        track = by_url.get(url)
+        if track is not None:
+            yield track
+
+def _open_queue(config: ShardingConfig, entries: List[InputEntry], logger: logging.Logger) -> WorkQueue:
+    fingerprint = input_fingerprint(entries, config.shards)
+    shards = [[asdict(e) for e in part] for part in partition_entries(entries, config.shards)]
+    queue = WorkQueue(config.queue_path, config.lease_seconds)
+    if config.shared:
+        if queue.populate(fingerprint, shards):
+            logger.info("Created work queue %s with %d shards", config.queue_path, config.shards)
+        else:
+            logger.info("Joining work queue %s: %s", config.queue_path, queue.counts())
+        return queue
+
+    # A local queue resumes an interrupted run of the same input; anything
+    # else (another input, or a run that already merged) starts over.
+    try:
+        resumed = not queue.populate(fingerprint, shards) and not queue.merged()
+    except ValueError:
+        resumed = False
+    if resumed:
+        queue.release_leases()
+        logger.info("Resuming sharded run from %s: %s", config.queue_path, queue.counts())
+        return queue
+    queue.close()
+    for path in config.queue_path.parent.glob(config.queue_path.name + "*"):
+        path.unlink()
+    for path in config.results_dir.glob("*"):
+        path.unlink()
+    queue = WorkQueue(config.queue_path, config.lease_seconds)
+    queue.populate(fingerprint, shards)
+    return queue
+
+async def _report_shards(queue: WorkQueue, interval: float, logger: logging.Logger) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        counts = queue.counts()
+        logger.info(
+            "Shards: %d done, %d running, %d pending",
+            counts["done"],
+            counts["leased"],
+            counts["pending"],
+        )
+
+async def run_sharded(
+    entries: List[InputEntry],
+    settings: Dict[str, Any],
+    project_root: Path,
+    config: ShardingConfig,
+    pipeline: bool = False,
+    incremental: bool = False,
+) -> bool:
+    """
+    Run the input as ``config.shards`` hash partitions on ``config.processes``
+    local worker processes, then merge the shard results and export them
+    exactly as a single-process run would. With a shared work queue several
+    nodes cooperate and only the first to see every shard done merges.
+
+    Each worker process has its own session, concurrency limits and rate
+    limits, so per-host budgets apply per process. Returns True when this
+    node wrote the exports.
+    """
+    logger = logging.getLogger("spotify_downloader")
+    urls = [entry.url for entry in entries]
+    manifest = open_manifest(settings, project_root, force=incremental)
+    work_entries = entries
+    if incremental and manifest is not None:
+        work_entries = [e for e in entries if not manifest.is_complete(e.url)]
+        logger.info(
+            "Incremental run: %d of %d URLs already complete, processing %d",
+            len(entries) - len(work_entries),
+            len(entries),
+            len(work_entries),
+        )
+
+    queue = _open_queue(config, work_entries, logger)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    worker_settings = _worker_settings(settings)
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=_shard_worker,
+            args=(config, worker_settings, project_root, pipeline, incremental, f"{owner}:{index}"),
+            name=f"shard-worker-{index}",
+        )
+        for index in range(config.processes)
+    ]
+    logger.info(
+        "Sharded run: %d URLs in %d shards on %d worker processes",
+        len(work_entries),
+        config.shards,
+        len(workers),
+    )
+    loop = asyncio.get_running_loop()
+    reporter = asyncio.ensure_future(_report_shards(queue, 5.0, logger))
+    try:
+        for worker in workers:
+            worker.start()
+        await asyncio.gather(*(loop.run_in_executor(None, worker.join) for worker in workers))
+    finally:
+        reporter.cancel()
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+    try:
+        failed = [w.name for w in workers if w.exitcode != 0]
+        if failed or not queue.all_done():
+            raise RuntimeError(
+                f"Shard workers failed ({', '.join(failed) or 'none'}); shard status "
+                f"{queue.counts()}. Run the same command again to resume."
+            )
+        if not queue.claim_merge(owner):
+            logger.info("All shards are done; another node merges the results")
+            return False
+        try:
+            tracks: Iterable[TrackResult] = iter_merged_tracks(queue.result_paths(), urls)
+            if incremental and manifest is not None:
+                tracks = manifest.merge(urls, list(tracks))
+            await export_tracks_async(tracks, settings, project_root)
+        except BaseException:
+            queue.release_merge(owner)
+            raise
+        return True
+    finally:
+        queue.close()
+        if manifest is not None:
+            manifest.close()
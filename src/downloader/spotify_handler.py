@@ -1,75 +1,91 @@
-thonimport asyncio
+import asyncio
 import logging
-from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional
-from urllib.parse import urlparse, quote
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote
 
 import aiohttp
 
+from utils.concurrency import AdaptiveConcurrency, request_slot
+from utils.http_session import borrow_session
+from utils.metadata_cache import MetadataCache
+from utils.metrics import METRICS
+from utils.records import MediaInfo, TrackResult
+from utils.retry import (
+    CircuitOpenError,
+    RetryableStatusError,
+    RetryEngine,
+    raise_for_retryable_status,
+    run_with_retry,
+)
+from utils.single_flight import REMEMBER_RESULTS, SingleFlight, coalesced
+from utils.spotify_urls import canonical_track_url, extract_track_id
+from utils.worker_pool import run_all
+
 SPOTIFY_OEMBED_ENDPOINT = "https://open.spotify.com/oembed"
+MEDIA_STREAM_ENDPOINT = "https://cdn2.meow.gs/api/stream"
 
-@dataclass
-class MediaInfo:
-    url: str
-    quality: str
-    extension: str
-    type: str
+_OEMBED_SECONDS = METRICS.histogram("oembed_request_seconds")
+
+_OEMBED_FIELDS = ("title", "thumbnail_url")
 
 @dataclass
-class TrackResult:
-    url: str  # original URL
-    result_url: str
-    title: str
-    thumbnail: str
-    duration: str
-    medias: List[MediaInfo]
-    type: str
-    error: bool
-
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "url": self.url,
-            "result": {
-                "url": self.result_url,
-                "title": self.title,
-                "thumbnail": self.thumbnail,
-                "duration": self.duration,
-                "medias": [asdict(m) for m in self.medias],
-                "type": self.type,
-                "error": self.error,
-            },
-        }
-
-def _extract_track_id(spotify_url: str) -> Optional[str]:
+class ServiceEndpoints:
     """
-    Extract track ID from standard Spotify track URLs like:
-    https://open.spotify.com/track/<id>?...
-
-    Returns None if it cannot detect a valid track id.
+    Where track metadata and audio streams are fetched from. The defaults are
+    the production services; settings["endpoints"] can point them elsewhere,
+    e.g. at the local server used by the benchmarks.
     """
-    parsed = urlparse(spotify_url)
-    parts = [p for p in parsed.path.split("/") if p]
-    if len(parts) >= 2 and parts[0] == "track":
-        return parts[1]
-    return None
+    oembed: str = SPOTIFY_OEMBED_ENDPOINT
+    media_stream: str = MEDIA_STREAM_ENDPOINT
+
+def build_endpoints(settings: Dict[str, Any]) -> ServiceEndpoints:
+    cfg = settings.get("endpoints", {})
+    return ServiceEndpoints(
+        oembed=str(cfg.get("oembed") or SPOTIFY_OEMBED_ENDPOINT),
+        media_stream=str(cfg.get("media_stream") or MEDIA_STREAM_ENDPOINT),
+    )
 
 async def _fetch_oembed_metadata(
     session: aiohttp.ClientSession,
     url: str,
     timeout: float,
     logger: logging.Logger,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    endpoint: str = SPOTIFY_OEMBED_ENDPOINT,
 ) -> Dict[str, Any]:
     params = {"url": url, "format": "json"}
+
+    async def attempt() -> Dict[str, Any]:
+        async with request_slot(limiter, endpoint, "metadata") as slot:
+            started = time.perf_counter()
+            async with session.get(endpoint, params=params, timeout=timeout) as resp:
+                _OEMBED_SECONDS.observe(time.perf_counter() - started)
+                METRICS.counter("oembed_requests_total", status=resp.status).inc()
+                if slot is not None:
+                    slot.observe_status(resp.status)
+                raise_for_retryable_status(resp, retry)
+                if resp.status != 200:
+                    logger.warning(
+                        "Non-200 response from Spotify oEmbed for %s: %s",
+                        url,
+                        resp.status,
+                    )
+                    return {}
+                return await resp.json()
+
     try:
-        async with session.get(SPOTIFY_OEMBED_ENDPOINT, params=params, timeout=timeout) as resp:
-            if resp.status != 200:
-                logger.warning(
-                    "Non-200 response from Spotify oEmbed for %s: %s",
-                    url,
-                    resp.status,
-                )
-                return {}
-            return await resp.json()
+        return await run_with_retry(retry, endpoint, attempt, logger)
+    except RetryableStatusError as exc:
+        logger.warning(
+            "Non-200 response from Spotify oEmbed for %s: %s (giving up)",
+            url,
+            exc.status,
+        )
+    except CircuitOpenError as exc:
+        logger.error("Skipping oEmbed metadata for %s: %s", url, exc)
     except asyncio.TimeoutError:
         logger.error("Timeout while fetching oEmbed metadata for %s", url)
     except aiohttp.ClientError as exc:
@@ -79,14 +95,14 @@ async def _fetch_oembed_metadata(
 
     return {}
 
-def _build_media_info(track_id: str) -> MediaInfo:
+def _build_media_info(track_id: str, stream_endpoint: str = MEDIA_STREAM_ENDPOINT) -> MediaInfo:
     """
     Build a realistic MP3 stream URL. In a real implementation, this would call a
     third-party service or your own backend that provides MP3 streams for
     the given Spotify track ID.
     """
     stream_url = (
-        "https://cdn2.meow.gs/api/stream?"
+        f"{stream_endpoint}?"
         f"id={quote(track_id)}&source=spotify&exp=9999999999999"
     )
     return MediaInfo(
@@ -101,24 +117,47 @@ async def _process_single_track(
     url: str,
     timeout: float,
     logger: logging.Logger,
-) -> Dict[str, Any]:
-    metadata = await _fetch_oembed_metadata(session, url, timeout, logger)
-    track_id = _extract_track_id(url) or "unknown"
+    cache: Optional[MetadataCache] = None,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    flights: Optional[SingleFlight[Dict[str, Any]]] = None,
+    endpoints: Optional[ServiceEndpoints] = None,
+) -> TrackResult:
+    endpoints = endpoints or ServiceEndpoints()
+    track_id = extract_track_id(url) or "unknown"
+    canonical_url = canonical_track_url(url)
+
+    async def lookup() -> Dict[str, Any]:
+        fetched: Optional[Dict[str, Any]] = None
+        if cache is not None and track_id != "unknown":
+            fetched = cache.get(track_id)
+        if fetched is None:
+            fetched = await _fetch_oembed_metadata(
+                session, canonical_url, timeout, logger, retry, limiter, endpoints.oembed
+            )
+            if fetched and cache is not None and track_id != "unknown":
+                cache.put(track_id, fetched)
+        # Only these fields are used (and remembered for aliases), not the
+        # whole oEmbed payload with its HTML embed snippet.
+        return {key: fetched[key] for key in _OEMBED_FIELDS if key in fetched}
+
+    # Aliases of one track (?si=..., /intl-xx/, spotify:track:) share a lookup.
+    metadata = await coalesced(flights, canonical_url, lookup)
 
     title = metadata.get("title", f"Spotify Track {track_id}")
     thumbnail = metadata.get("thumbnail_url", "")
     duration = ""  # oEmbed does not expose duration; left blank intentionally
 
-    medias: List[MediaInfo] = []
+    medias: Tuple[MediaInfo, ...] = ()
     error = False
 
     if track_id == "unknown":
         logger.warning("Could not determine track ID from URL: %s", url)
         error = True
     else:
-        medias.append(_build_media_info(track_id))
+        medias = (_build_media_info(track_id, endpoints.media_stream),)
 
-    track = TrackResult(
+    return TrackResult(
         url=url,
         result_url=url,
         title=title,
@@ -128,26 +167,52 @@ async def _process_single_track(
         type="single",
         error=error,
     )
-    return track.to_dict()
 
 async def fetch_tracks_metadata(
-    urls: List[str],
+    urls: Union[Iterable[str], AsyncIterable[str]],
     timeout: float,
     concurrent_requests: int = 10,
-) -> List[Dict[str, Any]]:
+    cache: Optional[MetadataCache] = None,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    endpoints: Optional[ServiceEndpoints] = None,
+) -> List[TrackResult]:
     """
     Fetch metadata for a batch of Spotify track URLs concurrently.
 
-    Returns a list of dicts shaped exactly like the README example.
+    When a MetadataCache is given, fresh cached oEmbed responses are reused and
+    only new or expired tracks hit the network. Transient oEmbed failures are
+    retried according to ``retry``. With an adaptive ``limiter`` the number of
+    in-flight requests per host is set by the controller instead of being
+    fixed at ``concurrent_requests``. Pass the shared ``session`` to reuse its
+    connection pool; otherwise a session is opened for this call. ``endpoints``
+    overrides the oEmbed and stream services (see build_endpoints()).
+
+    URLs that name the same track share one oEmbed lookup, but every input
+    URL still gets its own entry. Returns one TrackResult per URL; its
+    to_dict() is shaped exactly like the README example.
     """
     logger = logging.getLogger("spotify_downloader")
-    semaphore = asyncio.Semaphore(concurrent_requests)
-
-    async with aiohttp.ClientSession() as session:
-        async def bound_process(u: str) -> Dict[str, Any]:
-            async with semaphore:
-                return await _process_single_track(session, u, timeout, logger)
-
-        tasks = [bound_process(u) for u in urls]
-        results = await asyncio.gather(*tasks)
+    flights: SingleFlight[Dict[str, Any]] = SingleFlight(remember=REMEMBER_RESULTS)
+
+    async with borrow_session(session) as http:
+        async def process(u: str) -> TrackResult:
+            return await _process_single_track(
+                http,
+                u,
+                timeout,
+                logger,
+                cache=cache,
+                retry=retry,
+                limiter=limiter,
+                flights=flights,
+                endpoints=endpoints,
+            )
+
+        workers = limiter.max_limit if limiter is not None else concurrent_requests
+        results = await run_all(process, urls, workers, name="metadata")
+
+    if flights.shared:
+        logger.info("Reused metadata lookups for %d alias URLs", flights.shared)
     return results
\ No newline at end of file
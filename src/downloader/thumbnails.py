@@ -0,0 +1,362 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+import aiohttp
+
+from utils.concurrency import AdaptiveConcurrency, request_slot
+from utils.disk_writer import DiskWriter, default_disk_writer
+from utils.error_handler import DownloadError
+from utils.metrics import METRICS
+from utils.parser import resolve_project_path
+from utils.rate_limit import RateLimiter
+from utils.records import TrackResult
+from utils.retry import (
+    CircuitOpenError,
+    RetryableStatusError,
+    RetryEngine,
+    raise_for_retryable_status,
+    run_with_retry,
+)
+from utils.single_flight import REMEMBER_RESULTS, SingleFlight
+
+THUMBNAIL_LINK_MODES = ("hardlink", "symlink", "copy", "none")
+
+_IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+
+_THUMBNAIL_BYTES = METRICS.counter("thumbnail_bytes_total")
+_THUMBNAIL_SECONDS = METRICS.histogram("thumbnail_fetch_seconds")
+
+_PART_IDS = itertools.count()
+
+@dataclass
+class ThumbnailConfig:
+    """
+    Optional cover download stage (settings["thumbnails"]).
+
+    Images are stored once in ``cache_dir`` and every track gets its cover as
+    ``<audio file stem><image extension>`` in ``output_dir`` by ``link``:
+    "hardlink" (falling back to a copy across filesystems), "symlink", "copy",
+    or "none" to leave the cache as the only copy.
+    """
+
+    cache_dir: Path
+    output_dir: Path
+    link: str = "hardlink"
+    max_bytes: int = 10 * 1024 * 1024
+
+def build_thumbnail_config(settings: Dict[str, Any], project_root: Path) -> Optional[ThumbnailConfig]:
+    cfg = settings.get("thumbnails", {})
+    if not cfg.get("enabled", False):
+        return None
+    link = str(cfg.get("link", "hardlink"))
+    if link not in THUMBNAIL_LINK_MODES:
+        raise ValueError(f"thumbnails.link must be one of {THUMBNAIL_LINK_MODES}, got {link!r}")
+    # Covers sit next to the audio files unless told otherwise.
+    output_dir = cfg.get("output_dir") or settings.get("export", {}).get("audio_output_dir", "data/downloads")
+    return ThumbnailConfig(
+        cache_dir=resolve_project_path(cfg.get("cache_dir", "data/cache/thumbnails"), project_root),
+        output_dir=resolve_project_path(output_dir, project_root),
+        link=link,
+        max_bytes=max(1, int(cfg.get("max_bytes", 10 * 1024 * 1024))),
+    )
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+def _image_extension(content_type: str, url: str) -> str:
+    extension = _IMAGE_EXTENSIONS.get(content_type.lower())
+    if extension is not None:
+        return extension
+    suffix = Path(url.split("?", 1)[0]).suffix.lower()
+    return suffix if suffix in _IMAGE_EXTENSIONS.values() else ".jpg"
+
+class ThumbnailCache:
+    """
+    Content-addressed image store shared by every run, job and shard process:
+
+        objects/<2 hex>/<sha256 of the image><ext>   image bytes
+        urls/<2 hex>/<sha256 of the URL>             object name the URL resolved to
+
+    An image is stored once however many URLs (and tracks) point at it. Both
+    kinds of file are moved into place atomically, so concurrent processes
+    storing the same image simply replace it with identical bytes. Cover URLs
+    are immutable, so entries never expire.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        (root / "tmp").mkdir(parents=True, exist_ok=True)
+
+    def _index_path(self, url: str) -> Path:
+        key = _url_key(url)
+        return self.root / "urls" / key[:2] / key
+
+    def lookup(self, url: str) -> Optional[Path]:
+        try:
+            name = self._index_path(url).read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+        path = self.root / "objects" / name[:2] / name
+        return path if name and path.exists() else None
+
+    def part_path(self, url: str) -> Path:
+        # Unique per fetch: concurrent service jobs in one process may fetch
+        # the same cover, each through its own stage.
+        return self.root / "tmp" / f"{_url_key(url)}.{os.getpid()}.{next(_PART_IDS)}.part"
+
+    def store(self, url: str, part_path: Path, sha256: str, extension: str) -> Path:
+        """
+        Move a fetched image into the store and index ``url`` to it.
+        """
+        name = sha256 + extension
+        path = self.root / "objects" / name[:2] / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            # Same image under another URL.
+            part_path.unlink()
+        else:
+            os.replace(part_path, path)
+        index = self._index_path(url)
+        index.parent.mkdir(parents=True, exist_ok=True)
+        tmp = index.with_name(f"{index.name}.{os.getpid()}.tmp")
+        tmp.write_text(name, encoding="utf-8")
+        os.replace(tmp, index)
+        return path
+
+class ThumbnailStage:
+    """
+    Per-run state of the cover stage: the on-disk cache plus a SingleFlight
+    keyed by cover URL, so the tracks of one album, fetching concurrently or
+    soon after one another, share a single request (later ones find the image
+    in the cache). A cover that failed is not requested again in the same run.
+    """
+
+    def __init__(self, config: ThumbnailConfig) -> None:
+        self.config = config
+        self.cache = ThumbnailCache(config.cache_dir)
+        self.flights: SingleFlight[Optional[Path]] = SingleFlight(remember=REMEMBER_RESULTS)
+        self.failed: Set[str] = set()
+        self.fetched = 0
+        self.cached = 0
+        self.placed = 0
+        self._link_fallback_logged = False
+
+    async def place(self, image: Path, stem: str, logger: logging.Logger, writer: DiskWriter) -> Path:
+        """
+        Give a track its cover as ``output_dir/<stem><ext>``, linked to (or
+        copied from) the cached ``image`` on the writer's threads. Returns the
+        track's cover path.
+        """
+        if self.config.link == "none":
+            return image
+        dest = await asyncio.get_running_loop().run_in_executor(
+            writer.executor, self._place, image, stem, logger
+        )
+        self.placed += 1
+        return dest
+
+    def _place(self, image: Path, stem: str, logger: logging.Logger) -> Path:
+        link = self.config.link
+        dest = self.config.output_dir / (stem + image.suffix)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.exists() or dest.is_symlink():
+            if link != "copy" and dest.exists() and os.path.samefile(dest, image):
+                return dest
+            dest.unlink()
+        try:
+            if link == "hardlink":
+                os.link(image, dest)
+            elif link == "symlink":
+                os.symlink(image, dest)
+            else:
+                shutil.copyfile(image, dest)
+        except FileExistsError:
+            # An alias of the same track placed it first.
+            pass
+        except OSError as exc:
+            # Hard links across filesystems, symlinks without permission.
+            if not self._link_fallback_logged:
+                logger.warning("Cannot %s covers into %s (%s); copying instead", link, dest.parent, exc)
+                self._link_fallback_logged = True
+            shutil.copyfile(image, dest)
+        return dest
+
+    def log_summary(self, logger: logging.Logger) -> None:
+        if self.fetched or self.cached or self.failed:
+            logger.info(
+                "Thumbnails: %d fetched, %d from cache, %d shared within the run, %d failed, %d placed",
+                self.fetched,
+                self.cached,
+                self.flights.shared,
+                len(self.failed),
+                self.placed,
+            )
+
+def build_thumbnail_stage(settings: Dict[str, Any], project_root: Path) -> Optional[ThumbnailStage]:
+    config = build_thumbnail_config(settings, project_root)
+    return ThumbnailStage(config) if config is not None else None
+
+async def _fetch_image(
+    session: aiohttp.ClientSession,
+    url: str,
+    part_path: Path,
+    timeout: float,
+    max_bytes: int,
+    retry: Optional[RetryEngine],
+    limiter: Optional[AdaptiveConcurrency],
+    writer: DiskWriter,
+    rate_limiter: Optional[RateLimiter],
+) -> Tuple[str, str]:
+    """
+    Download one image into part_path. Returns its Content-Type and SHA-256.
+    """
+    async with request_slot(limiter, url, "download") as slot:
+        async with session.get(url, timeout=timeout) as resp:
+            if slot is not None:
+                slot.observe_status(resp.status)
+            raise_for_retryable_status(resp, retry)
+            if resp.status != 200:
+                raise DownloadError(f"HTTP {resp.status}")
+            if resp.content_length is not None and resp.content_length > max_bytes:
+                raise DownloadError(f"image of {resp.content_length} bytes exceeds thumbnails.max_bytes")
+
+            sink = await writer.open(part_path)
+            received = 0
+            try:
+                async for chunk in resp.content.iter_any():
+                    received += len(chunk)
+                    if received > max_bytes:
+                        raise DownloadError("image exceeds thumbnails.max_bytes")
+                    _THUMBNAIL_BYTES.inc(len(chunk))
+                    if rate_limiter is not None:
+                        await rate_limiter.consume_bytes(len(chunk))
+                    await sink.write(chunk)
+            finally:
+                await sink.close()
+            return resp.content_type, sink.hexdigest() or ""
+
+def _discard(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+async def _cached_image(
+    session: aiohttp.ClientSession,
+    url: str,
+    stage: ThumbnailStage,
+    timeout: float,
+    logger: logging.Logger,
+    retry: Optional[RetryEngine],
+    limiter: Optional[AdaptiveConcurrency],
+    writer: DiskWriter,
+    rate_limiter: Optional[RateLimiter],
+) -> Optional[Path]:
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(writer.executor, stage.cache.lookup, url)
+    if cached is not None:
+        stage.cached += 1
+        METRICS.counter("thumbnails_total", result="cached").inc()
+        return cached
+
+    part_path = stage.cache.part_path(url)
+    started = time.perf_counter()
+    try:
+        content_type, digest = await run_with_retry(
+            retry,
+            url,
+            lambda: _fetch_image(
+                session,
+                url,
+                part_path,
+                timeout,
+                stage.config.max_bytes,
+                retry,
+                limiter,
+                writer,
+                rate_limiter,
+            ),
+            logger,
+        )
+        path = await loop.run_in_executor(
+            writer.executor,
+            stage.cache.store,
+            url,
+            part_path,
+            digest,
+            _image_extension(content_type, url),
+        )
+    except (DownloadError, RetryableStatusError, CircuitOpenError, aiohttp.ClientError, OSError) as exc:
+        logger.warning("Failed to fetch thumbnail %s (%s)", url, exc)
+    except asyncio.TimeoutError:
+        logger.warning("Timeout fetching thumbnail %s", url)
+    else:
+        _THUMBNAIL_SECONDS.observe(time.perf_counter() - started)
+        stage.fetched += 1
+        METRICS.counter("thumbnails_total", result="fetched").inc()
+        return path
+
+    await loop.run_in_executor(writer.executor, _discard, part_path)
+    stage.failed.add(url)
+    METRICS.counter("thumbnails_total", result="failed").inc()
+    return None
+
+async def fetch_thumbnail(
+    session: aiohttp.ClientSession,
+    track: TrackResult,
+    stem: str,
+    stage: ThumbnailStage,
+    timeout: float,
+    logger: logging.Logger,
+    retry: Optional[RetryEngine] = None,
+    limiter: Optional[AdaptiveConcurrency] = None,
+    writer: Optional[DiskWriter] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> Optional[Path]:
+    """
+    Make the cover of ``track`` available under ``stem`` (the audio file name
+    without its extension). The image comes from the cache when any earlier
+    run stored it, and is otherwise fetched once per run however many tracks
+    share it. A missing cover is logged but never marks the track as failed.
+
+    Returns the track's cover path, or None when it has none.
+    """
+    url = track.thumbnail
+    if not url or url in stage.failed:
+        return None
+    writer = writer or default_disk_writer()
+    image = await stage.flights.do(
+        url,
+        lambda: _cached_image(
+            session,
+            url,
+            stage,
+            timeout,
+            logger,
+            retry,
+            limiter,
+            writer,
+            rate_limiter,
+        ),
+    )
+    if image is None:
+        return None
+    try:
+        return await stage.place(image, stem, logger, writer)
+    except OSError as exc:
+        logger.warning("Could not place cover for '%s' (%s)", track.title, exc)
+        return None
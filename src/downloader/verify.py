@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.metrics import METRICS, THROUGHPUT_BUCKETS
+from utils.mp3 import Id3Tags, Mp3Check, check_mp3
+from utils.records import TrackResult
+
+_VERIFY_BYTES = METRICS.counter("verify_bytes_total")
+_VERIFY_CPU_SECONDS = METRICS.counter("verify_cpu_seconds_total")
+_VERIFY_SECONDS = METRICS.histogram("verify_seconds")
+_VERIFY_CORE_THROUGHPUT = METRICS.histogram(
+    "verify_throughput_bytes_per_core_second", buckets=THROUGHPUT_BUCKETS
+)
+
+class AudioVerifier:
+    """
+    Post-download check of every MP3 in a process pool, so frame scanning,
+    hashing and tag writing never run on the event loop (or contend for its
+    GIL). Created once per run, like the DiskWriter, and shared by all
+    download workers; see utils.mp3.check_mp3 for what is checked.
+
+    Keeps the totals behind the per-core throughput report: bytes checked
+    divided by the CPU seconds the workers spent on them.
+    """
+
+    def __init__(self, processes: int, write_tags: bool = False, embed_cover: bool = True) -> None:
+        self.processes = max(1, processes)
+        self.write_tags = write_tags
+        self.embed_cover = embed_cover
+        # spawn: the parent has an event loop and thread pools that must not
+        # be forked; workers only import utils.mp3.
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+        )
+        self.files = 0
+        self.invalid = 0
+        # Valid files whose audio matches another download (counted by the caller).
+        self.duplicates = 0
+        self.bytes = 0
+        self.cpu_seconds = 0.0
+
+    async def verify(
+        self,
+        path: Path,
+        track: TrackResult,
+        cover: Optional[Path],
+        logger: logging.Logger,
+    ) -> Optional[Mp3Check]:
+        """
+        Check the complete download at ``path`` (and tag it when enabled),
+        before it is renamed to its final name. Returns the check for a valid
+        file, or None when the file is invalid or could not be checked. An
+        invalid file is removed, so the next run downloads it afresh instead
+        of resuming it.
+        """
+        tags = None
+        if self.write_tags:
+            tags = Id3Tags(
+                title=track.title,
+                url=track.result_url or track.url,
+                cover_url=track.thumbnail,
+                cover_path=str(cover) if cover is not None and self.embed_cover else None,
+            )
+        started = time.perf_counter()
+        try:
+            check = await asyncio.get_running_loop().run_in_executor(
+                self._pool, check_mp3, str(path), tags
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Could not verify %s (%s)", path, exc)
+            METRICS.counter("verified_files_total", result="error").inc()
+            return None
+        _VERIFY_SECONDS.observe(time.perf_counter() - started)
+
+        self.files += 1
+        self.bytes += check.size
+        self.cpu_seconds += check.cpu_seconds
+        _VERIFY_BYTES.inc(check.size)
+        _VERIFY_CPU_SECONDS.inc(check.cpu_seconds)
+        if check.cpu_seconds > 0:
+            _VERIFY_CORE_THROUGHPUT.observe(check.size / check.cpu_seconds)
+
+        if not check.ok:
+            self.invalid += 1
+            METRICS.counter("verified_files_total", result="invalid").inc()
+            logger.error(
+                "Download of '%s' is not valid MP3 audio: %s; removing %s", track.title, check.reason, path
+            )
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+
+        METRICS.counter("verified_files_total", result="ok").inc()
+        return check
+
+    def log_summary(self, logger: logging.Logger) -> None:
+        if not self.files:
+            return
+        mb = self.bytes / 1e6
+        per_core = mb / max(self.cpu_seconds, 1e-9)
+        logger.info(
+            "Verified %d files (%.1f MB, %d invalid, %d duplicate audio) in %.2f CPU seconds: "
+            "%.1f MB/s per core, up to %.1f MB/s with %d processes",
+            self.files,
+            mb,
+            self.invalid,
+            self.duplicates,
+            self.cpu_seconds,
+            per_core,
+            per_core * self.processes,
+            self.processes,
+        )
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+def build_audio_verifier(settings: Dict[str, Any], share: int = 1) -> Optional[AudioVerifier]:
+    """
+    Build the verifier described by settings["verify"], or None when it is
+    disabled. With ``processes`` 0 the pool gets one process per core, divided
+    by ``share`` when several downloader processes (shards) run side by side.
+    """
+    cfg = settings.get("verify", {})
+    if not cfg.get("enabled", False):
+        return None
+    processes = int(cfg.get("processes", 0))
+    if processes <= 0:
+        processes = (os.cpu_count() or 1) // max(1, share)
+    return AudioVerifier(
+        processes=processes,
+        write_tags=bool(cfg.get("write_tags", False)),
+        embed_cover=bool(cfg.get("embed_cover", True)),
+    )
@@ -1,25 +1,28 @@
-thonimport argparse
-import asyncio
+import argparse
+import itertools
 import logging
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Any, AsyncIterator, Coroutine, Dict, Iterator, List, Optional, Union
 
-from downloader.spotify_handler import fetch_tracks_metadata
-from downloader.mp3_exporter import export_tracks_with_downloads
-from utils.parser import load_input_urls, load_settings
-from utils.error_handler import setup_logging
+from downloader.export_formats import EXPORT_EXECUTORS, configured_exports
+from utils.dedup import MemorySeen, build_seen_filter
+from utils.error_handler import configure_logging, setup_logging, shutdown_logging
+from utils.parser import InputEntry, iter_input_entries, load_settings, resolve_project_path
+from utils.spotify_urls import count_distinct_tracks, extract_track_id
+
+# Everything that pulls in asyncio, aiohttp or an export backend is imported
+# inside the function that needs it, so --dry-run and --help start quickly.
+if TYPE_CHECKING:
+    from utils.manifest import RunManifest
+    from utils.progress import ProgressReporter
 
 def get_project_root() -> Path:
     return Path(__file__).resolve().parent.parent
 
-async def async_main(input_file: Path, settings_file: Path) -> None:
-    logger = setup_logging()
-    logger.info("Starting Spotify Music MP3 Downloader")
-
-    if not input_file.exists():
-        logger.error("Input file does not exist: %s", input_file)
-        raise SystemExit(1)
-
+def _load_run_settings(settings_file: Path, logger: logging.Logger) -> Dict[str, Any]:
+    """
+    Load the settings file and apply its logging settings, exiting on errors.
+    """
     if not settings_file.exists():
         logger.error("Settings file does not exist: %s", settings_file)
         raise SystemExit(1)
@@ -31,40 +34,389 @@ async def async_main(input_file: Path, settings_file: Path) -> None:
         raise SystemExit(1)
 
     try:
-        urls: List[str] = load_input_urls(input_file)
+        configure_logging(settings)
+    except ValueError as exc:
+        logger.error("Invalid logging settings: %s", exc)
+        raise SystemExit(1)
+    return settings
+
+async def serve_main(settings_file: Path, bind: Optional[str] = None) -> None:
+    from downloader.service import serve
+
+    logger = setup_logging()
+    logger.info("Starting Spotify Music MP3 Downloader job service")
+    settings = _load_run_settings(settings_file, logger)
+    await serve(settings, get_project_root(), bind)
+    logger.info("All done.")
+
+async def async_main(
+    input_file: Path,
+    settings_file: Path,
+    pipeline: bool = False,
+    incremental: bool = False,
+    shards: Optional[int] = None,
+    processes: Optional[int] = None,
+    work_queue: Optional[str] = None,
+) -> None:
+    from downloader.exporters import export_tracks_async
+    from downloader.mp3_exporter import download_tracks_audio
+    from downloader.pipeline import run_streaming_pipeline
+    from downloader.sharding import build_sharding_config, run_sharded
+    from downloader.spotify_handler import build_endpoints, fetch_tracks_metadata
+    from downloader.verify import build_audio_verifier
+    from utils.concurrency import build_adaptive_concurrency
+    from utils.disk_writer import build_disk_writer
+    from utils.http_session import create_session
+    from utils.manifest import open_manifest
+    from utils.metadata_cache import open_metadata_cache
+    from utils.metrics import METRICS, build_loop_lag_monitor, build_metrics_writer
+    from utils.progress import build_progress_reporter
+    from utils.rate_limit import build_rate_limiter
+    from utils.retry import build_retry_engine
+    from utils.scheduler import build_job_schedule
+
+    logger = setup_logging()
+    logger.info("Starting Spotify Music MP3 Downloader")
+
+    if str(input_file) != "-" and not input_file.exists():
+        logger.error("Input file does not exist: %s", input_file)
+        raise SystemExit(1)
+
+    settings = _load_run_settings(settings_file, logger)
+
+    project_root = get_project_root()
+    pipeline_enabled = pipeline or bool(settings.get("pipeline", {}).get("enabled", False))
+    sharding = build_sharding_config(settings, project_root, shards, processes, work_queue)
+
+    try:
+        seen = build_seen_filter(settings, project_root)
+        stream = iter_input_entries(
+            input_file,
+            fmt=str(settings.get("input", {}).get("format", "auto")),
+            is_new=seen.add,
+        )
+        first = next(stream, None)
     except Exception as exc:  # noqa: BLE001
         logger.exception("Unable to load input URLs: %s", exc)
         raise SystemExit(1)
 
-    if not urls:
+    if first is None:
         logger.warning("No valid Spotify URLs found in input file: %s", input_file)
         raise SystemExit(1)
 
-    logger.info("Loaded %d Spotify URLs", len(urls))
+    # Sharding and the job scheduler need the whole input up front; otherwise
+    # URLs are streamed into the workers while the input is still being read.
+    entries: Optional[List[InputEntry]] = None
+    urls: List[str] = []
+    if sharding is not None or settings.get("scheduler", {}).get("enabled", False):
+        try:
+            entries = [first, *stream]
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Unable to load input URLs: %s", exc)
+            raise SystemExit(1)
+        finally:
+            seen.close()
+        urls = [entry.url for entry in entries]
+        logger.info("Loaded %d Spotify URLs (%d distinct tracks)", len(urls), count_distinct_tracks(urls))
+    else:
+        logger.info("Streaming Spotify URLs from %s", input_file)
 
-    http_timeout = float(settings.get("http_timeout", 30.0))
-    concurrent_requests = int(settings.get("concurrent_requests", 10))
+    if sharding is not None and entries is not None:
+        if incremental and sharding.shared:
+            logger.error("--incremental needs each node's own manifest and cannot use a shared work queue")
+            raise SystemExit(1)
+        await run_sharded(
+            entries,
+            settings,
+            project_root,
+            sharding,
+            pipeline=pipeline_enabled,
+            incremental=incremental,
+        )
+        logger.info("All done.")
+        return
 
-    logger.info(
-        "Fetching metadata with timeout=%s seconds and concurrency=%s",
-        http_timeout,
-        concurrent_requests,
-    )
+    cache = open_metadata_cache(settings, project_root)
+    manifest = open_manifest(settings, project_root, force=incremental)
+    retry = build_retry_engine(settings)
+    limiter = build_adaptive_concurrency(settings)
+    writer = build_disk_writer(settings)
+    verifier = build_audio_verifier(settings)
+    rate_limiter = build_rate_limiter(settings)
+    schedule = build_job_schedule(settings, entries) if entries is not None else None
+    metrics_writer = build_metrics_writer(settings, project_root)
+    loop_lag = build_loop_lag_monitor(settings)
+    progress = None
+    if metrics_writer is not None:
+        metrics_writer.start()
+    if loop_lag is not None:
+        loop_lag.start()
+    tally = {"input": 0, "skipped": 0}
+    try:
+        work_urls: Union[List[str], AsyncIterator[str]]
+        if entries is not None:
+            work_urls = urls
+            if incremental and manifest is not None:
+                work_urls = [u for u in urls if not manifest.is_complete(u)]
+                logger.info(
+                    "Incremental run: %d of %d URLs already complete, processing %d",
+                    len(urls) - len(work_urls),
+                    len(urls),
+                    len(work_urls),
+                )
+            progress = build_progress_reporter(settings, total=len(work_urls))
+        else:
+            progress = build_progress_reporter(settings, total=None)
+            work_urls = _stream_work_urls(
+                itertools.chain([first], stream),
+                manifest if incremental else None,
+                urls if incremental else None,
+                tally,
+                progress,
+            )
+        if progress is not None:
+            progress.start()
 
-    track_results = await fetch_tracks_metadata(
-        urls=urls,
-        timeout=http_timeout,
-        concurrent_requests=concurrent_requests,
-    )
+        async with create_session(settings, rate_limiter) as session:
+            if pipeline_enabled:
+                track_results = await run_streaming_pipeline(
+                    urls=work_urls,
+                    settings=settings,
+                    project_root=project_root,
+                    cache=cache,
+                    manifest=manifest,
+                    retry=retry,
+                    limiter=limiter,
+                    session=session,
+                    writer=writer,
+                    rate_limiter=rate_limiter,
+                    schedule=schedule,
+                    verifier=verifier,
+                )
+            else:
+                http_timeout = float(settings.get("http_timeout", 30.0))
+                concurrent_requests = int(settings.get("concurrent_requests", 10))
+
+                logger.info(
+                    "Fetching metadata with timeout=%s seconds and concurrency=%s",
+                    http_timeout,
+                    concurrent_requests,
+                )
+
+                track_results = await fetch_tracks_metadata(
+                    urls=work_urls,
+                    timeout=http_timeout,
+                    concurrent_requests=concurrent_requests,
+                    cache=cache,
+                    retry=retry,
+                    limiter=limiter,
+                    session=session,
+                    endpoints=build_endpoints(settings),
+                )
+
+                await download_tracks_audio(
+                    tracks=track_results,
+                    settings=settings,
+                    project_root=project_root,
+                    manifest=manifest,
+                    retry=retry,
+                    limiter=limiter,
+                    session=session,
+                    writer=writer,
+                    rate_limiter=rate_limiter,
+                    schedule=schedule,
+                    verifier=verifier,
+                )
+
+        if entries is None:
+            logger.info("Read %d distinct URLs from the input", tally["input"])
+            if incremental and manifest is not None:
+                logger.info(
+                    "Incremental run: %d of %d URLs already complete, processed %d",
+                    tally["skipped"],
+                    tally["input"],
+                    tally["input"] - tally["skipped"],
+                )
+
+        if incremental and manifest is not None:
+            track_results = manifest.merge(urls, track_results)
+
+        if progress is not None:
+            await progress.stop()
+            progress = None
+
+        await export_tracks_async(track_results, settings, project_root)
+    finally:
+        if progress is not None:
+            await progress.stop()
+        if entries is None:
+            seen.close()
+        writer.close()
+        if verifier is not None:
+            verifier.close()
+            verifier.log_summary(logger)
+        if cache is not None:
+            cache.close()
+            logger.info("Metadata cache stats: %s", cache.stats())
+        if manifest is not None:
+            manifest.close()
+        if retry is not None:
+            logger.info("Retried %d requests", retry.retries)
+        if limiter is not None:
+            logger.info("Final adaptive concurrency limits: %s", limiter.limits())
+        if rate_limiter is not None:
+            logger.info("Rate limit stats: %s", rate_limiter.stats())
+        if schedule is not None:
+            schedule.log_report(logger)
+        connection_metrics = {
+            name: value
+            for name, value in METRICS.snapshot()["counters"].items()
+            if name.startswith("http_")
+        }
+        logger.info("HTTP connection stats: %s", connection_metrics)
+        if loop_lag is not None:
+            await loop_lag.stop()
+        if metrics_writer is not None:
+            await metrics_writer.stop()
+            logger.info("Metrics written to %s", metrics_writer.path)
+
+    logger.info("All done.")
+
+async def _stream_work_urls(
+    entries: Iterator[InputEntry],
+    manifest: Optional["RunManifest"],
+    all_urls: Optional[List[str]],
+    tally: Dict[str, int],
+    progress: Optional["ProgressReporter"],
+) -> AsyncIterator[str]:
+    """
+    Feed URLs from the input stream to the workers as they are read. The
+    input is parsed on a worker thread; with a ``manifest`` (incremental runs)
+    completed URLs are skipped and every URL is kept in ``all_urls`` for the
+    final merge.
+    """
+    from utils.worker_pool import iterate_in_thread
 
+    async for entry in iterate_in_thread(entries):
+        tally["input"] += 1
+        if all_urls is not None:
+            all_urls.append(entry.url)
+        if manifest is not None and manifest.is_complete(entry.url):
+            tally["skipped"] += 1
+            continue
+        if progress is not None:
+            progress.add_total()
+        yield entry.url
+    if progress is not None:
+        progress.input_complete()
+
+def validate_main(input_file: Path, settings_file: Path) -> bool:
+    """
+    --dry-run: check the settings and read the whole input, then report the
+    URLs, distinct tracks and outputs a run would produce. Nothing is fetched
+    and neither the network stack nor any export backend is imported. Returns
+    False when the run would fail or the input has URLs without a track ID.
+    """
+    logger = setup_logging()
+    settings = _load_run_settings(settings_file, logger)
     project_root = get_project_root()
-    await export_tracks_with_downloads(
-        tracks=track_results,
-        settings=settings,
-        project_root=project_root,
+    ok = True
+
+    executor = settings.get("export", {}).get("executor", "thread")
+    if executor not in EXPORT_EXECUTORS:
+        logger.error("export.executor must be one of %s, got %r", EXPORT_EXECUTORS, executor)
+        ok = False
+
+    if str(input_file) != "-" and not input_file.exists():
+        logger.error("Input file does not exist: %s", input_file)
+        return False
+
+    urls = 0
+    invalid = 0
+    tracks = MemorySeen()
+    distinct = 0
+    try:
+        seen = build_seen_filter(settings, project_root)
+        try:
+            fmt = str(settings.get("input", {}).get("format", "auto"))
+            for entry in iter_input_entries(input_file, fmt=fmt, is_new=seen.add):
+                urls += 1
+                track_id = extract_track_id(entry.url)
+                if track_id is None:
+                    invalid += 1
+                    logger.warning("No Spotify track ID in input URL: %s", entry.url)
+                elif tracks.add(track_id):
+                    distinct += 1
+        finally:
+            seen.close()
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Unable to load input URLs: %s", exc)
+        return False
+
+    if urls == 0:
+        logger.warning("No valid Spotify URLs found in input file: %s", input_file)
+        ok = False
+    logger.info(
+        "Dry run: %d distinct URLs, %d distinct tracks, %d URLs without a track ID",
+        urls,
+        distinct,
+        invalid,
     )
+    audio_dir = settings.get("export", {}).get("audio_output_dir", "data/downloads")
+    logger.info("Audio would be downloaded to %s", resolve_project_path(audio_dir, project_root))
+    thumbnails_cfg = settings.get("thumbnails", {})
+    if thumbnails_cfg.get("enabled", False):
+        cache_dir = thumbnails_cfg.get("cache_dir", "data/cache/thumbnails")
+        logger.info("Covers would be cached in %s", resolve_project_path(cache_dir, project_root))
+    verify_cfg = settings.get("verify", {})
+    if verify_cfg.get("enabled", False):
+        logger.info(
+            "Downloads would be checked as MP3 audio%s",
+            " and tagged" if verify_cfg.get("write_tags", False) else "",
+        )
+    for key, path in configured_exports(settings, project_root):
+        logger.info("Would export %s to %s", key, path)
+    return ok and invalid == 0
 
-    logger.info("All done.")
+def _run_profiled(run: Coroutine[Any, Any, None], output: Path) -> None:
+    """
+    Run ``run`` under yappi (wall clock, covers every coroutine) when it is
+    installed, otherwise under cProfile, and save pstats-compatible stats to
+    ``output``.
+    """
+    import asyncio
+    import pstats
+
+    logger = logging.getLogger("spotify_downloader")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        import yappi
+    except ImportError:
+        yappi = None
+
+    if yappi is not None:
+        yappi.set_clock_type("wall")
+        yappi.start()
+        try:
+            asyncio.run(run)
+        finally:
+            yappi.stop()
+            yappi.get_func_stats().save(str(output), type="pstat")
+            yappi.clear_stats()
+    else:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            asyncio.run(run)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(str(output))
+
+    logger.info("Profile written to %s (%s)", output, "yappi" if yappi is not None else "cProfile")
+    stats = pstats.Stats(str(output))
+    stats.sort_stats("cumulative").print_stats(20)
 
 def main() -> None:
     project_root = get_project_root()
@@ -79,7 +431,10 @@ def main() -> None:
         "--input",
         type=str,
         default=str(default_input),
-        help=f"Path to JSON file containing Spotify track URLs (default: {default_input})",
+        help=(
+            "Spotify track URLs as a JSON array, NDJSON or plain text (one per line); "
+            f"'-' reads stdin (default: {default_input})"
+        ),
     )
     parser.add_argument(
         "-s",
@@ -88,16 +443,96 @@ def main() -> None:
         default=str(default_settings),
         help=f"Path to settings.json configuration file (default: {default_settings})",
     )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap metadata fetching and audio downloads (overrides pipeline.enabled)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process URLs that are new or failed in the run manifest; exports still list every track",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=None,
+        help="Split the input into N shards by track ID and run them in worker processes",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Worker processes for a sharded run (default: one per shard, at most one per CPU)",
+    )
+    parser.add_argument(
+        "--work-queue",
+        type=str,
+        default=None,
+        help="Shared SQLite work queue for a multi-node sharded run; run the same command on every node",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Validate the settings and input and report what a run would do, without any network access",
+    )
+    parser.add_argument(
+        "--serve",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="HOST:PORT",
+        help="Run as a long-lived HTTP job service (default address from settings.service)",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=str(project_root / "data" / "metrics" / "profile.pstats"),
+        default=None,
+        metavar="PATH",
+        help="Profile the run (yappi if installed, else cProfile) and save pstats to PATH",
+    )
 
     args = parser.parse_args()
 
+    profile_path: Optional[Path] = Path(args.profile) if args.profile else None
+
+    if args.dry_run:
+        try:
+            ok = validate_main(Path(args.input), Path(args.settings))
+        finally:
+            shutdown_logging()
+        if not ok:
+            raise SystemExit(1)
+        return
+
+    import asyncio
+
     try:
-        asyncio.run(async_main(Path(args.input), Path(args.settings)))
+        run: Coroutine[Any, Any, None]
+        if args.serve is not None:
+            run = serve_main(Path(args.settings), args.serve or None)
+        else:
+            run = async_main(
+                Path(args.input),
+                Path(args.settings),
+                pipeline=args.pipeline,
+                incremental=args.incremental,
+                shards=args.shards,
+                processes=args.processes,
+                work_queue=args.work_queue,
+            )
+        if profile_path is not None:
+            _run_profiled(run, profile_path)
+        else:
+            asyncio.run(run)
     except KeyboardInterrupt:
         logging.getLogger("spotify_downloader").warning("Interrupted by user.")
     except Exception as exc:  # noqa: BLE001
         logging.getLogger("spotify_downloader").exception("Fatal error: %s", exc)
         raise SystemExit(1)
+    finally:
+        shutdown_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
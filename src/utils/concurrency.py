@@ -0,0 +1,264 @@
+import asyncio
+import contextvars
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from urllib.parse import urlparse
+
+from utils.metrics import METRICS
+from utils.retry import RetryableStatusError
+
+OVERLOAD_STATUSES = (429, 503)
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit for a single host.
+
+    - Every ``ceil(limit)`` healthy completions while the limit was actually
+      reached, the limit grows by ``increase_step`` (additive increase).
+    - A 429/503 response, a timeout, or a window whose p95 latency exceeds
+      ``latency_tolerance`` times the baseline p95 multiplies the limit by
+      ``decrease_factor`` (multiplicative decrease), at most once per
+      ``cooldown`` seconds so one burst of errors only counts once.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        cooldown: float = 1.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.host = host
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.increase_step = float(increase_step)
+        self.decrease_factor = float(decrease_factor)
+        self.latency_tolerance = float(latency_tolerance)
+        self.cooldown = float(cooldown)
+        self.logger = logger or logging.getLogger("spotify_downloader")
+
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+        self._saturated = False
+        self._healthy_since_increase = 0
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._samples_since_eval = 0
+        self._baseline_p95: Optional[float] = None
+        self._last_decrease = 0.0
+
+        self._gauge = METRICS.gauge("concurrency_limit", host=host)
+        self._gauge.set(int(self.limit))
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            if self.in_flight >= int(self.limit):
+                self._saturated = True
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            if self.in_flight >= int(self.limit):
+                self._saturated = True
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._samples_since_eval += 1
+
+        if self._samples_since_eval >= max(20, int(self.limit)):
+            self._samples_since_eval = 0
+            p95 = self._p95()
+            if self._baseline_p95 is None:
+                self._baseline_p95 = p95
+            elif p95 > self._baseline_p95 * self.latency_tolerance:
+                self._decrease("p95 latency %.3fs > %.3fs baseline" % (p95, self._baseline_p95))
+                return
+            else:
+                # Track slow drift in the healthy latency without chasing spikes.
+                self._baseline_p95 = min(p95, 0.9 * self._baseline_p95 + 0.1 * p95)
+
+        self._healthy_since_increase += 1
+        if self._saturated and self._healthy_since_increase >= math.ceil(self.limit):
+            self._healthy_since_increase = 0
+            self._saturated = False
+            self._set_limit(self.limit + self.increase_step, "healthy")
+
+    def on_overload(self, reason: str) -> None:
+        self._decrease(reason)
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._healthy_since_increase = 0
+        self._latencies.clear()
+        self._samples_since_eval = 0
+        self._set_limit(self.limit * self.decrease_factor, reason)
+
+    def _set_limit(self, value: float, reason: str) -> None:
+        new_limit = min(float(self.max_limit), max(float(self.min_limit), value))
+        old = int(self.limit)
+        self.limit = new_limit
+        if int(new_limit) != old:
+            self.logger.info(
+                "Concurrency limit for %s: %d -> %d (%s)",
+                self.host,
+                old,
+                int(new_limit),
+                reason,
+            )
+            self._gauge.set(int(new_limit))
+        if new_limit > old:
+            # Wake waiters that fit under the raised limit.
+            asyncio.ensure_future(self._notify())
+
+    async def _notify(self) -> None:
+        async with self._cond:
+            self._cond.notify_all()
+
+    def _p95(self) -> float:
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+class Slot:
+    """
+    Handle for one request holding a concurrency slot. Call mark_response()
+    once headers arrive so latency measures time-to-first-byte rather than
+    the full body transfer, and observe_status() to report throttling.
+    """
+
+    __slots__ = ("_started", "latency", "overloaded_status")
+
+    def __init__(self) -> None:
+        self._started = time.monotonic()
+        self.latency: Optional[float] = None
+        self.overloaded_status: Optional[int] = None
+
+    def mark_response(self) -> None:
+        if self.latency is None:
+            self.latency = time.monotonic() - self._started
+
+    def observe_status(self, status: int) -> None:
+        self.mark_response()
+        if status in OVERLOAD_STATUSES:
+            self.overloaded_status = status
+
+    def exclude(self, seconds: float) -> None:
+        """
+        Leave ``seconds`` spent waiting on something other than the host (a
+        rate-limit token) out of the latency sample.
+        """
+        if self.latency is None:
+            self._started += seconds
+
+    def elapsed(self) -> float:
+        return self.latency if self.latency is not None else time.monotonic() - self._started
+
+_CURRENT_SLOT: "contextvars.ContextVar[Optional[Slot]]" = contextvars.ContextVar(
+    "current_slot", default=None
+)
+
+def current_slot() -> Optional[Slot]:
+    """
+    The Slot held by the running task, if any (used by session hooks).
+    """
+    return _CURRENT_SLOT.get()
+
+class AdaptiveConcurrency:
+    """
+    Registry of per-host AdaptiveLimit instances. Requests go through
+    ``slot(url, kind)``, which blocks while the host is at its limit and feeds
+    the outcome back into the controller. A host's limit starts at
+    ``initial_limits[kind]`` ("metadata" or "download").
+    """
+
+    def __init__(self, initial_limits: Dict[str, int], **limit_options: Any) -> None:
+        self.initial_limits = initial_limits
+        self.limit_options = limit_options
+        self.max_limit = int(limit_options.get("max_limit", 64))
+        self._limits: Dict[str, AdaptiveLimit] = {}
+
+    def for_host(self, host: str, kind: str) -> AdaptiveLimit:
+        limit = self._limits.get(host)
+        if limit is None:
+            initial = self.initial_limits.get(kind, 1)
+            limit = AdaptiveLimit(host, initial, **self.limit_options)
+            self._limits[host] = limit
+        return limit
+
+    def limits(self) -> Dict[str, int]:
+        return {host: int(limit.limit) for host, limit in self._limits.items()}
+
+    @asynccontextmanager
+    async def slot(self, url: str, kind: str) -> AsyncIterator[Slot]:
+        limit = self.for_host(urlparse(url).hostname or "", kind)
+        await limit.acquire()
+        handle = Slot()
+        token = _CURRENT_SLOT.set(handle)
+        try:
+            yield handle
+        except asyncio.TimeoutError:
+            limit.on_overload("timeout")
+            raise
+        except RetryableStatusError as exc:
+            if exc.status in OVERLOAD_STATUSES:
+                limit.on_overload(f"HTTP {exc.status}")
+            raise
+        else:
+            if handle.overloaded_status is not None:
+                limit.on_overload(f"HTTP {handle.overloaded_status}")
+            else:
+                limit.on_success(handle.elapsed())
+        finally:
+            _CURRENT_SLOT.reset(token)
+            await limit.release()
+
+@asynccontextmanager
+async def request_slot(
+    limiter: Optional[AdaptiveConcurrency],
+    url: str,
+    kind: str,
+) -> AsyncIterator[Optional[Slot]]:
+    """
+    ``limiter.slot(...)`` when adaptive concurrency is enabled, otherwise a
+    no-op that yields None (the worker pool size is the only limit).
+    """
+    if limiter is None:
+        yield None
+        return
+    async with limiter.slot(url, kind) as handle:
+        yield handle
+
+def build_adaptive_concurrency(settings: Dict[str, Any]) -> Optional[AdaptiveConcurrency]:
+    """
+    Build the controller described by settings["adaptive_concurrency"], or
+    None when the static concurrent_requests / concurrent_downloads apply.
+    """
+    cfg = settings.get("adaptive_concurrency", {})
+    if not cfg.get("enabled", False):
+        return None
+    return AdaptiveConcurrency(
+        initial_limits={
+            "metadata": int(settings.get("concurrent_requests", 10)),
+            "download": int(settings.get("concurrent_downloads", 5)),
+        },
+        min_limit=int(cfg.get("min_limit", 1)),
+        max_limit=int(cfg.get("max_limit", 64)),
+        increase_step=float(cfg.get("increase_step", 1.0)),
+        decrease_factor=float(cfg.get("decrease_factor", 0.5)),
+        latency_tolerance=float(cfg.get("latency_tolerance", 2.0)),
+        cooldown=float(cfg.get("cooldown_seconds", 1.0)),
+    )
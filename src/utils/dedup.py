@@ -0,0 +1,137 @@
+import hashlib
+import math
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Set, Union
+
+from utils.parser import resolve_project_path
+
+DEDUP_MODES = ("memory", "bloom", "disk", "none")
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+class SeenFilter:
+    """
+    Remembers which input URLs were already yielded. add() returns True the
+    first time a key is seen and False for repeats.
+    """
+
+    def add(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class MemorySeen(SeenFilter):
+    """
+    Exact set of 16-byte URL digests: well under half the memory of a set of
+    the URL strings themselves, but still growing with the number of distinct URLs.
+    """
+
+    def __init__(self) -> None:
+        self._seen: Set[bytes] = set()
+
+    def add(self, key: str) -> bool:
+        digest = _digest(key)
+        if digest in self._seen:
+            return False
+        self._seen.add(digest)
+        return True
+
+class BloomSeen(SeenFilter):
+    """
+    Fixed-size Bloom filter sized for ``capacity`` keys at ``error_rate``
+    false positives. Memory never grows, but a false positive makes a new URL
+    look like a duplicate and it is skipped; ``false_positive_rate()``
+    estimates how likely that has become.
+    """
+
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 1e-4) -> None:
+        if not 0 < error_rate < 1:
+            raise ValueError(f"bloom error_rate must be between 0 and 1, got {error_rate}")
+        capacity = max(1, int(capacity))
+        self.bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.bits / capacity * math.log(2))))
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def add(self, key: str) -> bool:
+        # Double hashing: the k bit positions are h1 + i * h2 (mod bits).
+        digest = _digest(key)
+        position = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        bits = self.bits
+        array = self._array
+        new = False
+        for _ in range(self.hashes):
+            position %= bits
+            mask = 1 << (position & 7)
+            if not array[position >> 3] & mask:
+                array[position >> 3] |= mask
+                new = True
+            position += step
+        if new:
+            self.count += 1
+        return new
+
+    def false_positive_rate(self) -> float:
+        return (1.0 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+class DiskSeen(SeenFilter):
+    """
+    Exact set of URL digests in a SQLite file, for inputs whose distinct URLs
+    do not fit in memory. The file is recreated for every run.
+    """
+
+    def __init__(self, path: Union[str, Path], commit_every: int = 10_000) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        for stale in self.path.parent.glob(self.path.name + "*"):
+            stale.unlink()
+        self.commit_every = max(1, int(commit_every))
+        self._pending = 0
+        # The input may be read on an executor thread (one at a time).
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE seen (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+
+    def add(self, key: str) -> bool:
+        cursor = self._conn.execute("INSERT OR IGNORE INTO seen (digest) VALUES (?)", (_digest(key),))
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self._conn.commit()
+            self._pending = 0
+        return cursor.rowcount == 1
+
+    def close(self) -> None:
+        self._conn.close()
+        self.path.unlink(missing_ok=True)
+
+class NoDedup(SeenFilter):
+    def add(self, key: str) -> bool:
+        return True
+
+def build_seen_filter(settings: Dict[str, Any], project_root: Path) -> SeenFilter:
+    """
+    Deduplication for the input stream from settings["input"]["dedup"]:
+    "memory" (default, exact), "bloom" (fixed memory, rare false drops),
+    "disk" (exact, SQLite-backed) or "none".
+    """
+    cfg = settings.get("input", {})
+    mode = str(cfg.get("dedup", "memory"))
+    if mode == "memory":
+        return MemorySeen()
+    if mode == "bloom":
+        return BloomSeen(
+            capacity=int(cfg.get("bloom_capacity", 10_000_000)),
+            error_rate=float(cfg.get("bloom_error_rate", 1e-4)),
+        )
+    if mode == "disk":
+        return DiskSeen(
+            resolve_project_path(cfg.get("dedup_path", "data/state/input_seen.sqlite3"), project_root)
+        )
+    if mode == "none":
+        return NoDedup()
+    raise ValueError(f"input.dedup must be one of {', '.join(DEDUP_MODES)}, got {mode!r}")
@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import METRICS
+
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+
+_DISK_BYTES_WRITTEN = METRICS.counter("disk_bytes_written_total")
+
+_FALLOC_FL_KEEP_SIZE = 0x01
+_fallocate: Any = None
+
+def _reserve_keep_size(fd: int, offset: int, length: int) -> bool:
+    """
+    Reserve disk blocks for [offset, offset + length) without changing the
+    file size (Linux fallocate with FALLOC_FL_KEEP_SIZE). Resume reads the
+    bytes already downloaded from st_size, so a sequentially written file
+    must never look longer than its data, even after a hard kill. Returns
+    False where this is not available; the file is then not preallocated.
+    """
+    global _fallocate
+    if _fallocate is None:
+        _fallocate = False
+        if sys.platform.startswith("linux"):
+            try:
+                import ctypes
+                import ctypes.util
+
+                libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                _fallocate = libc.fallocate
+                _fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong)
+            except (OSError, AttributeError):
+                _fallocate = False
+    if not _fallocate:
+        return False
+    # Fails (e.g. EOPNOTSUPP on some filesystems) without side effects.
+    return _fallocate(fd, _FALLOC_FL_KEEP_SIZE, offset, length) == 0
+
+class BufferPool:
+    """
+    Free list of fixed-size bytearrays so steady-state downloads reuse the
+    same few buffers instead of allocating one per chunk.
+    """
+
+    def __init__(self, buffer_size: int, max_idle: int = 64) -> None:
+        self.buffer_size = max(4096, int(buffer_size))
+        self.max_idle = max_idle
+        self._free: List[bytearray] = []
+
+    def acquire(self) -> bytearray:
+        if self._free:
+            return self._free.pop()
+        return bytearray(self.buffer_size)
+
+    def release(self, buf: bytearray) -> None:
+        if len(self._free) < self.max_idle:
+            self._free.append(buf)
+
+def _pwrite_all(fd: int, data: memoryview, offset: int, lock: Optional[threading.Lock]) -> None:
+    if lock is None:
+        written = 0
+        while written < len(data):
+            written += os.pwrite(fd, data[written:], offset + written)
+        return
+    # Platforms without pwrite (Windows): seek + write under a per-file lock.
+    with lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+
+class FileSink:
+    """
+    Writes one file through a DiskWriter.
+
+    Incoming chunks are copied into a pooled buffer; each full buffer is
+    written with a positional write on the writer's thread pool while the next
+    one fills, so at most two buffers per file are in use and the event loop
+    never blocks on the filesystem. An optional SHA-256 is updated on the
+    writer thread in write order.
+    """
+
+    def __init__(
+        self,
+        writer: "DiskWriter",
+        fd: int,
+        position: int,
+        hasher: Optional[Any],
+        truncate_on_close: bool = True,
+    ) -> None:
+        self._writer = writer
+        self._fd = fd
+        self.start = position
+        self.position = position
+        self._hasher = hasher
+        self._truncate_on_close = truncate_on_close
+        self._buf: Optional[bytearray] = None
+        self._fill = 0
+        self._pending: Optional["asyncio.Future[bytearray]"] = None
+        self._lock = None if hasattr(os, "pwrite") else threading.Lock()
+        self._closed = False
+
+    async def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        pool = self._writer.pool
+        while view:
+            if self._buf is None:
+                self._buf = pool.acquire()
+                self._fill = 0
+            room = len(self._buf) - self._fill
+            n = min(room, len(view))
+            self._buf[self._fill:self._fill + n] = view[:n]
+            self._fill += n
+            view = view[n:]
+            if self._fill == len(self._buf):
+                await self._submit()
+
+    async def _submit(self) -> None:
+        if self._buf is None or self._fill == 0:
+            return
+        buf, length = self._buf, self._fill
+        self._buf = None
+        self._fill = 0
+
+        await self._drain()
+        offset = self.position
+        self.position += length
+        _DISK_BYTES_WRITTEN.inc(length)
+        self._pending = asyncio.get_running_loop().run_in_executor(
+            self._writer.executor, self._write_block, buf, length, offset
+        )
+
+    async def _drain(self) -> None:
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            self._writer.pool.release(await pending)
+
+    def _write_block(self, buf: bytearray, length: int, offset: int) -> bytearray:
+        with memoryview(buf) as whole:
+            data = whole[:length]
+            _pwrite_all(self._fd, data, offset, self._lock)
+            if self._hasher is not None:
+                self._hasher.update(data)
+            data.release()
+        return buf
+
+    def hexdigest(self) -> Optional[str]:
+        return self._hasher.hexdigest() if self._hasher is not None else None
+
+    async def close(self) -> None:
+        """
+        Flush buffered data and close the file. Sequential sinks truncate the
+        file to the bytes actually written, so space preallocated for an
+        interrupted download does not look like downloaded data on the next
+        resume. Sinks opened with open_at() leave the file size alone.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._submit()
+            await self._drain()
+        finally:
+            if self._buf is not None:
+                self._writer.pool.release(self._buf)
+                self._buf = None
+            fd, size, truncate = self._fd, self.position, self._truncate_on_close
+
+            def finish() -> None:
+                try:
+                    if truncate:
+                        os.ftruncate(fd, size)
+                finally:
+                    os.close(fd)
+
+            await asyncio.get_running_loop().run_in_executor(self._writer.executor, finish)
+
+class DiskWriter:
+    """
+    Dedicated thread pool for download file I/O plus a shared BufferPool.
+    """
+
+    def __init__(
+        self,
+        threads: int = 4,
+        buffer_size: int = 1024 * 1024,
+        preallocate: bool = True,
+    ) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, int(threads)),
+            thread_name_prefix="disk-writer",
+        )
+        self.pool = BufferPool(buffer_size)
+        self.preallocate = preallocate and hasattr(os, "posix_fallocate")
+
+    async def open(
+        self,
+        path: Path,
+        append: bool = False,
+        expected_size: Optional[int] = None,
+        compute_sha256: bool = True,
+    ) -> FileSink:
+        """
+        Open ``path`` for writing. With ``append`` the sink continues after the
+        existing bytes (and, when hashing, first hashes them so the digest
+        covers the whole file). ``expected_size`` is the final file size, used
+        to reserve the file's blocks when known. The reservation never
+        changes st_size, which stays the count of bytes written so a killed
+        download resumes from the right offset.
+        """
+
+        def do_open() -> FileSink:
+            flags = _WRITE_FLAGS | (0 if append else os.O_TRUNC)
+            fd = os.open(str(path), flags, 0o644)
+            try:
+                position = os.fstat(fd).st_size if append else 0
+                hasher = hashlib.sha256() if compute_sha256 else None
+                if hasher is not None and position:
+                    with open(path, "rb") as existing:
+                        for block in iter(lambda: existing.read(self.pool.buffer_size), b""):
+                            hasher.update(block)
+                if self.preallocate and expected_size and expected_size > position:
+                    _reserve_keep_size(fd, position, expected_size - position)
+            except BaseException:
+                os.close(fd)
+                raise
+            return FileSink(self, fd, position, hasher)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, do_open)
+
+    async def allocate(self, path: Path, size: int) -> None:
+        """
+        Create (or truncate) ``path`` with room for ``size`` bytes, so
+        segments can later be written at their offsets with open_at().
+        """
+
+        def do_allocate() -> None:
+            fd = os.open(str(path), _WRITE_FLAGS | os.O_TRUNC, 0o644)
+            try:
+                if self.preallocate and size:
+                    try:
+                        os.posix_fallocate(fd, 0, size)
+                        return
+                    except OSError:
+                        pass
+                os.ftruncate(fd, size)
+            finally:
+                os.close(fd)
+
+        await asyncio.get_running_loop().run_in_executor(self.executor, do_allocate)
+
+    async def open_at(self, path: Path, offset: int) -> FileSink:
+        """
+        Open an existing file for writing from ``offset`` without truncating
+        it; several such sinks can fill disjoint ranges of the same file.
+        """
+
+        def do_open() -> FileSink:
+            fd = os.open(str(path), _WRITE_FLAGS, 0o644)
+            return FileSink(self, fd, offset, None, truncate_on_close=False)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, do_open)
+
+    async def sha256(self, path: Path) -> str:
+        def digest() -> str:
+            hasher = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(self.pool.buffer_size), b""):
+                    hasher.update(block)
+            return hasher.hexdigest()
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, digest)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+_default_writer: Optional[DiskWriter] = None
+
+def default_disk_writer() -> DiskWriter:
+    """
+    Shared DiskWriter for callers that do not configure their own.
+    """
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = DiskWriter()
+    return _default_writer
+
+def build_disk_writer(settings: Dict[str, Any]) -> DiskWriter:
+    cfg = settings.get("disk_writer", {})
+    return DiskWriter(
+        threads=int(cfg.get("threads", 4)),
+        buffer_size=int(cfg.get("buffer_size", 1024 * 1024)),
+        preallocate=bool(cfg.get("preallocate", True)),
+    )
@@ -1,6 +1,12 @@
-thonimport logging
+import json
+import logging
+import queue
 from logging import Logger
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+_TEXT_FORMAT = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
+_LISTENER: Optional[QueueListener] = None
 
 class DownloadError(Exception):
     """Raised when a media download fails in a non-recoverable way."""
@@ -14,11 +20,77 @@ def setup_logging(level: int = logging.INFO) -> Logger:
     if not logger.handlers:
         logging.basicConfig(
             level=level,
-            format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+            format=_TEXT_FORMAT,
         )
         logger.setLevel(level)
     return logger
 
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: ts, level, logger and message, plus the
+    formatted traceback under ``exc_info`` when there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+def configure_logging(settings: Dict[str, Any]) -> Logger:
+    """
+    Replace the default handlers according to settings["logging"]:
+
+    - ``level``: logger level name (default INFO).
+    - ``format``: "text" (default) or "json" for one JSON object per line.
+    - ``queue``: hand records to a QueueListener thread, so the event loop
+      only enqueues them and never blocks on the output stream. Call
+      shutdown_logging() before exiting to flush it.
+    """
+    global _LISTENER
+    cfg = settings.get("logging", {})
+    level_name = str(cfg.get("level", "INFO")).upper()
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown logging.level {level_name!r}")
+    fmt = str(cfg.get("format", "text"))
+    if fmt not in ("text", "json"):
+        raise ValueError(f"logging.format must be 'text' or 'json', got {fmt!r}")
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(_TEXT_FORMAT))
+
+    shutdown_logging()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    if cfg.get("queue", False):
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        root.addHandler(QueueHandler(records))
+        _LISTENER = QueueListener(records, handler, respect_handler_level=True)
+        _LISTENER.start()
+    else:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+    logger = logging.getLogger("spotify_downloader")
+    logger.setLevel(level)
+    return logger
+
+def shutdown_logging() -> None:
+    """
+    Stop the queue listener (if any) after it has written every pending record.
+    """
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
 def handle_exception(
     logger: Logger,
     exc: BaseException,
@@ -0,0 +1,118 @@
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+from utils.metrics import METRICS
+from utils.rate_limit import RateLimiter
+
+CONNECTION_MODES = ("keepalive", "parallel")
+
+def _connection_trace_config() -> aiohttp.TraceConfig:
+    """
+    Record connection setup cost: new vs reused connections and the time
+    spent on DNS resolution and on establishing connections (TCP + TLS).
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_connection_create_start(
+        session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        ctx.connect_started = time.monotonic()
+
+    async def on_connection_create_end(
+        session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        METRICS.counter("http_connections_created_total").inc()
+        METRICS.counter("http_connection_setup_seconds_total").inc(
+            time.monotonic() - ctx.connect_started
+        )
+
+    async def on_connection_reuseconn(
+        session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        METRICS.counter("http_connections_reused_total").inc()
+
+    async def on_dns_resolvehost_start(
+        session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        ctx.dns_started = time.monotonic()
+
+    async def on_dns_resolvehost_end(
+        session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        METRICS.counter("http_dns_resolutions_total").inc()
+        METRICS.counter("http_dns_resolve_seconds_total").inc(time.monotonic() - ctx.dns_started)
+
+    async def on_dns_cache_hit(
+        session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        METRICS.counter("http_dns_cache_hits_total").inc()
+
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+    return trace_config
+
+def create_session(
+    settings: Dict[str, Any],
+    rate_limiter: Optional[RateLimiter] = None,
+) -> aiohttp.ClientSession:
+    """
+    Build the single ClientSession shared by the metadata and download
+    phases, tuned from settings["http"]:
+
+    - connection_limit: total open connections across all hosts.
+    - connection_limit_per_host: cap per host (0 = no per-host cap).
+    - dns_cache_ttl: seconds resolved addresses are reused.
+    - keepalive_timeout: seconds an idle connection is kept for reuse.
+    - connection_mode: "keepalive" keeps a small set of long-lived
+      connections per host and funnels requests through them (aiohttp does
+      not pipeline, so this is the closest HTTP/1.1 equivalent);
+      "parallel" opens as many connections per host as the limits allow.
+
+    With a ``rate_limiter`` every request first waits for its host's
+    requests-per-second token.
+    """
+    http_cfg = settings.get("http", {})
+    mode = http_cfg.get("connection_mode", "parallel")
+    if mode not in CONNECTION_MODES:
+        raise ValueError(f"http.connection_mode must be one of {CONNECTION_MODES}, got {mode!r}")
+
+    limit_per_host = int(http_cfg.get("connection_limit_per_host", 0))
+    keepalive_timeout = float(http_cfg.get("keepalive_timeout", 30.0))
+    if mode == "keepalive":
+        limit_per_host = limit_per_host or 4
+        keepalive_timeout = max(keepalive_timeout, 120.0)
+
+    connector = aiohttp.TCPConnector(
+        limit=int(http_cfg.get("connection_limit", 100)),
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=int(http_cfg.get("dns_cache_ttl", 300)),
+        use_dns_cache=True,
+        keepalive_timeout=keepalive_timeout,
+    )
+    trace_configs = [_connection_trace_config()]
+    if rate_limiter is not None:
+        trace_configs.append(rate_limiter.trace_config())
+    return aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+
+@asynccontextmanager
+async def borrow_session(
+    session: Optional[aiohttp.ClientSession],
+    settings: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[aiohttp.ClientSession]:
+    """
+    Yield ``session`` unchanged when the caller owns one; otherwise open a
+    session for the duration of the block and close it afterwards.
+    """
+    if session is not None:
+        yield session
+        return
+    async with create_session(settings or {}) as own_session:
+        yield own_session
@@ -0,0 +1,150 @@
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from utils.parser import resolve_project_path
+from utils.records import TrackResult
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    bytes INTEGER,
+    sha256 TEXT,
+    file_path TEXT,
+    track TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    audio_sha256 TEXT
+);
+"""
+
+# Columns added after the first release, for manifests created before them.
+_ADDED_COLUMNS = (("audio_sha256", "TEXT"),)
+
+class RunManifest:
+    """
+    Crash-safe SQLite record of every processed track across runs.
+
+    Each track is committed as soon as its download finishes, so an
+    interrupted run loses nothing that already completed. Incremental runs use
+    it to skip tracks whose file is still on disk with the recorded size, and
+    to merge their stored metadata back into the exports. Verified downloads
+    also record the SHA-256 of their audio frames, which finds the same audio
+    downloaded under another track.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tracks)")}
+        for name, kind in _ADDED_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE tracks ADD COLUMN {name} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tracks_audio_sha256 ON tracks (audio_sha256)")
+        self._conn.commit()
+
+    def record(
+        self,
+        track: TrackResult,
+        status: str,
+        size: Optional[int] = None,
+        sha256: Optional[str] = None,
+        file_path: Optional[Path] = None,
+        audio_sha256: Optional[str] = None,
+    ) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tracks "
+            "(url, status, bytes, sha256, file_path, track, updated_at, audio_sha256) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                track.url,
+                status,
+                size,
+                sha256,
+                str(file_path) if file_path is not None else None,
+                json.dumps(track.to_dict(), ensure_ascii=False),
+                time.time(),
+                audio_sha256,
+            ),
+        )
+        self._conn.commit()
+
+    def find_audio(self, audio_sha256: str, file_path: Path) -> Optional[str]:
+        """
+        Another file already recorded with the same audio, or None.
+        """
+        row = self._conn.execute(
+            "SELECT file_path FROM tracks WHERE audio_sha256 = ? AND file_path != ? LIMIT 1",
+            (audio_sha256, str(file_path)),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def is_complete(self, url: str) -> bool:
+        """
+        True when the URL finished successfully and its file is still on disk
+        with the recorded size.
+        """
+        row = self._conn.execute(
+            "SELECT status, bytes, file_path FROM tracks WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return False
+        status, size, file_path = row
+        if status != STATUS_DONE or not file_path:
+            return False
+        try:
+            return Path(file_path).stat().st_size == size
+        except OSError:
+            return False
+
+    def get_track(self, url: str) -> Optional[TrackResult]:
+        row = self._conn.execute("SELECT track FROM tracks WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return TrackResult.from_dict(json.loads(row[0]))
+
+    def merge(self, urls: Iterable[str], fresh_tracks: List[TrackResult]) -> List[TrackResult]:
+        """
+        Build the full track list for ``urls`` in input order, taking tracks
+        processed in this run from ``fresh_tracks`` and the rest from the
+        manifest.
+        """
+        fresh_by_url = {t.url: t for t in fresh_tracks}
+        merged: List[TrackResult] = []
+        for url in urls:
+            track = fresh_by_url.get(url) or self.get_track(url)
+            if track is not None:
+                merged.append(track)
+        return merged
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+def open_manifest(
+    settings: Dict[str, Any],
+    project_root: Path,
+    force: bool = False,
+) -> Optional[RunManifest]:
+    """
+    Open the manifest described by settings["manifest"]. Returns None when it
+    is disabled, unless ``force`` is set (incremental runs always need it).
+    """
+    manifest_cfg = settings.get("manifest", {})
+    if not (force or manifest_cfg.get("enabled", False)):
+        return None
+
+    path = resolve_project_path(manifest_cfg.get("path", "data/state/manifest.sqlite3"), project_root)
+    logging.getLogger("spotify_downloader").info("Using run manifest at %s", path)
+    return RunManifest(path)
@@ -0,0 +1,174 @@
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from utils.parser import resolve_project_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS oembed_cache (
+    track_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS oembed_cache_last_access ON oembed_cache (last_access);
+"""
+
+# Hits whose access time is written in one batch, and how many inserts (or
+# seconds) may pass between two checks of the entry cap.
+_ACCESS_BATCH = 1000
+_EVICT_EVERY = 1000
+_EVICT_INTERVAL = 60.0
+
+class MetadataCache:
+    """
+    Persistent SQLite cache of oEmbed responses keyed by Spotify track ID.
+
+    - Entries older than ``ttl_seconds`` are treated as misses and dropped.
+    - When more than ``max_entries`` are stored, the least recently used
+      entries are evicted. The check counts the table, so it runs only after
+      every 1000 inserts or once a minute (and on close); the table may
+      briefly exceed the cap by that much.
+    - Writes are batched into one transaction per ``commit_every`` changes;
+      a crash loses at most that many entries, which are simply re-fetched.
+    - Hits do not write: their access times are kept in memory and written
+      in batches, at the latest with the next commit.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 100_000,
+        commit_every: int = 200,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self.commit_every = max(1, int(commit_every))
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._pending_writes = 0
+        self._accessed: Dict[str, float] = {}
+        self._unchecked_inserts = 0
+        self._checked_at = time.monotonic()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def get(self, track_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT payload, fetched_at FROM oembed_cache WHERE track_id = ?",
+            (track_id,),
+        ).fetchone()
+        now = time.time()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        payload, fetched_at = row
+        if now - fetched_at > self.ttl_seconds:
+            self._conn.execute("DELETE FROM oembed_cache WHERE track_id = ?", (track_id,))
+            self._mark_dirty()
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self._accessed[track_id] = now
+        if len(self._accessed) >= _ACCESS_BATCH:
+            self.flush()
+        self.hits += 1
+        return json.loads(payload)
+
+    def put(self, track_id: str, metadata: Dict[str, Any]) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO oembed_cache (track_id, payload, fetched_at, last_access) "
+            "VALUES (?, ?, ?, ?)",
+            (track_id, json.dumps(metadata, ensure_ascii=False), now, now),
+        )
+        self._accessed.pop(track_id, None)
+        self._unchecked_inserts += 1
+        self._mark_dirty()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+    def flush(self, evict: bool = False) -> None:
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE oembed_cache SET last_access = ? WHERE track_id = ?",
+                [(accessed, track_id) for track_id, accessed in self._accessed.items()],
+            )
+            self._accessed.clear()
+        if self._unchecked_inserts and (
+            evict
+            or self._unchecked_inserts >= _EVICT_EVERY
+            or time.monotonic() - self._checked_at >= _EVICT_INTERVAL
+        ):
+            self._evict_over_capacity()
+            self._unchecked_inserts = 0
+            self._checked_at = time.monotonic()
+        self._conn.commit()
+        self._pending_writes = 0
+
+    def close(self) -> None:
+        self.flush(evict=True)
+        self._conn.close()
+
+    def _mark_dirty(self) -> None:
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.flush()
+
+    def _evict_over_capacity(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM oembed_cache").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM oembed_cache WHERE track_id IN ("
+            "SELECT track_id FROM oembed_cache ORDER BY last_access ASC LIMIT ?)",
+            (excess,),
+        )
+        self.evictions += excess
+
+def open_metadata_cache(settings: Dict[str, Any], project_root: Path) -> Optional[MetadataCache]:
+    """
+    Open the metadata cache described by settings["metadata_cache"], or return
+    None when it is disabled.
+    """
+    cache_cfg = settings.get("metadata_cache", {})
+    if not cache_cfg.get("enabled", False):
+        return None
+
+    path = resolve_project_path(cache_cfg.get("path", "data/cache/oembed.sqlite3"), project_root)
+    cache = MetadataCache(
+        path,
+        ttl_seconds=float(cache_cfg.get("ttl_seconds", 7 * 24 * 3600)),
+        max_entries=int(cache_cfg.get("max_entries", 100_000)),
+        commit_every=int(cache_cfg.get("commit_every", 200)),
+    )
+    logging.getLogger("spotify_downloader").info(
+        "Using oEmbed metadata cache at %s (ttl=%ss, max_entries=%s)",
+        path,
+        cache.ttl_seconds,
+        cache.max_entries,
+    )
+    return cache
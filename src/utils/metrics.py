@@ -0,0 +1,303 @@
+import asyncio
+import bisect
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.parser import resolve_project_path
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+# 64 KiB/s .. 1 GiB/s in steps of 4x.
+THROUGHPUT_BUCKETS: Tuple[float, ...] = tuple(float(64 * 1024 * 4 ** i) for i in range(8))
+
+class Histogram:
+    """
+    Cumulative-bucket histogram (Prometheus layout) with sum and count.
+    Percentiles are estimated by linear interpolation inside a bucket.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.bounds: Tuple[float, ...] = tuple(sorted(bounds))
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def percentile(self, fraction: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else lower
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.percentile(0.50),
+            "p90": self.percentile(0.90),
+            "p99": self.percentile(0.99),
+        }
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+class MetricsRegistry:
+    """
+    Process-wide store of named metrics, optionally split by labels:
+
+        METRICS.gauge("concurrency_limit", host="cdn2.meow.gs").set(12)
+    """
+
+    def __init__(self) -> None:
+        self._counters: Dict[_Key, Counter] = {}
+        self._gauges: Dict[_Key, Gauge] = {}
+        self._histograms: Dict[_Key, Histogram] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> _Key:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def counter(self, name: str, **labels: Any) -> Counter:
+        key = self._key(name, labels)
+        metric = self._counters.get(key)
+        if metric is None:
+            metric = self._counters[key] = Counter()
+        return metric
+
+    def counter_total(self, name: str) -> float:
+        """
+        Sum of counter ``name`` over all of its label sets.
+        """
+        return sum(c.value for (n, _), c in self._counters.items() if n == name)
+
+    def gauge(self, name: str, **labels: Any) -> Gauge:
+        key = self._key(name, labels)
+        metric = self._gauges.get(key)
+        if metric is None:
+            metric = self._gauges[key] = Gauge()
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        **labels: Any,
+    ) -> Histogram:
+        key = self._key(name, labels)
+        metric = self._histograms.get(key)
+        if metric is None:
+            metric = self._histograms[key] = Histogram(buckets)
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        def render(store: Dict[_Key, Any]) -> Dict[str, Any]:
+            out: Dict[str, Any] = {}
+            for (name, labels), metric in sorted(store.items()):
+                suffix = ",".join(f"{k}={v}" for k, v in labels)
+                value = metric.summary() if isinstance(metric, Histogram) else metric.value
+                out[f"{name}{{{suffix}}}" if suffix else name] = value
+            return out
+
+        return {
+            "counters": render(self._counters),
+            "gauges": render(self._gauges),
+            "histograms": render(self._histograms),
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format, suitable for
+        node_exporter's textfile collector.
+        """
+
+        def labels_text(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+            parts = [f'{k}="{_escape_label(v)}"' for k, v in labels]
+            if extra:
+                parts.append(extra)
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines: List[str] = []
+        typed = set()
+        for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+            for (name, labels), metric in sorted(store.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{labels_text(labels)} {_format_value(metric.value)}")
+        for (name, labels), hist in sorted(self._histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, n in zip(hist.bounds, hist.counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{name}_bucket{labels_text(labels, le)} {cumulative}")
+            inf = labels_text(labels, 'le="+Inf"')
+            lines.append(f"{name}_bucket{inf} {hist.count}")
+            lines.append(f"{name}_sum{labels_text(labels)} {_format_value(hist.sum)}")
+            lines.append(f"{name}_count{labels_text(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def render_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if math.isfinite(value) and value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+METRICS = MetricsRegistry()
+
+class MetricsWriter:
+    """
+    Writes the registry to ``path`` (format "prometheus" or "json") every
+    ``interval`` seconds while started, and once more on stop(). Files are
+    replaced atomically so a collector never reads a partial file.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        fmt: str = "prometheus",
+        interval: float = 0.0,
+        registry: MetricsRegistry = METRICS,
+    ) -> None:
+        if fmt not in ("prometheus", "json"):
+            raise ValueError(f"metrics.format must be 'prometheus' or 'json', got {fmt!r}")
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self.registry = registry
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def render(self) -> str:
+        if self.fmt == "json":
+            return self.registry.render_json()
+        return self.registry.render_prometheus()
+
+    def write(self) -> None:
+        self._write_text(self.render())
+
+    def start(self) -> None:
+        if self.interval > 0:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            text = self.render()
+            await loop.run_in_executor(None, self._write_text, text)
+
+    def _write_text(self, text: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.write()
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: a task asks to wake up every ``interval``
+    seconds and records how late it actually ran. Sustained lag means
+    something is blocking the loop (CPU-heavy work or blocking I/O).
+    """
+
+    def __init__(self, interval: float = 0.5, registry: MetricsRegistry = METRICS) -> None:
+        self.interval = interval
+        self._histogram = registry.histogram("event_loop_lag_seconds")
+        self._max = registry.gauge("event_loop_lag_max_seconds")
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self._histogram.observe(lag)
+            if lag > self._max.value:
+                self._max.set(lag)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+def build_metrics_writer(settings: Dict[str, Any], project_root: Path) -> Optional[MetricsWriter]:
+    cfg = settings.get("metrics", {})
+    if not cfg.get("enabled", False):
+        return None
+    return MetricsWriter(
+        resolve_project_path(cfg.get("path", "data/metrics/metrics.prom"), project_root),
+        fmt=str(cfg.get("format", "prometheus")),
+        interval=float(cfg.get("interval_seconds", 15.0)),
+    )
+
+def build_loop_lag_monitor(settings: Dict[str, Any]) -> Optional[LoopLagMonitor]:
+    cfg = settings.get("metrics", {})
+    interval = float(cfg.get("loop_lag_interval", 0.5))
+    if not cfg.get("enabled", False) or interval <= 0:
+        return None
+    return LoopLagMonitor(interval)
@@ -0,0 +1,265 @@
+import hashlib
+import mmap
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# Everything here is pure CPU/file work with no event loop, so it can run in
+# a process pool worker: check_mp3() is the worker entry point.
+
+_BITRATES_KBPS = {
+    # (MPEG-1, layer) and (MPEG-2/2.5, layer); index 0 ("free") is unsupported.
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+# Metadata blocks allowed after the last frame.
+_TRAILING_TAGS = (b"TAG", b"APETAGEX", b"LYRICSBEGIN")
+
+_COVER_MIME_TYPES = {".png": "image/png", ".gif": "image/gif", ".webp": "image/webp"}
+
+# Header bytes 1-2 -> (frame length without padding, padding size, samples,
+# sample rate, stream key) or None; filled lazily, at most 65536 entries.
+_HEADERS: Dict[int, Optional[Tuple[int, int, int, int, int]]] = {}
+
+@dataclass
+class Id3Tags:
+    """
+    What to write into a checked file's ID3v2 tag. The cover image is embedded
+    when ``cover_path`` is readable; otherwise ``cover_url`` is stored as a link.
+    """
+
+    title: str
+    url: str
+    cover_url: str = ""
+    cover_path: Optional[str] = None
+
+@dataclass
+class Mp3Check:
+    ok: bool
+    reason: str
+    frames: int
+    duration: float  # seconds
+    audio_sha256: str  # frames only, so re-tagging does not change it
+    size: int
+    sha256: Optional[str]  # whole file, only when check_mp3() rewrote it
+    cpu_seconds: float
+
+def _decode_header(bits: int) -> Optional[Tuple[int, int, int, int, int]]:
+    b1, b2 = bits >> 8, bits & 0xFF
+    if b1 & 0xE0 != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer = 4 - ((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES_KBPS[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    if layer == 1:
+        samples, slot = 384, 4
+    elif layer == 2 or mpeg1:
+        samples, slot = 1152, 1
+    else:
+        samples, slot = 576, 1
+    length = (samples // 8 * bitrate // sample_rate) // slot * slot
+    return length, slot, samples, sample_rate, (b1 & 0xFE) << 8 | (b2 & 0x0C)
+
+def _frame_at(data: "mmap.mmap", pos: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    (frame length, samples, sample rate, stream key) of the frame at ``pos``.
+    """
+    if data[pos] != 0xFF:
+        return None
+    bits = data[pos + 1] << 8 | data[pos + 2]
+    header = _HEADERS.get(bits, False)
+    if header is False:
+        header = _HEADERS[bits] = _decode_header(bits)
+    if header is None:
+        return None
+    length, slot, samples, sample_rate, key = header
+    if (data[pos + 2] >> 1) & 0x01:
+        length += slot
+    return length, samples, sample_rate, key
+
+def _id3v2_end(data: "mmap.mmap") -> int:
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = data[6] << 21 | data[7] << 14 | data[8] << 7 | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def _is_info_frame(data: "mmap.mmap", pos: int, length: int) -> bool:
+    """
+    True for a Xing/Info/VBRI header frame, which carries no audio.
+    """
+    mpeg1 = (data[pos + 1] >> 3) & 0x03 == 3
+    mono = data[pos + 3] >> 6 == 3
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    frame = data[pos:pos + length]
+    return frame[4 + side_info:8 + side_info] in (b"Xing", b"Info") or frame[36:40] == b"VBRI"
+
+def _find_first_frame(data: "mmap.mmap", start: int, limit: int) -> Optional[int]:
+    """
+    First offset in [start, limit) where two consecutive frames of the same
+    stream begin (a lone 0xFF byte is not enough).
+    """
+    end = len(data)
+    pos = data.find(b"\xff", start, limit)
+    while pos != -1 and pos + 4 <= end:
+        frame = _frame_at(data, pos)
+        if frame is not None:
+            following = pos + frame[0]
+            if following == end:
+                return pos
+            if following + 4 <= end:
+                after = _frame_at(data, following)
+                if after is not None and after[3] == frame[3]:
+                    return pos
+        pos = data.find(b"\xff", pos + 1, limit)
+    return None
+
+def _scan(data: "mmap.mmap") -> Tuple[str, int, int, int, float]:
+    """
+    Walk the frame headers. Returns (problem or "", first audio byte, end of
+    the last frame, frames, duration in seconds).
+    """
+    size = len(data)
+    start = _id3v2_end(data)
+    if start >= size:
+        return "no MPEG audio frames", 0, 0, 0, 0.0
+    first = _find_first_frame(data, start, min(size, start + 64 * 1024))
+    if first is None:
+        head = bytes(data[start:start + 64]).lstrip().lower()
+        if head.startswith((b"<", b"{")):
+            return "no MPEG audio frames (looks like an HTML/JSON error page)", 0, 0, 0, 0.0
+        return "no MPEG audio frames", 0, 0, 0, 0.0
+
+    frames = 0
+    duration = 0.0
+    key = None
+    pos = first
+    while pos + 4 <= size:
+        frame = _frame_at(data, pos)
+        if frame is None or (key is not None and frame[3] != key):
+            break
+        length, samples, sample_rate, key = frame
+        if pos + length > size:
+            return (
+                f"truncated: last frame needs {pos + length - size} more bytes",
+                first,
+                pos,
+                frames,
+                duration,
+            )
+        if frames > 0 or not _is_info_frame(data, pos, length):
+            frames += 1
+            duration += samples / sample_rate
+        pos += length
+
+    trailing = data[pos:size]
+    if trailing and not trailing.startswith(_TRAILING_TAGS) and trailing.strip(b"\x00"):
+        return f"frame sync lost at byte {pos} of {size}", first, pos, frames, duration
+    if frames == 0:
+        return "no MPEG audio frames", first, pos, frames, duration
+    return "", first, pos, frames, duration
+
+def _syncsafe(value: int) -> bytes:
+    return bytes(((value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F))
+
+def _id3_frame(frame_id: bytes, body: bytes) -> bytes:
+    return frame_id + _syncsafe(len(body)) + b"\x00\x00" + body
+
+def build_id3v2(tags: Id3Tags) -> bytes:
+    """
+    An ID3v2.4 tag (UTF-8 text) with the title, the track URL and the cover.
+    """
+    frames = [_id3_frame(b"TIT2", b"\x03" + tags.title.encode("utf-8"))]
+    if tags.url:
+        frames.append(_id3_frame(b"WOAS", tags.url.encode("latin-1", "replace")))
+    cover = None
+    if tags.cover_path:
+        try:
+            with open(tags.cover_path, "rb") as f:
+                cover = f.read()
+        except OSError:
+            cover = None
+    if cover:
+        mime = _COVER_MIME_TYPES.get(os.path.splitext(tags.cover_path or "")[1].lower(), "image/jpeg")
+        # Text encoding, MIME type, picture type 3 (front cover), empty description.
+        frames.append(_id3_frame(b"APIC", b"\x03" + mime.encode("ascii") + b"\x00\x03\x00" + cover))
+    elif tags.cover_url:
+        frames.append(_id3_frame(b"WXXX", b"\x03cover\x00" + tags.cover_url.encode("latin-1", "replace")))
+    body = b"".join(frames)
+    return b"ID3\x04\x00\x00" + _syncsafe(len(body)) + body
+
+def check_mp3(path: str, tags: Optional[Id3Tags] = None) -> Mp3Check:
+    """
+    Validate an MP3 by walking every frame header: the audio has to start
+    within 64 KiB of the file (after any ID3v2 tag) and run frame after frame
+    to the end, where only ID3v1/APE/Lyrics3 tags or zero padding may follow.
+    Computes the exact duration and a SHA-256 of the frames alone.
+
+    With ``tags`` a valid file's ID3v2 tag is replaced (atomically, through a
+    temporary file) and the new whole-file SHA-256 is returned as well.
+    """
+    started = time.process_time()
+    size = os.path.getsize(path)
+    sha256: Optional[str] = None
+    if size == 0:
+        return Mp3Check(False, "empty file", 0, 0.0, "", 0, None, time.process_time() - started)
+
+    tmp_path = path + ".tagging"
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        reason, first, end, frames, duration = _scan(data)
+        with memoryview(data) as view:
+            audio_sha256 = hashlib.sha256(view[first:end]).hexdigest() if not reason else ""
+            if not reason and tags is not None:
+                tag = build_id3v2(tags)
+                rest = view[_id3v2_end(data):]
+                hasher = hashlib.sha256(tag)
+                hasher.update(rest)
+                try:
+                    with open(tmp_path, "wb") as out:
+                        out.write(tag)
+                        out.write(rest)
+                except OSError:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                finally:
+                    rest.release()
+                sha256 = hasher.hexdigest()
+
+    if sha256 is not None:
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+    return Mp3Check(
+        ok=not reason,
+        reason=reason,
+        frames=frames,
+        duration=duration,
+        audio_sha256=audio_sha256,
+        size=size,
+        sha256=sha256,
+        cpu_seconds=time.process_time() - started,
+    )
+
+def format_duration(seconds: float) -> str:
+    """
+    "m:ss" (or "h:mm:ss"), rounded to the nearest second.
+    """
+    total = int(round(seconds))
+    hours, rest = divmod(total, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
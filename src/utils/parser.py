@@ -1,49 +1,295 @@
-thonimport json
+import copy
+import json
+import logging
 import re
+import sys
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
 
-def load_input_urls(path: Union[str, Path]) -> List[str]:
+DEFAULT_JOB = "default"
+
+PRIORITY_CLASSES = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+PRIORITY_NORMAL = PRIORITY_CLASSES["normal"]
+
+@dataclass
+class InputEntry:
+    """
+    One input URL with the optional scheduling tags of its input object.
+    """
+
+    url: str
+    job: str = DEFAULT_JOB
+    priority: int = PRIORITY_NORMAL
+    expected_size: Optional[int] = None
+
+def _parse_priority(value: Any, url: str) -> int:
+    if value is None or value == "":
+        return PRIORITY_NORMAL
+    if isinstance(value, str) and value.strip().lower() in PRIORITY_CLASSES:
+        return PRIORITY_CLASSES[value.strip().lower()]
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        # One badly tagged entry must not abort loading the whole input.
+        logging.getLogger("spotify_downloader").warning(
+            "Unknown priority %r for %s; using normal priority", value, url
+        )
+        return PRIORITY_NORMAL
+
+def _parse_size(value: Any, url: str) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        logging.getLogger("spotify_downloader").warning(
+            "Size %r for %s is not a number of bytes; ignoring it", value, url
+        )
+        return None
+
+def _entry_from_dict(item: Dict[str, Any]) -> Optional[InputEntry]:
+    url = str(item.get("url", "")).strip()
+    if not url:
+        return None
+    job = item.get("job", item.get("source"))
+    return InputEntry(
+        url=url,
+        job=str(job) if job not in (None, "") else DEFAULT_JOB,
+        priority=_parse_priority(item.get("priority"), url),
+        expected_size=_parse_size(item.get("size", item.get("expected_size")), url),
+    )
+
+INPUT_FORMATS = ("auto", "json", "ndjson", "text")
+
+_READ_CHUNK = 1 << 16
+_DECODER = json.JSONDecoder()
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+
+def _entry_from_value(value: Any) -> Optional[InputEntry]:
+    if isinstance(value, str):
+        candidate = value.strip()
+        return InputEntry(url=candidate) if candidate else None
+    if isinstance(value, dict):
+        return _entry_from_dict(value)
+    return None
+
+class _JsonStream:
+    """
+    Incremental reader for one top-level JSON array (or object) in a text
+    stream: values are decoded one at a time from a buffer that only ever
+    holds the unparsed tail of the file, never the whole document.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+        self._buffer = ""
+        self._pos = 0
+        self._consumed = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._stream.read(_READ_CHUNK)
+        if not chunk:
+            self._eof = True
+            return False
+        self._consumed += self._pos
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """
+        Next non-whitespace character without consuming it ("" at end of input).
+        """
+        while True:
+            self._pos = _WHITESPACE_RE.match(self._buffer, self._pos).end()  # type: ignore[union-attr]
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(
+                f"Invalid JSON input at character {self._consumed + self._pos}: "
+                f"expected {char!r}, found {found or 'end of input'!r}"
+            )
+        self._pos += 1
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as exc:
+                # Most likely the value continues in the next chunk.
+                if not self._fill():
+                    raise ValueError(
+                        f"Invalid JSON input at character {self._consumed + exc.pos}: {exc.msg}"
+                    ) from exc
+                continue
+            if end == len(self._buffer) and not self._eof and self._buffer[self._pos] not in '"[{':
+                # A bare number or literal may continue in the next chunk.
+                if self._fill():
+                    continue
+            self._pos = end
+            return value
+
+    def values(self) -> Iterator[Any]:
+        opening = self._peek()
+        if opening not in "[{":
+            raise ValueError("JSON input must be an array of URLs/objects or an object of URLs")
+        closing = "]" if opening == "[" else "}"
+        self._pos += 1
+        first = True
+        while True:
+            if self._peek() == closing:
+                self._pos += 1
+                return
+            if not first:
+                self._expect(",")
+            first = False
+            if opening == "{":
+                # Fallback: treat the object as a mapping of name -> url
+                self._value()
+                self._expect(":")
+            yield self._value()
+
+def _detect_format(path: Optional[Path], stream: TextIO) -> str:
+    if path is not None:
+        suffix = path.suffix.lower()
+        if suffix in (".ndjson", ".jsonl"):
+            return "ndjson"
+        if suffix == ".json":
+            return "json"
+        if suffix == ".txt":
+            return "text"
+    # stdin or an unknown extension: sniff the first character.
+    buffer = getattr(stream, "buffer", None)
+    head = buffer.peek(256).lstrip()[:1] if hasattr(buffer, "peek") else b""
+    first = head.decode("ascii", "ignore")
+    if first == "[":
+        return "json"
+    if first in ("{", '"'):
+        return "ndjson"
+    return "text"
+
+def _iter_raw_entries(stream: TextIO, fmt: str) -> Iterator[InputEntry]:
+    if fmt == "json":
+        for value in _JsonStream(stream).values():
+            entry = _entry_from_value(value)
+            if entry is not None:
+                yield entry
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if fmt == "ndjson":
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"Invalid NDJSON on line {line_number}: {exc}") from exc
+            entry = _entry_from_value(value)
+        else:
+            entry = InputEntry(url=line)
+        if entry is not None:
+            yield entry
+
+def iter_input_entries(
+    path: Union[str, Path],
+    fmt: str = "auto",
+    is_new: Optional[Callable[[str], bool]] = None,
+) -> Iterator[InputEntry]:
+    """
+    Lazily yield the input entries of ``path`` ("-" reads stdin), so work can
+    start on the first URL while the rest of the file is still being read.
+
+    Formats (``fmt``; "auto" picks one from the file extension, or from the
+    first character for stdin and other extensions):
+      - json: an array of URLs or tagged objects (see load_input_entries()),
+        parsed incrementally, or an object mapping names to URLs.
+      - ndjson: one URL string or tagged object per line.
+      - text: one URL per line; blank lines and # comments are skipped.
+
+    Duplicate URLs are dropped (the first entry's tags win). ``is_new`` decides
+    what counts as new (see utils.dedup); by default an in-memory set.
     """
-    Load Spotify track URLs from a JSON file.
+    if fmt not in INPUT_FORMATS:
+        raise ValueError(f"input format must be one of {', '.join(INPUT_FORMATS)}, got {fmt!r}")
+    if is_new is None:
+        seen: Set[str] = set()
+
+        def is_new(url: str) -> bool:
+            if url in seen:
+                return False
+            seen.add(url)
+            return True
+
+    from_stdin = str(path) == "-"
+    stream: TextIO = sys.stdin if from_stdin else Path(path).open("r", encoding="utf-8")
+    try:
+        if fmt == "auto":
+            fmt = _detect_format(None if from_stdin else Path(path), stream)
+        for entry in _iter_raw_entries(stream, fmt):
+            if is_new(entry.url):
+                yield entry
+    finally:
+        if not from_stdin:
+            stream.close()
+
+def load_input_entries(path: Union[str, Path], fmt: str = "auto") -> List[InputEntry]:
+    """
+    Load Spotify track URLs from a JSON file, keeping per-URL scheduling tags.
 
     Supported formats:
       - ["https://open.spotify.com/track/...", "..."]
-      - [{"url": "https://open.spotify.com/track/..."}, ...]
+      - [{"url": "https://open.spotify.com/track/...", "job": "acme",
+          "priority": "high", "size": 5242880}, ...]
+
+    ``job`` (or ``source``) names the batch a URL belongs to, ``priority`` is
+    a class name (urgent/high/normal/low) or number (lower runs first) and
+    ``size`` an expected download size in bytes. All tags are optional.
+    NDJSON and plain-text inputs are read too (see iter_input_entries(),
+    which streams the same entries without materializing them).
     """
-    file_path = Path(path)
-    with file_path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    urls: List[str] = []
-
-    if isinstance(data, list):
-        for item in data:
-            if isinstance(item, str):
-                candidate = item.strip()
-                if candidate:
-                    urls.append(candidate)
-            elif isinstance(item, dict):
-                url = str(item.get("url", "")).strip()
-                if url:
-                    urls.append(url)
-    elif isinstance(data, dict):
-        # Fallback: treat dict as a mapping of name -> url
-        for value in data.values():
-            if isinstance(value, str):
-                candidate = value.strip()
-                if candidate:
-                    urls.append(candidate)
-
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_urls: List[str] = []
-    for u in urls:
-        if u not in seen:
-            seen.add(u)
-            unique_urls.append(u)
-
-    return unique_urls
+    return list(iter_input_entries(path, fmt))
+
+def parse_input_entries(values: Iterable[Any]) -> List[InputEntry]:
+    """
+    Entries from already-decoded JSON values, in the same forms as a JSON
+    input file. Blank values and repeated URLs are skipped.
+    """
+    seen: Set[str] = set()
+    entries: List[InputEntry] = []
+    for value in values:
+        entry = _entry_from_value(value)
+        if entry is not None and entry.url not in seen:
+            seen.add(entry.url)
+            entries.append(entry)
+    return entries
+
+def load_input_urls(path: Union[str, Path]) -> List[str]:
+    """
+    Load Spotify track URLs from a JSON file (see load_input_entries()).
+    """
+    return [entry.url for entry in iter_input_entries(path)]
 
 def load_settings(path: Union[str, Path]) -> Dict[str, Any]:
     """
@@ -58,7 +304,30 @@ def load_settings(path: Union[str, Path]) -> Dict[str, Any]:
 
     return settings
 
+def merge_settings(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A copy of ``base`` with ``overrides`` applied: nested objects are merged
+    key by key, any other value replaces the base value.
+    """
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_settings(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+def resolve_project_path(path: Union[str, Path], project_root: Path) -> Path:
+    """
+    Resolve a settings path relative to the project root unless it is absolute.
+    """
+    resolved = Path(path)
+    if not resolved.is_absolute():
+        resolved = project_root / resolved
+    return resolved
+
 _SANITIZE_RE = re.compile(r"[^\w\-.]+")
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
 
 def safe_filename(name: str, fallback: str = "file", max_length: int = 120) -> str:
     """
@@ -82,6 +351,19 @@ def safe_filename(name: str, fallback: str = "file", max_length: int = 120) -> s
 
     return sanitized
 
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, int, Optional[int]]]:
+    """
+    Parse a ``Content-Range: bytes <start>-<end>/<total>`` header into
+    (start, end, total). total is None when the server sends ``*``.
+    """
+    if not value:
+        return None
+    match = _CONTENT_RANGE_RE.match(value.strip())
+    if match is None:
+        return None
+    total = None if match.group(3) == "*" else int(match.group(3))
+    return int(match.group(1)), int(match.group(2)), total
+
 def flatten(iterable: Iterable[Iterable[Any]]) -> List[Any]:
     """
     Small helper to flatten a two-level nested iterable into a list.
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from utils.metrics import METRICS, MetricsRegistry
+
+class ProgressReporter:
+    """
+    Logs one aggregate progress line every ``interval`` seconds instead of a
+    line per track: tracks finished out of ``total``, tracks/s and MB/s over
+    the last interval, ETA at the average rate so far, and failure and retry
+    counts. Everything is read from the metrics registry, so the hot path
+    pays nothing beyond the counters it already updates.
+
+    With a streamed input the total is not known up front: pass ``total=None``,
+    call add_total() as URLs are read and input_complete() at the end. Until
+    then the total is shown as a lower bound and there is no ETA.
+    """
+
+    def __init__(
+        self,
+        total: Optional[int],
+        interval: float = 5.0,
+        logger: Optional[logging.Logger] = None,
+        registry: MetricsRegistry = METRICS,
+    ) -> None:
+        self.total = total or 0
+        self.total_known = total is not None
+        self.interval = interval
+        self.logger = logger or logging.getLogger("spotify_downloader")
+        self.registry = registry
+        self._ok = registry.counter("tracks_processed_total", result="ok")
+        self._failed = registry.counter("tracks_processed_total", result="failed")
+        self._bytes = registry.counter("download_bytes_total")
+        self._started = time.monotonic()
+        self._last = (self._started, 0.0, 0.0)
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._last = (self._started, self._done(), self._bytes.value)
+        self._task = asyncio.ensure_future(self._run())
+
+    def add_total(self, count: int = 1) -> None:
+        self.total += count
+
+    def input_complete(self) -> None:
+        self.total_known = True
+
+    def _done(self) -> float:
+        return self._ok.value + self._failed.value
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        now = time.monotonic()
+        done = self._done()
+        size = self._bytes.value
+        last_at, last_done, last_size = self._last
+        self._last = (now, done, size)
+        if final:
+            # The closing line reports the whole run, not the last interval.
+            last_at, last_done, last_size = self._started, 0.0, 0.0
+        span = max(now - last_at, 1e-9)
+        average = done / max(now - self._started, 1e-9)
+        remaining = max(0.0, self.total - done)
+        eta = f"{remaining / average:.0f}s" if average > 0 and self.total_known else "?"
+        self.logger.info(
+            "%s %d/%d%s tracks (%.1f%%) | %.1f tracks/s | %.2f MB/s | ETA %s | failed %d | retries %d",
+            "Finished:" if final else "Progress:",
+            done,
+            self.total,
+            "" if self.total_known else "+",
+            100.0 * done / self.total if self.total else 100.0,
+            (done - last_done) / span,
+            (size - last_size) / span / 1e6,
+            "0s" if final else eta,
+            self._failed.value,
+            self.registry.counter_total("retries_total"),
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.report(final=True)
+
+def build_progress_reporter(
+    settings: Dict[str, Any],
+    total: Optional[int],
+) -> Optional[ProgressReporter]:
+    interval = float(settings.get("logging", {}).get("progress_interval_seconds", 5.0))
+    if interval <= 0:
+        return None
+    return ProgressReporter(total, interval)
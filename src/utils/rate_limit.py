@@ -0,0 +1,202 @@
+import asyncio
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional
+
+import aiohttp
+
+from utils.concurrency import current_slot
+from utils.metrics import METRICS
+from utils.scheduler import current_job
+
+class TokenBucket:
+    """
+    Token bucket refilled at ``rate`` tokens per second, holding at most
+    ``burst`` tokens. acquire() takes its tokens immediately and, when that
+    leaves the bucket in debt, sleeps until the debt is repaid; concurrent
+    callers therefore queue up behind each other's debt without a lock, and
+    requests larger than ``burst`` (a big chunk) still work.
+
+    Consumption is also tallied in one-second bins so utilization() can
+    report the share of the configured rate used over the last ``window``
+    seconds.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, window: float = 10.0) -> None:
+        if rate <= 0:
+            raise ValueError(f"rate for {name} must be positive, got {rate}")
+        self.name = name
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.window = float(window)
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._usage: Deque[List[float]] = deque()
+        self._gauge = METRICS.gauge("rate_limit_utilization", bucket=name)
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """
+        Take ``amount`` tokens, waiting as long as needed. Returns the seconds waited.
+        """
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= amount
+        self._record(now, amount)
+        if self._tokens >= 0:
+            return 0.0
+        delay = -self._tokens / self.rate
+        self.waits += 1
+        self.waited_seconds += delay
+        await asyncio.sleep(delay)
+        return delay
+
+    def _record(self, now: float, amount: float) -> None:
+        second = float(int(now))
+        if self._usage and self._usage[-1][0] == second:
+            self._usage[-1][1] += amount
+        else:
+            self._usage.append([second, amount])
+        self._trim(now)
+        self._gauge.set(self.utilization(now))
+
+    def _trim(self, now: float) -> None:
+        while self._usage and self._usage[0][0] <= now - self.window:
+            self._usage.popleft()
+
+    def utilization(self, now: Optional[float] = None) -> float:
+        """
+        Tokens consumed over the last ``window`` seconds as a fraction of ``rate``.
+        """
+        now = time.monotonic() if now is None else now
+        self._trim(now)
+        used = sum(amount for _, amount in self._usage)
+        return used / (self.rate * self.window)
+
+class RateLimiter:
+    """
+    Request-rate and bandwidth budgets from settings["rate_limit"]:
+
+    - ``hosts``: per-host token buckets ({"requests_per_second", "burst"}),
+      with the optional ``default`` entry applied to unlisted hosts. They are
+      enforced for every request on the shared session (see trace_config()).
+    - ``bandwidth_bytes_per_second``: global cap on downloaded bytes.
+    - ``per_job_bandwidth_bytes_per_second``: the same cap for each job
+      (the input ``job``/``source`` tag; untagged URLs share one job).
+
+    Bandwidth is charged from the download chunk loops via consume_bytes().
+    """
+
+    def __init__(
+        self,
+        hosts: Dict[str, Dict[str, float]],
+        default_host: Optional[Dict[str, float]] = None,
+        bandwidth: float = 0.0,
+        per_job_bandwidth: float = 0.0,
+        window: float = 10.0,
+    ) -> None:
+        self.host_config = hosts
+        self.default_host = default_host
+        self.per_job_bandwidth = float(per_job_bandwidth)
+        self.window = window
+        self._hosts: Dict[str, Optional[TokenBucket]] = {}
+        self._jobs: Dict[str, TokenBucket] = {}
+        self.bandwidth = (
+            TokenBucket("bandwidth", bandwidth, bandwidth, window) if bandwidth > 0 else None
+        )
+
+    def _bucket_for_host(self, host: str) -> Optional[TokenBucket]:
+        if host in self._hosts:
+            return self._hosts[host]
+        cfg = self.host_config.get(host, self.default_host)
+        bucket = None
+        if cfg and float(cfg.get("requests_per_second", 0)) > 0:
+            rate = float(cfg["requests_per_second"])
+            bucket = TokenBucket(f"host:{host}", rate, float(cfg.get("burst", rate)), self.window)
+        self._hosts[host] = bucket
+        return bucket
+
+    def _bucket_for_job(self, job: str) -> Optional[TokenBucket]:
+        if self.per_job_bandwidth <= 0:
+            return None
+        bucket = self._jobs.get(job)
+        if bucket is None:
+            bucket = TokenBucket(
+                f"job:{job}", self.per_job_bandwidth, self.per_job_bandwidth, self.window
+            )
+            self._jobs[job] = bucket
+        return bucket
+
+    async def before_request(self, host: str) -> float:
+        bucket = self._bucket_for_host(host)
+        if bucket is None:
+            return 0.0
+        return await bucket.acquire()
+
+    async def consume_bytes(self, size: int, job: Optional[str] = None) -> None:
+        """
+        Charge ``size`` downloaded bytes to the global budget and to ``job``
+        (by default the job of the running task, see scheduler.current_job()).
+        """
+        job_bucket = self._bucket_for_job(job or current_job())
+        if job_bucket is not None:
+            await job_bucket.acquire(size)
+        if self.bandwidth is not None:
+            await self.bandwidth.acquire(size)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        Session hook that waits for the host's request token before each
+        request (retries included). The wait is excluded from the adaptive
+        concurrency latency sample so throttling is not mistaken for overload.
+        """
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+        ) -> None:
+            waited = await self.before_request(params.url.host or "")
+            slot = current_slot()
+            if waited and slot is not None:
+                slot.exclude(waited)
+
+        trace_config.on_request_start.append(on_request_start)
+        return trace_config
+
+    def _buckets(self) -> List[TokenBucket]:
+        buckets = [b for b in self._hosts.values() if b is not None]
+        buckets.extend(self._jobs.values())
+        if self.bandwidth is not None:
+            buckets.append(self.bandwidth)
+        return buckets
+
+    def utilization(self) -> Dict[str, float]:
+        """
+        Current utilization (0..1, above 1 while callers are queued) per bucket.
+        """
+        return {b.name: round(b.utilization(), 3) for b in self._buckets()}
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            b.name: {
+                "utilization": round(b.utilization(), 3),
+                "waits": b.waits,
+                "waited_seconds": round(b.waited_seconds, 3),
+            }
+            for b in self._buckets()
+        }
+
+def build_rate_limiter(settings: Dict[str, Any]) -> Optional[RateLimiter]:
+    cfg = settings.get("rate_limit", {})
+    if not cfg.get("enabled", False):
+        return None
+    return RateLimiter(
+        hosts=cfg.get("hosts", {}),
+        default_host=cfg.get("default"),
+        bandwidth=float(cfg.get("bandwidth_bytes_per_second", 0)),
+        per_job_bandwidth=float(cfg.get("per_job_bandwidth_bytes_per_second", 0)),
+        window=float(cfg.get("utilization_window_seconds", 10.0)),
+    )
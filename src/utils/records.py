@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+# Records are plain __slots__ dataclasses (no per-instance __dict__), declared
+# by hand so they stay compatible with Python < 3.10. A processed track is one
+# TrackResult plus one MediaInfo per stream, instead of four nested dicts and a
+# list; to_dict() builds the README-shaped dict only where JSON is written.
+
+@dataclass
+class MediaInfo:
+    __slots__ = ("url", "quality", "extension", "type")
+
+    url: str
+    quality: str
+    extension: str
+    type: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "quality": self.quality,
+            "extension": self.extension,
+            "type": self.type,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MediaInfo":
+        return cls(
+            url=str(data.get("url", "")),
+            quality=str(data.get("quality", "")),
+            extension=str(data.get("extension", "")),
+            type=str(data.get("type", "")),
+        )
+
+@dataclass
+class TrackResult:
+    __slots__ = ("url", "result_url", "title", "thumbnail", "duration", "medias", "type", "error")
+
+    url: str  # original URL
+    result_url: str
+    title: str
+    thumbnail: str
+    duration: str  # filled in after the download when the audio is verified
+    medias: Tuple[MediaInfo, ...]
+    type: str
+    # Set when the download fails. With ``duration``, the only fields that
+    # change after the metadata lookup.
+    error: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "result": {
+                "url": self.result_url,
+                "title": self.title,
+                "thumbnail": self.thumbnail,
+                "duration": self.duration,
+                "medias": [m.to_dict() for m in self.medias],
+                "type": self.type,
+                "error": self.error,
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TrackResult":
+        """
+        Rebuild a track from its to_dict() form (manifest rows, shard results).
+        """
+        result = data.get("result") or {}
+        url = data.get("url", "")
+        result_url = result.get("url", "")
+        return cls(
+            url=url,
+            # Share the string when both URLs are the same, as they are for fresh tracks.
+            result_url=url if result_url == url else result_url,
+            title=result.get("title", ""),
+            thumbnail=result.get("thumbnail", ""),
+            duration=result.get("duration", ""),
+            medias=tuple(MediaInfo.from_dict(m) for m in result.get("medias") or ()),
+            type=result.get("type", ""),
+            error=bool(result.get("error", False)),
+        )
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+import aiohttp
+
+from utils.metrics import METRICS
+
+T = TypeVar("T")
+
+class RetryableStatusError(Exception):
+    """Raised for HTTP statuses the retry policy treats as transient."""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+class CircuitOpenError(Exception):
+    """Raised when a host's circuit breaker is open and requests are refused."""
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as delta-seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    max_retry_after: float = 120.0
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Exponential backoff with full jitter for the given (1-based) attempt.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+class CircuitBreaker:
+    """
+    Per-host breaker: after ``failure_threshold`` consecutive failures the
+    host is refused for ``reset_timeout`` seconds. Then it is half-open:
+    exactly one trial request (the probe) is let through while every other
+    request is still refused. Success closes the breaker again; failure
+    re-opens it for another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """
+        True when a request may go out now. Past ``reset_timeout`` the first
+        caller gets True and becomes the probe; its outcome must be reported
+        with record_success(), record_failure(probe=True) or release_probe().
+        """
+        if self.opened_at is None:
+            return True
+        if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self.probing = True
+        return True
+
+    def release_probe(self) -> None:
+        """
+        The probe ended without a verdict (cancelled, or a non-retryable
+        error): let the next caller probe instead.
+        """
+        self.probing = False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self, probe: bool = False) -> bool:
+        """
+        Count a failure. Returns True when this failure opened the breaker.
+        A failed ``probe`` re-opens it for another ``reset_timeout``; a late
+        failure of a request sent before the breaker opened only counts.
+        """
+        self.consecutive_failures += 1
+        if self.opened_at is not None:
+            if probe:
+                self.opened_at = time.monotonic()
+                self.probing = False
+            return False
+        if self.consecutive_failures < self.failure_threshold:
+            return False
+        self.opened_at = time.monotonic()
+        return True
+
+class RetryEngine:
+    """
+    Shared retry policy plus one circuit breaker per host, used by both the
+    oEmbed and the audio download paths.
+    """
+
+    def __init__(
+        self,
+        policy: RetryPolicy,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self.policy = policy
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retries = 0
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self._breakers[host] = breaker
+        return breaker
+
+    async def run(
+        self,
+        url: str,
+        operation: Callable[[], Awaitable[T]],
+        logger: logging.Logger,
+    ) -> T:
+        """
+        Await ``operation()`` until it succeeds or the policy gives up.
+
+        Timeouts, aiohttp client errors and RetryableStatusError are retried;
+        anything else propagates immediately. The last error is re-raised when
+        attempts run out.
+        """
+        host = urlparse(url).hostname or ""
+        breaker = self.breaker(host)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            # An open breaker only lets its single probe through.
+            probe = breaker.is_open
+            if not breaker.allow():
+                raise CircuitOpenError(f"circuit open for {host}")
+
+            try:
+                result = await operation()
+            except RetryableStatusError as exc:
+                error: BaseException = exc
+                delay = self.policy.backoff(attempt)
+                if exc.retry_after is not None:
+                    delay = max(delay, min(exc.retry_after, self.policy.max_retry_after))
+            except (asyncio.TimeoutError, aiohttp.ClientError) as exc:
+                error = exc
+                delay = self.policy.backoff(attempt)
+            except BaseException:
+                if probe:
+                    breaker.release_probe()
+                raise
+            else:
+                breaker.record_success()
+                return result
+
+            if breaker.record_failure(probe):
+                logger.warning(
+                    "Circuit breaker opened for %s after %d consecutive failures",
+                    host,
+                    breaker.consecutive_failures,
+                )
+            if attempt >= self.policy.max_attempts:
+                raise error
+
+            self.retries += 1
+            METRICS.counter("retries_total", host=host).inc()
+            logger.warning(
+                "Retrying %s in %.2fs (attempt %d/%d): %s",
+                url,
+                delay,
+                attempt + 1,
+                self.policy.max_attempts,
+                str(error) or type(error).__name__,
+            )
+            await asyncio.sleep(delay)
+
+def raise_for_retryable_status(resp: aiohttp.ClientResponse, retry: Optional[RetryEngine]) -> None:
+    """
+    Raise RetryableStatusError when the response status should be retried.
+    Without a retry engine nothing is considered retryable.
+    """
+    if retry is not None and resp.status in retry.policy.retry_statuses:
+        raise RetryableStatusError(resp.status, parse_retry_after(resp.headers.get("Retry-After")))
+
+async def run_with_retry(
+    retry: Optional[RetryEngine],
+    url: str,
+    operation: Callable[[], Awaitable[T]],
+    logger: logging.Logger,
+) -> T:
+    if retry is None:
+        return await operation()
+    return await retry.run(url, operation, logger)
+
+def build_retry_engine(settings: Dict[str, Any]) -> Optional[RetryEngine]:
+    """
+    Build the retry engine described by settings["retry"], or None when
+    retries are disabled.
+    """
+    retry_cfg = settings.get("retry", {})
+    if not retry_cfg.get("enabled", False):
+        return None
+
+    policy = RetryPolicy(
+        max_attempts=max(1, int(retry_cfg.get("max_attempts", 4))),
+        base_delay=float(retry_cfg.get("base_delay", 0.5)),
+        max_delay=float(retry_cfg.get("max_delay", 30.0)),
+        max_retry_after=float(retry_cfg.get("max_retry_after", 120.0)),
+        retry_statuses=tuple(int(s) for s in retry_cfg.get("retry_statuses", (429, 500, 502, 503, 504))),
+    )
+    breaker_cfg = retry_cfg.get("circuit_breaker", {})
+    return RetryEngine(
+        policy,
+        failure_threshold=int(breaker_cfg.get("failure_threshold", 5)),
+        reset_timeout=float(breaker_cfg.get("reset_timeout", 30.0)),
+    )
@@ -0,0 +1,209 @@
+import contextvars
+import heapq
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from utils.parser import DEFAULT_JOB, PRIORITY_NORMAL, InputEntry
+
+T = TypeVar("T")
+
+_CURRENT_JOB: "contextvars.ContextVar[str]" = contextvars.ContextVar("current_job", default=DEFAULT_JOB)
+
+def current_job() -> str:
+    """
+    The job tag of the track the running task is working on.
+    """
+    return _CURRENT_JOB.get()
+
+@contextmanager
+def job_context(job: str) -> Iterator[None]:
+    token = _CURRENT_JOB.set(job)
+    try:
+        yield
+    finally:
+        _CURRENT_JOB.reset(token)
+
+class _JobQueue(Generic[T]):
+    __slots__ = ("weight", "pass_value", "heap")
+
+    def __init__(self, weight: float, pass_value: float) -> None:
+        self.weight = weight
+        self.pass_value = pass_value
+        self.heap: List[Tuple[float, int, T]] = []
+
+class FairScheduler(Generic[T]):
+    """
+    Orders work by priority class, then by weighted fair share between jobs,
+    then (optionally) shortest expected size first within a job.
+
+    - Lower priority numbers always go first: nothing from class 2 is handed
+      out while class 1 has pending items.
+    - Within a class, jobs are served by stride scheduling: each job has a
+      pass value that grows by 1/weight per dispatched item and the job with
+      the lowest pass goes next, so a job of weight 2 gets twice the slots of
+      a job of weight 1 and a 50-item job is not queued behind a 100k-item one.
+      A job that becomes active starts at the class's current pass, so it
+      cannot claim a backlog of "unused" turns.
+    - Within a job, items with a known expected size go smallest first, then
+      the rest in submission order.
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        shortest_first: bool = True,
+    ) -> None:
+        self.weights = weights or {}
+        self.shortest_first = shortest_first
+        self._classes: Dict[int, Dict[str, _JobQueue[T]]] = {}
+        self._class_pass: Dict[int, float] = {}
+        self._seq = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(
+        self,
+        item: T,
+        job: str = DEFAULT_JOB,
+        priority: int = PRIORITY_NORMAL,
+        expected_size: Optional[int] = None,
+    ) -> None:
+        jobs = self._classes.setdefault(priority, {})
+        queue = jobs.get(job)
+        if queue is None:
+            weight = max(1e-6, float(self.weights.get(job, 1.0)))
+            queue = jobs[job] = _JobQueue(weight, self._class_pass.get(priority, 0.0))
+        size_key = float(expected_size) if self.shortest_first and expected_size else math.inf
+        heapq.heappush(queue.heap, (size_key, self._seq, item))
+        self._seq += 1
+        self._size += 1
+
+    def pop(self) -> Optional[Tuple[str, T]]:
+        """
+        Remove and return the next (job, item), or None when empty.
+        """
+        if not self._size:
+            return None
+        priority = min(self._classes)
+        jobs = self._classes[priority]
+        job = min(jobs, key=lambda name: (jobs[name].pass_value, name))
+        queue = jobs[job]
+        _, _, item = heapq.heappop(queue.heap)
+        self._class_pass[priority] = queue.pass_value
+        queue.pass_value += 1.0 / queue.weight
+        if not queue.heap:
+            del jobs[job]
+            if not jobs:
+                del self._classes[priority]
+        self._size -= 1
+        return job, item
+
+    def drain(self) -> Iterator[T]:
+        """
+        Yield items in schedule order. Lazy, so items pushed while a consumer
+        is iterating are scheduled among the remaining ones.
+        """
+        while True:
+            entry = self.pop()
+            if entry is None:
+                return
+            yield entry[1]
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+class JobSchedule:
+    """
+    Scheduling policy for one run built from the tagged input entries:
+    orders download work through a FairScheduler and records, per job, the
+    latency from the start of the run until each of its tracks finished.
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[InputEntry],
+        weights: Optional[Dict[str, float]] = None,
+        shortest_first: bool = True,
+    ) -> None:
+        self.entries: Dict[str, InputEntry] = {e.url: e for e in entries}
+        self.weights = weights or {}
+        self.shortest_first = shortest_first
+        self.started = time.monotonic()
+        self._latencies: Dict[str, List[float]] = {}
+
+    def entry(self, url: str) -> InputEntry:
+        return self.entries.get(url) or InputEntry(url=url)
+
+    def order(self, items: Iterable[T], url_of: Callable[[T], str]) -> Iterator[T]:
+        scheduler: FairScheduler[T] = FairScheduler(self.weights, self.shortest_first)
+        for item in items:
+            entry = self.entry(url_of(item))
+            scheduler.push(item, entry.job, entry.priority, entry.expected_size)
+        return scheduler.drain()
+
+    @contextmanager
+    def running(self, url: str) -> Iterator[None]:
+        """
+        Run one track's work under its job tag (see current_job()) and record
+        its completion latency when the block exits.
+        """
+        job = self.entry(url).job
+        with job_context(job):
+            try:
+                yield
+            finally:
+                self._latencies.setdefault(job, []).append(time.monotonic() - self.started)
+
+    def latency_percentiles(self) -> Dict[str, Dict[str, float]]:
+        report: Dict[str, Dict[str, float]] = {}
+        for job, samples in sorted(self._latencies.items()):
+            ordered = sorted(samples)
+            report[job] = {
+                "tracks": len(ordered),
+                "p50": round(_percentile(ordered, 0.50), 3),
+                "p90": round(_percentile(ordered, 0.90), 3),
+                "p99": round(_percentile(ordered, 0.99), 3),
+                "max": round(ordered[-1], 3),
+            }
+        return report
+
+    def log_report(self, logger: logging.Logger) -> None:
+        for job, stats in self.latency_percentiles().items():
+            logger.info(
+                "Job %s: %d tracks, completion latency p50=%.3fs p90=%.3fs p99=%.3fs max=%.3fs",
+                job,
+                stats["tracks"],
+                stats["p50"],
+                stats["p90"],
+                stats["p99"],
+                stats["max"],
+            )
+
+def build_job_schedule(
+    settings: Dict[str, Any],
+    entries: Iterable[InputEntry],
+) -> Optional[JobSchedule]:
+    cfg = settings.get("scheduler", {})
+    if not cfg.get("enabled", False):
+        return None
+    return JobSchedule(
+        entries,
+        weights={str(k): float(v) for k, v in cfg.get("job_weights", {}).items()},
+        shortest_first=bool(cfg.get("shortest_first", True)),
+    )
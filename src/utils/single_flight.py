@@ -0,0 +1,87 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# How many results a remembering SingleFlight keeps by default. Aliases of one
+# track are usually close together in the input, so a few thousand recent
+# keys catch them without holding a result per track for the whole run.
+REMEMBER_RESULTS = 4096
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls for the same key into one in-flight call:
+
+        outcome = await flights.do(media_url, lambda: download(media_url))
+
+    The first caller for a key runs the operation; callers arriving while it
+    is in flight await the same result (or exception). With ``remember`` > 0,
+    the successful results of up to that many recently used keys are kept
+    (least recently used first out), so later aliases of the same key are
+    answered without a new request. Falsy results (an empty oEmbed payload, a
+    failed download) are never remembered, so a later caller gets another
+    chance. Callers should return only what they need from a remembered
+    result, not a whole response.
+    """
+
+    def __init__(self, remember: int = 0) -> None:
+        self.remember = remember
+        self.shared = 0
+        self._in_flight: Dict[Hashable, "asyncio.Future[T]"] = {}
+        self._done: "OrderedDict[Hashable, T]" = OrderedDict()
+
+    async def do(self, key: Hashable, operation: Callable[[], Awaitable[T]]) -> T:
+        if key in self._done:
+            self._done.move_to_end(key)
+            self.shared += 1
+            return self._done[key]
+
+        pending = self._in_flight.get(key)
+        while pending is not None:
+            try:
+                # shield: a cancelled follower must not cancel the leader's call.
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The leader was cancelled, not us: take over the call.
+                pending = self._in_flight.get(key)
+                continue
+            self.shared += 1
+            return result
+
+        future: "asyncio.Future[T]" = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await operation()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if self.remember > 0 and result:
+                self._done[key] = result
+                if len(self._done) > self.remember:
+                    self._done.popitem(last=False)
+            return result
+        finally:
+            del self._in_flight[key]
+
+def coalesced(
+    flights: Optional[SingleFlight[Any]],
+    key: Hashable,
+    operation: Callable[[], Awaitable[T]],
+) -> Awaitable[T]:
+    """
+    ``flights.do(key, operation)`` when coalescing is enabled, otherwise just
+    ``operation()``.
+    """
+    if flights is None:
+        return operation()
+    return flights.do(key, operation)
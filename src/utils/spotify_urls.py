@@ -0,0 +1,49 @@
+import re
+from typing import Iterable, Optional
+from urllib.parse import urlparse
+
+SPOTIFY_TRACK_URL_PREFIX = "https://open.spotify.com/track/"
+
+_TRACK_ID_RE = re.compile(r"^[A-Za-z0-9]+$")
+# Path segments that may precede /track/<id>: locale prefixes such as
+# /intl-de/ or /intl-pt-br/, and the embed player.
+_PATH_PREFIX_RE = re.compile(r"^(intl-[a-z]{2}(-[a-z]{2})?|embed)$", re.IGNORECASE)
+
+def extract_track_id(spotify_url: str) -> Optional[str]:
+    """
+    Extract track ID from the Spotify track URL forms:
+    https://open.spotify.com/track/<id>?si=...
+    https://open.spotify.com/intl-de/track/<id>
+    https://open.spotify.com/embed/track/<id>
+    spotify:track:<id>
+
+    Returns None if it cannot detect a valid track id.
+    """
+    candidate = spotify_url.strip()
+    if candidate.lower().startswith("spotify:"):
+        parts = candidate.split(":")
+        if len(parts) == 3 and parts[1].lower() == "track" and _TRACK_ID_RE.match(parts[2]):
+            return parts[2]
+        return None
+
+    parsed = urlparse(candidate)
+    parts = [p for p in parsed.path.split("/") if p]
+    while parts and _PATH_PREFIX_RE.match(parts[0]):
+        parts = parts[1:]
+    if len(parts) >= 2 and parts[0] == "track" and _TRACK_ID_RE.match(parts[1]):
+        return parts[1]
+    return None
+
+def canonical_track_url(spotify_url: str) -> str:
+    """
+    The canonical https://open.spotify.com/track/<id> form of a track URL, so
+    aliases (tracking query strings, locale prefixes, spotify: URIs) compare
+    equal. URLs without a recognizable track ID are returned stripped.
+    """
+    track_id = extract_track_id(spotify_url)
+    if track_id is None:
+        return spotify_url.strip()
+    return f"{SPOTIFY_TRACK_URL_PREFIX}{track_id}"
+
+def count_distinct_tracks(urls: Iterable[str]) -> int:
+    return len({canonical_track_url(u) for u in urls})
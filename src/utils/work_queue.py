@@ -0,0 +1,179 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    entries TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result_path TEXT
+);
+"""
+
+class WorkQueue:
+    """
+    Shard queue in a SQLite file that any number of processes, on one host or
+    on several hosts sharing the file, lease work from:
+
+    - populate() stores the shards once; later callers must present the same
+      input fingerprint, so two nodes cannot run different inputs into one queue.
+    - lease() hands out a pending shard, or one whose lease expired because its
+      owner died, for ``lease_seconds``; owners renew() while they work.
+    - complete() records where the shard's results were written. If a lease
+      expired while its owner was still working, two owners may finish the
+      same shard; the first complete() wins and both results are equivalent.
+
+    Every state change is a short IMMEDIATE transaction, so the file needs
+    working POSIX locks (a local disk or a shared filesystem that supports them).
+    """
+
+    def __init__(self, path: Union[str, Path], lease_seconds: float = 60.0) -> None:
+        self.path = Path(path)
+        self.lease_seconds = float(lease_seconds)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # The connection is in autocommit mode, so BEGIN IMMEDIATE takes the
+        # write lock up front instead of on the first write.
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def populate(self, fingerprint: str, shards: List[List[Dict[str, Any]]]) -> bool:
+        """
+        Store ``shards`` unless the queue already holds them. Returns True when
+        this call created the queue; raises ValueError when the queue was
+        populated from a different input.
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is not None:
+                if row[0] != fingerprint:
+                    raise ValueError(f"Work queue {self.path} was created for a different input")
+                return False
+            conn.execute("INSERT INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+            conn.executemany(
+                "INSERT INTO shards (id, entries, status) VALUES (?, ?, ?)",
+                [(index, json.dumps(entries), STATUS_PENDING) for index, entries in enumerate(shards)],
+            )
+        return True
+
+    def lease(self, owner: str) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Lease the next available shard to ``owner``; None when every shard is
+        done or currently leased by a live owner.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, entries FROM shards "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1",
+                (STATUS_PENDING, STATUS_LEASED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE shards SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (STATUS_LEASED, owner, now + self.lease_seconds, row[0]),
+            )
+        return int(row[0]), json.loads(row[1])
+
+    def renew(self, shard_id: int, owner: str) -> bool:
+        """
+        Extend ``owner``'s lease; False when the lease was lost to another owner.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE shards SET lease_expires = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time() + self.lease_seconds, shard_id, owner, STATUS_LEASED),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id: int, result_path: Path) -> bool:
+        """
+        Mark the shard done with its results at ``result_path``. Returns False
+        when another owner completed it first (its results are equivalent).
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE shards SET status = ?, result_path = ?, lease_expires = NULL "
+                "WHERE id = ? AND status != ?",
+                (STATUS_DONE, str(result_path), shard_id, STATUS_DONE),
+            )
+        return cursor.rowcount == 1
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall()
+        counts = {STATUS_PENDING: 0, STATUS_LEASED: 0, STATUS_DONE: 0}
+        counts.update({status: int(count) for status, count in rows})
+        return counts
+
+    def all_done(self) -> bool:
+        counts = self.counts()
+        return counts[STATUS_DONE] > 0 and counts[STATUS_PENDING] == counts[STATUS_LEASED] == 0
+
+    def result_paths(self) -> List[Path]:
+        rows = self._conn.execute("SELECT result_path FROM shards ORDER BY id").fetchall()
+        return [Path(row[0]) for row in rows if row[0]]
+
+    def release_leases(self) -> None:
+        """
+        Return every leased shard to pending. Only safe when no other process
+        is working on the queue (resuming a local run).
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE shards SET status = ?, owner = NULL, lease_expires = NULL WHERE status = ?",
+                (STATUS_PENDING, STATUS_LEASED),
+            )
+
+    def merged(self) -> bool:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'merged_by'").fetchone()
+        return row is not None
+
+    def claim_merge(self, owner: str) -> bool:
+        """
+        Let exactly one caller merge the results: True for the first owner to ask.
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'merged_by'").fetchone()
+            if row is not None and row[0] != owner:
+                return False
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('merged_by', ?)", (owner,))
+        return True
+
+    def release_merge(self, owner: str) -> None:
+        """
+        Give up a merge claim (after a failed merge) so another node can retry.
+        """
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM meta WHERE key = 'merged_by' AND value = ?", (owner,))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,192 @@
+import asyncio
+import itertools
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+from utils.metrics import METRICS
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_WORKER_DONE = object()
+
+class _WorkerFailure:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+class _InputSource:
+    """
+    Hands out (index, item) pairs from a sync or async iterable to several
+    workers. Async iterators are guarded by a lock because an async generator
+    cannot be advanced by two coroutines at once.
+    """
+
+    def __init__(self, items: Union[Iterable[Any], AsyncIterable[Any]]) -> None:
+        self._index = 0
+        self._lock = asyncio.Lock()
+        if hasattr(items, "__aiter__"):
+            self._aiter: Optional[AsyncIterator[Any]] = items.__aiter__()  # type: ignore[union-attr]
+            self._iter = None
+        else:
+            self._aiter = None
+            self._iter = iter(items)  # type: ignore[arg-type]
+
+    async def next(self) -> Any:
+        if self._iter is not None:
+            item = next(self._iter, _WORKER_DONE)
+        else:
+            async with self._lock:
+                try:
+                    item = await self._aiter.__anext__()  # type: ignore[union-attr]
+                except StopAsyncIteration:
+                    item = _WORKER_DONE
+        if item is _WORKER_DONE:
+            return item
+        index = self._index
+        self._index += 1
+        return index, item
+
+async def iter_results(
+    worker: Callable[[T], Awaitable[R]],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    concurrency: int,
+    ordered: bool = True,
+    window: Optional[int] = None,
+    name: Optional[str] = None,
+) -> AsyncIterator[R]:
+    """
+    Run ``worker`` over ``items`` with a fixed number of long-lived workers and
+    yield the results.
+
+    Unlike building one coroutine per item and handing them all to
+    asyncio.gather, only ``concurrency`` tasks ever exist and items are pulled
+    lazily from the input iterator. At most ``window`` items are in flight or
+    waiting to be yielded at any time (default: 2 * concurrency), so memory use
+    does not depend on the input size. With ``ordered=True`` results come out
+    in input order; otherwise they are yielded as soon as they complete.
+
+    An exception raised by ``worker`` or by the input iterator cancels the
+    remaining workers and is re-raised to the consumer. A ``name`` publishes the number of items taken
+    but not yet yielded as the ``worker_pool_queue_depth{pool=name}`` gauge.
+    """
+    concurrency = max(1, int(concurrency))
+    window = max(concurrency, int(window or concurrency * 2))
+
+    source = _InputSource(items)
+    slots = asyncio.Semaphore(window)
+    done: asyncio.Queue = asyncio.Queue()
+    depth = METRICS.gauge("worker_pool_queue_depth", pool=name) if name else None
+
+    async def run_worker() -> None:
+        while True:
+            await slots.acquire()
+            try:
+                entry = await source.next()
+            except Exception as exc:  # noqa: BLE001
+                # The input itself failed (e.g. a malformed line of a lazily
+                # parsed file): hand it to the consumer like a worker error.
+                await done.put((-1, _WorkerFailure(exc)))
+                return
+            if entry is _WORKER_DONE:
+                slots.release()
+                await done.put(_WORKER_DONE)
+                return
+            index, item = entry
+            if depth is not None:
+                depth.inc()
+            try:
+                result: Any = await worker(item)
+            except Exception as exc:  # noqa: BLE001
+                result = _WorkerFailure(exc)
+            await done.put((index, result))
+
+    tasks = [asyncio.create_task(run_worker()) for _ in range(concurrency)]
+    pending: Dict[int, Any] = {}
+    next_index = 0
+    running = concurrency
+
+    try:
+        while running:
+            entry = await done.get()
+            if entry is _WORKER_DONE:
+                running -= 1
+                continue
+
+            index, result = entry
+            if isinstance(result, _WorkerFailure):
+                raise result.exc
+
+            if not ordered:
+                slots.release()
+                if depth is not None:
+                    depth.dec()
+                yield result
+                continue
+
+            pending[index] = result
+            while next_index in pending:
+                ready = pending.pop(next_index)
+                next_index += 1
+                slots.release()
+                if depth is not None:
+                    depth.dec()
+                yield ready
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def run_all(
+    worker: Callable[[T], Awaitable[R]],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    concurrency: int,
+    name: Optional[str] = None,
+) -> List[R]:
+    """
+    Run ``worker`` over ``items`` and return all results in input order.
+    """
+    return [r async for r in iter_results(worker, items, concurrency, ordered=True, name=name)]
+
+async def run_each(
+    worker: Callable[[T], Awaitable[Any]],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    concurrency: int,
+    name: Optional[str] = None,
+) -> None:
+    """
+    Run ``worker`` over ``items`` for its side effects, discarding results.
+    """
+    async for _ in iter_results(worker, items, concurrency, ordered=False, name=name):
+        pass
+
+async def iterate_in_thread(items: Iterable[T], batch_size: int = 256) -> AsyncIterator[T]:
+    """
+    Advance a blocking iterator (a file or stdin being parsed) on the default
+    executor, ``batch_size`` items per hop, so a slow read never stalls the
+    event loop. The iterator is only ever advanced by one thread at a time.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(items)
+
+    def next_batch() -> List[T]:
+        return list(itertools.islice(iterator, batch_size))
+
+    while True:
+        batch = await loop.run_in_executor(None, next_batch)
+        if not batch:
+            return
+        for item in batch:
+            yield item